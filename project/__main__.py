@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import sys
+
+# the modules import each other by bare name, the same as when they are run as scripts
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+'''
+Command line for the whole pipeline, run from the repo directory:
+
+    python -m project gen-params         <---- add new dates in Data to the yaml params
+    python -m project clean [--workers N --chunksize N --tail --profile ...]
+    python -m project report [--by stage|sensor|date]    <---- summary of the last runReport.json
+    python -m project query Dp03 A16 A7 --start "2022-04-13 12:00" --end 4-15-22 [--rollup 1h --out file.csv]
+
+each command only imports what it needs, and clean doesn't load numpy or pandas unless the
+manifest shows there is something to process
+'''
+
+
+def genParams(args):
+    import genNewYamlParams
+    genNewYamlParams.setupLogging()
+    genNewYamlParams.main()
+
+
+def clean(args):
+    import dataCleaning
+    dataCleaning.setupLogging()
+    dataCleaning.run(args)
+
+
+def report(args):
+    from dataPaths import dataInfoPath
+    path = os.path.join(dataInfoPath, "runReport.json")
+    if not os.path.exists(path):
+        sys.exit(f"no run report at {os.path.abspath(path)}, run python -m project clean first")
+    with open(path) as fin:
+        run = json.load(fin)
+    print(f"run started {run['started']}: {run['jobs']} jobs in {run['wall']:.2f}s wall, "
+          f"{run['cpu']:.2f}s cpu, peak RSS {run['peakRSS']} MB")
+
+    # stage rows added up over everything but {args.by}
+    totals = {}
+    for row in run["stages"]:
+        key = row["stage"] if args.by == "stage" else (row[args.by] or "-", row["stage"])
+        total = totals.setdefault(key, {"calls": 0, "wall": 0.0, "cpu": 0.0, "rowsIn": 0, "rowsOut": 0})
+        for field in total:
+            total[field] += row[field]
+    print(f"{args.by:<20}{'calls':>8}{'wall s':>10}{'cpu s':>10}{'rows in':>12}{'rows out':>12}")
+    for key, total in sorted(totals.items(), key=lambda item: -item[1]["wall"]):
+        label = key if args.by == "stage" else f"{key[0]} {key[1]}"
+        print(f"{label:<20}{total['calls']:>8}{total['wall']:>10.3f}{total['cpu']:>10.3f}"
+              f"{total['rowsIn']:>12}{total['rowsOut']:>12}")
+
+
+def query(args):
+    import queryStore
+    if args.rollup:
+        df = queryStore.rollup(args.sensors, args.particle, args.rollup, args.start, args.end)
+    else:
+        df = queryStore.query(args.sensors, args.particle, args.start, args.end)
+    if args.out:
+        df.to_csv(args.out, index=False)
+    else:
+        print(df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m project", description="sensor data processing pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("gen-params", help="add the dates found in Data to dataCleaningParams.yaml").set_defaults(
+        function=genParams)
+    cleanParser = commands.add_parser("clean", help="clean, interpolate and merge the stale (particle, day) jobs")
+    # argument definitions live with the script so both entry points stay in step, they are
+    # cheap to import as dataCleaning holds off on numpy and pandas
+    import dataCleaning
+    dataCleaning.addArguments(cleanParser)
+    cleanParser.set_defaults(function=clean)
+    reportParser = commands.add_parser("report", help="summarise the stage timings of the last run")
+    reportParser.add_argument("--by", choices=["stage", "sensor", "date"], default="stage")
+    reportParser.set_defaults(function=report)
+    queryParser = commands.add_parser("query", help="read the merged data of some sensors over a time range")
+    queryParser.add_argument("particle", help="particle name from the yaml Particles, e.g. Dp>0.3, or its store folder name Dp03")
+    queryParser.add_argument("sensors", nargs="+", help="sensor names, or Average, Variance and Count")
+    queryParser.add_argument("--start", help="first time to include, anything pandas can read as a timestamp")
+    queryParser.add_argument("--end", help="time to stop before")
+    queryParser.add_argument("--rollup", choices=["1min", "1h", "day"],
+                             help="mean, min, max and count per bucket instead of every reading")
+    queryParser.add_argument("--out", help="csv to write the result to instead of printing it")
+    queryParser.set_defaults(function=query)
+    args = parser.parse_args(argv)
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
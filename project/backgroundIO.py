@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+'''
+Threads that keep the disk busy while the stages work, which matters most when Data or the
+outputs sit on a network share and every file costs a round trip:
+
+    Prefetcher        <---- loads the next few raw files of a run before the job that needs them
+    BackgroundWriter  <---- writes the outputs of the stages in the order they were handed over
+
+both are bounded. the prefetcher never holds more than {depth} files that haven't been asked
+for yet, and the writer makes the stage handing it a frame wait once {depth} writes are queued,
+so a slow disk holds the stages back instead of filling up memory. a depth of 0 turns either
+one off and everything happens on the calling thread like before. errors come back to the
+caller, the prefetcher raises them when the file is asked for and the writer on the next
+submit or barrier
+'''
+
+
+class Prefetcher:
+    def __init__(self, files, load, depth=2):
+        # {files} in the order they will be asked for, load(file) gives what get(file) returns
+        self.files = list(files)
+        self.load = load
+        self.depth = depth
+        self.pool = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="prefetch") if depth else None
+        self.loading = {}
+        self.taken = set()
+        self.position = 0
+        self.fill()
+
+    def fill(self):
+        # starts on the next files in line until {depth} are loading or waiting to be picked up
+        while self.pool and len(self.loading) < self.depth and self.position < len(self.files):
+            file = self.files[self.position]
+            self.position += 1
+            if file not in self.taken and file not in self.loading:
+                self.loading[file] = self.pool.submit(self.load, file)
+
+    def get(self, file):
+        '''
+        load(file), taken from the background thread when it was loaded ahead. a file asked for
+        again, or before its turn, is loaded on the calling thread
+        '''
+        self.taken.add(file)
+        future = self.loading.pop(file, None)
+        try:
+            return self.load(file) if future is None else future.result()
+        finally:
+            self.fill()
+
+    def close(self):
+        if self.pool:
+            for future in self.loading.values():
+                future.cancel()
+            self.pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BackgroundWriter:
+    def __init__(self, depth=8):
+        self.depth = depth
+        # a single thread, so the parts of a partition and the rows of a csv land in order
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer") if depth else None
+        self.slots = threading.BoundedSemaphore(max(depth, 1))
+        self.error = None
+
+    def submit(self, function, *args):
+        # queues function(*args), waiting for a free slot when {depth} writes are already queued
+        self.raiseError()
+        if self.pool is None:
+            function(*args)
+            return
+        self.slots.acquire()
+        self.pool.submit(self.run, function, args)
+
+    def run(self, function, args):
+        try:
+            # once a write has failed the rest are dropped, the error is raised to the caller
+            if self.error is None:
+                function(*args)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.slots.release()
+
+    def barrier(self, value=None):
+        '''
+        a future that resolves to {value} once everything submitted before it has been written,
+        or raises the error of the first write that failed
+        '''
+        if self.pool is None:
+            future = Future()
+            future.set_result(value)
+            return future
+        return self.pool.submit(self.passOn, value)
+
+    def passOn(self, value):
+        self.raiseError()
+        return value
+
+    def raiseError(self):
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        # waits for the queued writes, call barrier first to find out whether they went through
+        if self.pool:
+            self.pool.shutdown(wait=True)
@@ -0,0 +1,133 @@
+import argparse
+import glob
+import io
+import os
+import tempfile
+import tracemalloc
+from time import perf_counter
+import pandas as pd
+from cleanUpData import LineStream, cleanUp, csvOptions, dropBadTimestamps, fixUTCLines
+from dayProcessing import checkDataRecordingPerformance, interpolateMissingData, mergeDataFrames
+from genSensorData import addFaultArguments, faultArguments, genDeployment
+from sensorReader import readSensorText
+
+dirname = os.path.dirname(__file__)
+
+'''
+Timings for the parts of the pipeline, run from the project directory:
+
+    python benchmarks.py reader          <---- sensorReader against read_csv on the A16 files
+    python benchmarks.py stages          <---- each stage of a day on synthetic deployments of a few sizes
+    python benchmarks.py stages --badRate 0.01 --utcRate 0.01    <---- the same on faulty data
+
+the stages benchmark generates its data with genSensorData, sizes are given as
+{sensors}x{hours}, e.g. --sizes 4x24,36x24. the table can be saved with --save and a later
+run compared against it with --compare, which adds the ratio of the new times to the saved ones
+'''
+
+
+def bestOf(function, repeat):
+    # the fastest of {repeat} runs, the slower runs are mostly noise from the rest of the machine
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def readWithCSV(file, columns, badTimes):
+    # the read_csv path readSensorFile falls back on, up to the point Date_Time is parsed
+    utcRows = []
+    with open(file, 'rt') as fin:
+        df = pd.read_csv(LineStream(fixUTCLines(fin, utcRows)), **csvOptions(columns))
+    df.columns = df.columns.str.replace(" ", "")
+    if df['Date_Time'].dtype == object:
+        df = dropBadTimestamps(df, badTimes)[0]
+    return df
+
+
+def peakMemory(function):
+    # peak MB allocated while {function} runs, numpy and pandas buffers are traced too
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def benchReader(files, columns, badTimes, repeat=5):
+    '''
+    times reading each of {files} with read_csv and with sensorReader.
+    returns a data frame with a row per file
+    '''
+    rows = []
+    for file in files:
+        lines = sum(1 for _ in open(file, 'rb'))
+        csvTime = bestOf(lambda: readWithCSV(file, columns, badTimes), repeat)
+        textTime = bestOf(lambda: readSensorText(file, columns, badTimes), repeat)
+        rows.append({"file": os.path.basename(file), "lines": lines,
+                     "read_csv ms": round(csvTime * 1000, 2), "sensorReader ms": round(textTime * 1000, 2),
+                     "speedup": round(csvTime / textTime, 1)})
+    return pd.DataFrame(rows)
+
+
+def benchStages(sizes, repeat=3, faults=None):
+    '''
+    times cleanUp, checkDataRecordingPerformance, interpolateMissingData and mergeDataFrames
+    for one day of each {sizes} synthetic deployment, given as [(sensors, hours)]. {faults} are
+    the genSensorFile rates the deployments are written with, e.g. {"badRate": 0.01}.
+    the peak memory of a stage is measured on a separate run, tracing allocations slows it down.
+    returns a data frame with a row per (size, stage)
+    '''
+    columns, badTimes, particle = [0, 1, 6, 13], ['     0/0/0      0:0:0'], "Dp>0.3"
+    start = pd.Timestamp("2022-04-13")
+    rows = []
+    with tempfile.TemporaryDirectory() as tempDir:
+        for sensors, hours in sizes:
+            directory = os.path.join(tempDir, f"{sensors}x{hours}", "Data")
+            files = genDeployment(directory, sensors, start.isoformat(), hours / 24, **(faults or {}))
+            end = start + pd.Timedelta(hours=hours)
+            data = cleanUp(start, {}, files, columns, badTimes)
+            interp = interpolateMissingData(data, start, end, "bench", fout=io.StringIO())
+            stages = {
+                "cleanUp": lambda: cleanUp(start, {}, files, columns, badTimes),
+                "checkDataRecordingPerformance": lambda: checkDataRecordingPerformance(
+                    data, "bench", particle, start, end, io.StringIO()),
+                "interpolateMissingData": lambda: interpolateMissingData(
+                    data, start, end, "bench", fout=io.StringIO()),
+                "mergeDataFrames": lambda: mergeDataFrames(interp, particle)}
+            for stage, function in stages.items():
+                rows.append({"size": f"{sensors}x{hours}", "rows": sum(map(len, data.values())), "stage": stage,
+                             "ms": round(bestOf(function, repeat) * 1000, 2),
+                             "peak MB": round(peakMemory(function), 1)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time the parts of the data cleaning pipeline")
+    parser.add_argument("benchmark", choices=["reader", "stages"])
+    parser.add_argument("--files", default=os.path.join(dirname, "..", "Data", "A16*.txt"),
+                        help="glob of the raw files to read")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", default="4x24,12x24,36x24",
+                        help="synthetic deployments for the stages benchmark, {sensors}x{hours} separated by commas")
+    parser.add_argument("--save", help="csv to write the results to")
+    parser.add_argument("--compare", help="csv of earlier results to compare the stages benchmark against")
+    # the rows and faults of the synthetic deployments, the same options as genSensorData.py
+    addFaultArguments(parser)
+    args = parser.parse_args()
+    if args.benchmark == "reader":
+        results = benchReader(sorted(glob.glob(args.files)), [0, 1, 6, 13], ['     0/0/0      0:0:0'], args.repeat)
+    elif args.benchmark == "stages":
+        sizes = [tuple(int(x) for x in size.split("x")) for size in args.sizes.split(",")]
+        results = benchStages(sizes, args.repeat, faultArguments(args))
+        if args.compare:
+            before = pd.read_csv(args.compare)
+            results = results.merge(before[["size", "stage", "ms"]], on=["size", "stage"], how="left",
+                                    suffixes=("", " before"))
+            results["ratio"] = (results["ms"] / results["ms before"]).round(2)
+    if args.save:
+        results.to_csv(args.save, index=False)
+    print(results.to_string(index=False))
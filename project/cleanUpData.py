@@ -1,186 +1,360 @@
 import logging
+from contextlib import contextmanager
 import pandas as pd
 import re
-import os
-import platform
+import numpy as np
+import parseCache
+from dataPaths import sensorName
+from sensorReader import readSensorText
+from stageMetrics import measure
+from sensorSeries import SensorSeries
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger("data-cleanup")
 logger.propagate = True
 
+# rows with a 2 digit year were recorded in UTC, this is how far they are set back for PST
+utcOffset = 7
+utcYearPattern = re.compile(r"(\s+)(\d{2})(?=/\d+/\d+)")
+# format of the Date_Time column once pandas has merged the Date and Time columns
+timestampFormat = '%Y/%m/%d %H:%M:%S'
 
-def cleanUp(cutoff, timeRectifyingParams, filePaths, columns, badTimes, date, confirmedFiles):
 
-    fData = {}
-    mod = {}
-    cleaningCutOffTime = pd.Timestamp(cutoff)
-    filesChecked = {}
-    for idx, file in enumerate(filePaths):
+def cleanUp(cutoff, timeRectifyingParams, filePaths, columns, badTimes,
+            sensorTable=None, cacheDir=None):
+    '''
+    reads the files for a single day and returns {sensorName: SensorSeries} of their data from
+    the cutoff time onwards.
+    pass in a shared {sensorTable} to reuse files that were already parsed earlier in the run,
+    and a {cacheDir} to reuse files that were parsed by an earlier run
+    '''
+    if sensorTable is None:
+        sensorTable = {}
+    ingestFiles(sensorTable, timeRectifyingParams, filePaths, columns, badTimes, cacheDir)
+    return sliceDay(sensorTable, filePaths, cutoff)
+
+
+def ingestFiles(sensorTable, timeRectifyingParams, filePaths, columns, badTimes, cacheDir=None, fingerprints=None):
+    '''
+    parses every file not already in {sensorTable} and adds it to the table, keyed by file path.
+    each entry holds the sensor name, the full cleaned SensorSeries of the file, and whether a
+    time offset was applied to it. days only ever slice from the table, so a file that covers
+    several days or is needed for several particles is only parsed once per run.
+    when {cacheDir} is given cleaned series are also loaded from and saved to the parse cache,
+    checked against the {fingerprints} of dataIndex, {file: fingerprint}, where there is one.
+    '''
+    for file in filePaths:
+        if file in sensorTable:
+            continue
         logger.debug(f"filename: {file}")
-        # This function will fix utc timestamp errors
         try:
-            if file not in confirmedFiles:
-                filesChecked[file] = fixUTCStamps(file, date)
-        except IndexError as e:
-            logging.exception(f"skipping {file} due to index error {e}")
+            if cacheDir is None:
+                sensorTable[file] = readSensorFile(file, columns, badTimes, timeRectifyingParams)
+                continue
+
+            key = parseCache.paramsKey(columns, badTimes, timeRectifyingParams.get(sensorName(file)))
+            fingerprint = (fingerprints or {}).get(file)
+            entry = parseCache.loadEntry(cacheDir, file, key, fingerprint)
+            if entry is None:
+                entry = readSensorFile(file, columns, badTimes, timeRectifyingParams)
+                parseCache.storeEntry(cacheDir, file, key, entry, fingerprint)
+            sensorTable[file] = entry
+        except (IndexError, pd.errors.EmptyDataError) as e:
             '''
-            this index error will trigger due to a file being empty, i.e. not having
-            a 3rd row. We will keep the file marked as not checked, so it is always skipped.
+            this error will trigger due to a file being empty, i.e. not having any rows
+            after the header. The file is left out of the table, so it is always skipped.
             Users should manually remove the file from database
             '''
-            filesChecked[file] = False
-            continue
-        '''
-        Here we are reading in the data from the sensors. 
-        if 'all' was put into the columns variable we just
-        take everything.
-        '''
-        if 'all' in columns:
-            df = pd.read_csv(
-                file,
-                header=1,
-                parse_dates=[[0, 1]]
-            ).dropna(how='all')
+            logger.exception(f"skipping {file} due to {type(e).__name__} {e}")
+
+
+def readSensorFile(file, columns, badTimes, timeRectifyingParams):
+    '''
+    Here we are reading in the data from the sensors.
+    if 'all' was put into the columns variable we just
+    take everything.
+    files that follow the sensor text format are read by sensorReader, anything else goes
+    through read_csv
+    '''
+    with measure("read", sensorName(file)) as counts:
+        parsed = readSensorText(file, columns, badTimes)
+        if parsed is not None:
+            df, utcRows, report = parsed
+            if report["knownBad"] or report["unparseable"]:
+                logger.info(f"{file}: dropped {report['knownBad']} known bad and "
+                            f"{report['unparseable']} unparseable timestamps {report['examples']}, "
+                            f"{report['zeroStamps']} were zero stamps")
         else:
-            df = pd.read_csv(
-                file,
-                header=1,
-                parse_dates=[[0, 1]],
-                usecols=columns
-            ).dropna(how='all')
-
-        logger.debug(df)
-
-        # columns have spaces in front and in between for the merged Data Time column
-        df.columns = df.columns.str.replace(" ", "")
-
-        # This assumes file start with ../Data\\{sensorName} followed by either "-" or "_", platform specific
-        sensorNamePatternDict = {'Windows': fr"Data{os.path.sep}{os.path.sep}[a-zA-Z]+\d+",
-                                 'Linux': fr"Data{os.path.sep}[a-zA-Z]+\d+", 
-                                 'Darwin': fr"Data{os.path.sep}[a-zA-Z]+\d+"}
-        nameMatch = re.search(sensorNamePatternDict[platform.system()], file)
-        name = nameMatch[0].replace(f"Data{os.path.sep}", "")
-
-        logger.debug(df)
-
-        '''
-        Some of the time stamps will error when pandas is parsing them to datetime, which causes
-        the entire column to be left as a string. This will check to see if the Date_Time column is
-        still strings, if so it will manually scan for the known bad stamps and remove them with their
-        associatted data.
-        '''
-
-        if type(df['Date_Time'][0]) == type('string'):
-            for time in badTimes:
-                df.drop(df[df['Date_Time'] == time].index, inplace=True)
-            # df.drop(df[df['Date_Time'] == '     0/0/0      0:0:0'].index, inplace = True)
-            # df.drop(df[df['Date_Time'] == '2165/165/165 165:165:85'].index, inplace = True)
-            try:
-                df['Date_Time'] = pd.to_datetime(df['Date_Time'])
-            except:
-                df = autoFix(file, df)
-                df['Date_Time'] = pd.to_datetime(df['Date_Time'])
+            # utc timestamp errors are fixed as the lines stream into the parser, the raw file is never modified
+            utcRows = []
+            with open(file, 'rt') as fin:
+                stream = LineStream(fixUTCLines(fin, utcRows))
+                df = pd.read_csv(stream, **csvOptions(columns))
+        # both readers leave the index alone here, it still lines up with utcRows
+        df = df.dropna(how='all')
+        counts["rowsOut"] = len(df)
 
-            '''
-            Here we need to set up our time changing parameters
-            For this instance we need to roll back all sensors by 1 hour
-            except the two BU sensors which needed to be rolled back by
-            8 hours.
-            '''
-        try:
-            offset = timeRectifyingParams[name]
-            mod[name] = 'yes'
-            df['Date_Time'] = df['Date_Time']-pd.Timedelta(hours=offset)
-        except KeyError:
-            mod[name] = 'no'
+    if df.empty:
+        raise IndexError(f"no data rows in {file}")
 
-        try:
-            df.drop(df[df['Date_Time'] < cleaningCutOffTime].index, inplace=True)
+    series, mod = cleanFrame(df, file, utcRows, badTimes, timeRectifyingParams)
+    return {"name": sensorName(file), "data": series, "mod": mod}
 
-        except TypeError:
-            logger.exception('TypeError: ')
-            return file, df
-            '''
-            In the instance of a TypeError occuring, we are bascically dealing with
-            the 0 timestamps causing an error in the read_csv parser and not
-            converting the Date_Time column to timestamp data type.
-            '''
 
-        fData[name] = df.reset_index(drop=True)
+def readSensorChunks(file, columns, badTimes, timeRectifyingParams, chunkSize, position=None):
+    '''
+    generator version of readSensorFile for recordings too long to hold in memory at once.
+    the file is parsed {chunkSize} rows at a time and every chunk is cleaned the same way a
+    whole file would be, so the chunks put back together match readSensorFile's series.
+    the utc flags of rows that have already been yielded are let go, memory use depends on
+    {chunkSize} and not on the length of the file.
+    with a {position} dict only the lines after byte position["offset"] are read, see appendedLines
+    '''
+    utcRows = []
+    # data row number of utcRows[0]
+    firstRow = 0
+    with open(file, 'rt') if position is None else appendedLines(file, position) as fin:
+        stream = LineStream(fixUTCLines(fin, utcRows))
+        with pd.read_csv(stream, chunksize=chunkSize, **csvOptions(columns)) as reader:
+            chunks = iter(reader)
+            while True:
+                # only the parsing is timed, not the stages the chunk goes through after the yield
+                with measure("read", sensorName(file)) as counts:
+                    df = next(chunks, None)
+                    counts["rowsOut"] = 0 if df is None else len(df)
+                if df is None:
+                    break
+                if df.empty:
+                    continue
+                # the reader numbers rows across chunks, so the index still lines up with the flags
+                nextRow = df.index[-1] + 1
+                df = df.dropna(how='all')
+                if not df.empty:
+                    yield cleanFrame(df, file, utcRows, badTimes, timeRectifyingParams, firstRow)[0]
+                del utcRows[:nextRow - firstRow]
+                firstRow = nextRow
+
+
+def csvOptions(columns):
+    # read_csv arguments shared by the whole file and chunked readers
+    options = {"header": 1, "parse_dates": [[0, 1]]}
+    if 'all' not in columns:
+        options["usecols"] = columns
+    return options
+
+
+def cleanFrame(df, file, utcRows, badTimes, timeRectifyingParams, firstRow=0):
+    '''
+    tidies up a freshly parsed data frame of {file}. {utcRows} holds the flags from fixUTCLines
+    starting with data row {firstRow}. returns (series, mod), series being the cleaned data as a
+    SensorSeries and mod whether a time offset was applied
+    '''
+    # columns have spaces in front and in between for the merged Data Time column
+    df.columns = df.columns.str.replace(" ", "")
+
+    name = sensorName(file)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"{file}: {len(df)} rows\n{df}")
+
+    '''
+    Some of the time stamps will error when pandas is parsing them to datetime, which causes
+    the entire column to be left as a string. If so every stamp that can't be parsed is dropped
+    in a single pass along with its associatted data.
+    '''
+    if df['Date_Time'].dtype == object:
+        with measure("badStamps", name, rowsIn=len(df)) as counts:
+            df, report = dropBadTimestamps(df, badTimes)
+            counts["rowsOut"] = len(df)
+        logger.info(f"{file}: dropped {report['knownBad']} known bad and "
+                    f"{report['unparseable']} unparseable timestamps {report['examples']}")
+
+    series = SensorSeries.fromFrame(df, name, timeRectifyingParams.get(name), file)
+
+    # rows that were recorded in UTC are set back to PST in one go, dropped rows keep their
+    # original index so it still lines up with the flags collected while streaming
+    with measure("utcFix", name, rowsIn=len(df)):
+        utcMask = np.asarray(utcRows, dtype=bool)[df.index - firstRow]
+        if utcMask.any():
+            logger.info(f"{file}: moved {utcMask.sum()} rows from UTC to PST")
+            series.times[utcMask] -= pd.Timedelta(hours=utcOffset).value
+
+    '''
+    Here we need to set up our time changing parameters
+    For this instance we need to roll back all sensors by 1 hour
+    except the two BU sensors which needed to be rolled back by
+    8 hours.
+    '''
+    if name in timeRectifyingParams:
+        mod = 'yes'
+        series.times -= pd.Timedelta(hours=timeRectifyingParams[name]).value
+    else:
+        mod = 'no'
+
+    return series, mod
+
+
+def sliceDay(sensorTable, filePaths, cutoff):
+    '''
+    takes the data for {filePaths} out of the shared {sensorTable}, dropping everything
+    recorded before the cutoff time. returns {sensorName: SensorSeries} for the day, they share
+    memory with the table wherever the rows kept are in one run
+    '''
+    fData = {}
+    mod = {}
+    for file in filePaths:
+        if file not in sensorTable:
+            continue
+        entry = sensorTable[file]
+        name = entry["name"]
+        mod[name] = entry["mod"]
+        fData[name] = entry["data"].since(cutoff)
 
         # ends by logger the new start and stop times of the data sets
-    for label in fData:
-        try:
-            logger.info(
-                f"{label}:   {fData[label]['Date_Time'].iloc[0]}    {fData[label]['Date_Time'].iloc[-1]}     mod:{mod[label]}")
-        except:
-            logger.exception(f"{label}: NO DATA PRESENT    NO DATA PRESENT")
-    return fData, filesChecked
+    for label, series in fData.items():
+        if len(series):
+            logger.info(f"{label}:   {pd.Timestamp(series.times[0])}    {pd.Timestamp(series.times[-1])}     mod:{mod[label]}")
+        else:
+            logger.error(f"{label}: NO DATA PRESENT    NO DATA PRESENT")
+    return fData
 
 
-def fixUTCStamps(filePath, date):
+@contextmanager
+def appendedLines(file, position, headerRows=2):
+    '''
+    opens {file} for a tail read, giving the header rows followed by the lines after byte
+    position["offset"] so they parse like a whole file. an offset of 0 reads every line.
+    only complete lines are handed out, position["offset"] is moved past each one and a last
+    line that is still being written is left for the next read
     '''
-    This function will parse the text array and convert any timestamps in YY/MM/dd format
-    to YYYY/MM/dd format while setting back the time by 7 hours for UTC -> PST timezone
-    if not in PST change the offset
+    with open(file, 'rb') as fin:
+        def lines():
+            for idx in range(headerRows):
+                yield fin.readline().decode()
+            if position["offset"]:
+                fin.seek(position["offset"])
+            else:
+                position["offset"] = fin.tell()
+            for line in fin:
+                if not line.endswith(b'\n'):
+                    break
+                position["offset"] += len(line)
+                yield line.decode()
+        yield lines()
+
+
+def sliceDayChunks(timeRectifyingParams, filePaths, columns, badTimes, cutoff, chunkSize):
+    '''
+    chunked counterpart of cleanUp, nothing is read until the day is processed.
+    returns {sensorName: generator of SensorSeries chunks} holding the data from the cutoff
+    time onwards, later files win when two share a sensor name just like in sliceDay
+    '''
+    return {sensorName(file): dayChunks(file, columns, badTimes, timeRectifyingParams, cutoff, chunkSize)
+            for file in filePaths}
+
+
+def dayChunks(file, columns, badTimes, timeRectifyingParams, cutoff, chunkSize, position=None):
     '''
-    offset = 7
-    fin = open(filePath, 'rt')
-    content = fin.readlines()
-    fin.close()
+    the chunks of one file with everything before the cutoff time dropped.
+    for a tail read {position} holds the byte offset to start from, see appendedLines,
+    and is given the last timestamp that was read as position["lastTime"]
     '''
-    parse the data array to get position of the time data in the text file
-    content[3] is the 3rd row of the data frame, which should be the first nonheader row
+    logger.debug(f"filename: {file}")
+    try:
+        for series in readSensorChunks(file, columns, badTimes, timeRectifyingParams, chunkSize, position):
+            if position is not None and len(series):
+                position["lastTime"] = str(pd.Timestamp(series.times[-1]))
+            yield series.since(cutoff)
+    except (IndexError, pd.errors.EmptyDataError) as e:
+        # same as ingestFiles, an empty or broken file is skipped
+        logger.exception(f"skipping {file} due to {type(e).__name__} {e}")
+
+
+def fixUTCLines(lines, utcRows, headerRows=2):
+    '''
+    generator that fixes the timestamps written in YY/MM/dd format as the raw text is read.
+    rows in that format were recorded in UTC, the year is widened to YYYY/MM/dd here and
+    {utcRows} gets a flag per data row so readSensorFile can set those rows back by
+    {utcOffset} hours once the whole column has been parsed.
     text file is expected to be ordered as follows:
 
     Breakout-05
           Date,      Time,   Battery,  Fix,       Latitude,     etc....
      2022/4/13,   11:58:8,  3.988750,    0,       0.000000,     etc....
-     2022/4/13,  11:58:18,  3.988750,    0,       0.000000,     etc....
+       22/4/13,   18:58:18,  3.988750,    0,       0.000000,     etc....
      2022/4/13,  11:58:28,  3.987500,    0,       0.000000,     etc....
-     2022/4/13,  11:58:38,  3.983750,    0,       0.000000,     etc....
+
+    blank lines, and lines with nothing but separators, are dropped here rather than by the
+    parser so the flags stay one per row.
+    this method will work until 2100
     '''
+    for idx, line in enumerate(lines):
+        if idx < headerRows:
+            yield line
+            continue
+        if not line.replace(',', '').strip():
+            continue
+        match = utcYearPattern.match(line)
+        utcRows.append(bool(match))
+        if match:
+            line = f"{match[1]}20{match[2]}" + line[match.end():]
+        yield line
 
-    charTimeStart, charTimeEnd = re.search(
-        r",\s+\d+:\d+:\d+", content[3]).span()
 
-    fout = open(filePath, 'wt')
-    incorrectString = r"\s+\d{2}/\d+/\d+"
-    for idx, i in enumerate(content):
-        match = re.match(incorrectString, i)
-        if match:
-            # TODO fix this, A7-4-21-22 shows whats happening. This deletes all that data
-            # date should be in format YY-MM-dd, this method will work until 2100
-            year = date.split('-')[-1]
-            dateStamp = match[0].replace(rf"   {year}", f" 20{year}")
-            line = (pd.Timestamp(dateStamp+i[charTimeStart+1:charTimeEnd])-pd.Timedelta(
-                hours=offset)).strftime('%Y/%m/%d,  %H:%M:%S') + i[charTimeEnd:]
-        else:
-            line = i
-        fout.write(line)
-    fout.close()
-    return True
+class LineStream:
+    '''
+    minimal read only file object over a generator of lines, lets pd.read_csv pull
+    fixed lines straight from fixUTCLines without the whole file being rewritten first
+    '''
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.buffer = ''
+
+    def read(self, size=-1):
+        chunks = [self.buffer]
+        length = len(self.buffer)
+        for line in self.lines:
+            chunks.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        text = ''.join(chunks)
+        if size < 0:
+            size = len(text)
+        self.buffer = text[size:]
+        return text[:size]
+
+    def __iter__(self):
+        return self
 
+    def __next__(self):
+        line = self.buffer or next(self.lines)
+        self.buffer = ''
+        return line
 
-def autoFix(file, df, start=0):
-    indexErrors = {}
+
+def dropBadTimestamps(df, badTimes=None):
     '''
-    recursively loops through the dataframe dropping values that cause errors keeping track
-    of its current index.
-    In retrospec I am curious if just dropping the value and then resetting the index after
-    the loop finishes would have the same result as this.
+    parses the Date_Time strings with a fixed format and drops every row that fails in one go.
+    stamps that don't match the format get a second, slower attempt with the generic parser,
+    so only the rows that can't be read at all are lost. {badTimes} is an optional list of
+    stamps that are known to be garbage, they are skipped without being parsed and counted
+    separately in the report:
+    {"knownBad": count, "unparseable": count, "examples": first few unparseable stamps}
     '''
+    stamps = df['Date_Time'].astype(str).str.strip()
+    knownBad = df['Date_Time'].isin(badTimes or [])
 
-    for idx, i in enumerate(df['Date_Time'][start:]):
-        try:
-            pd.Timestamp(i)
-        except:
-            logger.exception('Error encountered when parsing: ', file)
-            logger.exception('first index', idx, '  ', 'time value \''+i+'\'')
-            logger.debug(len(df['Date_Time']))
-            indexErrors[idx] = i
-            df.drop(df[df['Date_Time'] == i].index, inplace=True)
-            df.reset_index(drop=True)
-            df = autoFix(file, df, idx)
-            break
-    return df
+    parsed = pd.to_datetime(stamps.where(~knownBad), format=timestampFormat, errors='coerce')
+    retry = parsed.isna() & ~knownBad
+    if retry.any():
+        parsed[retry] = pd.to_datetime(stamps[retry], errors='coerce')
+    unparseable = parsed.isna() & ~knownBad
+
+    report = {"knownBad": int(knownBad.sum()),
+              "unparseable": int(unparseable.sum()),
+              "examples": stamps[unparseable].head(5).tolist()}
+
+    df = df[parsed.notna()].copy()
+    df['Date_Time'] = parsed[parsed.notna()]
+    return df, report
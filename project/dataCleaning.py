@@ -1,43 +1,64 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime as dt
+import json
 import os
-import glob
+import time
+from datetime import datetime as dt
 from time import perf_counter
-import yaml
 import logging
-import re
-import math
-from fillDataFrame import fillDf
-from cleanUpData import cleanUp
-
-dirname = os.path.dirname(__file__)
-dataInfoPath = os.path.join(dirname, "..", "..", "dataInfo")
-if not os.path.exists(os.path.join(dataInfoPath)):
-    os.mkdir(os.path.join(dataInfoPath))
-logging.basicConfig(
-    filename=os.path.join(dataInfoPath, "dataCleaning.log"),
-    format='%(asctime)s %(levelname)-8s %(message)s',
-    level=logging.INFO,
-    datefmt='%Y-%m-%d %H:%M:%S',
-    force=True)
+import argparse
+from manifest import openManifest, paramsKey, lookupOutput, recordOutput, lookupTail, recordTail
+from stageMetrics import writeReport
+from dataIndex import dayFiles, fingerprint, loadIndex
+from yamlParams import changedDays, loadParams, recordDayHashes
+from dataPaths import (allParticles, atomicWrite, dataInfoPath, manifestPath, outputStorePath, parseCachePath, partitionDir, partPaths,
+                       resolveFormat, resolveRollingStats, sensorName)
+
+# rows parsed at a time in tail mode when no --chunksize is given
+tailChunkSize = 100000
+# the log entries of every day by sensor, the text logs in dataInfo are put together from them
+dayLogsPath = os.path.join(dataInfoPath, "dayLogs.json")
 logger = logging.getLogger("data-cleaning")
 logger.propagate = True
 
+'''
+Entry point of the data cleaning. main reads the yaml params and checks the manifest for the
+days with stale outputs, the jobs themselves are run by dayProcessing.py. a job covers every
+particle of its day, so the files are resampled once however many particles there are.
+nothing here imports numpy or pandas, so a run with nothing to do returns straight away, and
+importing the module has no side effects, the log is only set up by setupLogging
+'''
+
 
-# running list of faulty time stamps
-badTimes = ['     0/0/0      0:0:0', '2165/165/165 165:165:85']
+def setupLogging():
+    # everything is logged to dataInfo/dataCleaning.log
+    os.makedirs(dataInfoPath, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(dataInfoPath, "dataCleaning.log"),
+        format='%(asctime)s %(levelname)-8s %(message)s',
+        level=logging.INFO,
+        datefmt='%Y-%m-%d %H:%M:%S',
+        force=True)
 
 
-def main():
+def main(workers=1, chunkSize=None, tail=False, progress=None, prefetch=2, writeQueue=8):
+    '''
+    processes every day with stale outputs, one job per day for all of its stale particles.
+    {prefetch} raw files are read ahead on background threads and up to {writeQueue} outputs can
+    wait to be written, 0 turns either off. {progress} is an optional callable, it is called as
+    progress(done, total, particles, date) after each job is written, particles being the job's
+    particles joined by commas, and once as progress(0, total) when the jobs have been planned.
+    the time, cpu time, rows and peak RSS of every stage go to dataInfo/runReport.json and .csv
+    '''
+    started, runStart, runCPU = dt.now(), perf_counter(), time.process_time()
+    os.makedirs(dataInfoPath, exist_ok=True)
 
     # collect and organise all of the data then make it into nice things
-    conditionDictionary = getConditions()
-    # remove old logs from previous run
-    if os.path.exists(os.path.join(dataInfoPath, "interpolation_Effect_Log.txt")):
-        os.remove(os.path.join(dataInfoPath, "interpolation_Effect_Log.txt"))
-    if os.path.exists(os.path.join(dataInfoPath, "time_Frequency_Error_Log.txt")):
-        os.remove(os.path.join(dataInfoPath, "time_Frequency_Error_Log.txt"))
+    conditionDictionary = loadParams()
+    # days whose settings changed since the last run are stale as a whole, see yamlParams.py
+    changed, sections = changedDays(conditionDictionary)
+    if changed:
+        logger.info(f"{sections} changed since the last run, reprocessing {sorted(changed)}")
+    # the days that are skipped keep their log entries from the run that processed them
+    dayLogs = loadDayLogs()
 
     columns = conditionDictionary["Columns"]
     particles = conditionDictionary["Particles"]
@@ -45,250 +66,278 @@ def main():
     dayStart = conditionDictionary["dayStart"]
     dayEnd = conditionDictionary["dayEnd"]
     processAll = conditionDictionary["processAll"]
+    # optional running list of faulty time stamps, anything unparseable is dropped either way
+    badTimes = conditionDictionary.get("badTimes", [])
+
+    # optional settings for the stages that run after parsing
+    stageParams = {"upsampleFactor": conditionDictionary.get("upsampleFactor", 10),
+                   "outputFormat": resolveFormat(conditionDictionary.get("outputFormat", "auto")),
+                   "csvExport": conditionDictionary.get("csvExport", False), "writeQueue": writeQueue,
+                   "rollingStats": resolveRollingStats(conditionDictionary.get("rollingStats"))}
+    # everything a sensor's outputs depend on besides its raw file, see manifest.py
+    settings = {"columns": columns, "badTimes": badTimes, "outputFormat": stageParams["outputFormat"],
+                "csvExport": stageParams["csvExport"]}
+
+    connection = openManifest(manifestPath)
+
+    # the files of every day are looked up once, see dataIndex.py
+    # loadParams has already checked that every entry is a date
+    days = conditionDictionary["Days"]
+
+    index = loadIndex()
+    dayFileLists = {date: dayFiles(index, date, condition["filePattern"]) for date, condition in days.items()}
+    # the manifest and the parse cache check the files against the index, nothing is hashed twice
+    fingerprints = {file: fingerprint(index, file) for files in dayFileLists.values() for file in files}
+
+    # every day with stale outputs becomes a job covering all of its stale particles, in the order the results are logged
+    jobs = []
+    plans = []
+    for date, condition in days.items():
+
+        start = f"{date.replace('-','/')} {dayStart}"
+        end = f"{date.replace('-','/')} {dayEnd}"
+
+        files = dayFileLists[date]
+        logger.info(f"filenames for {condition}:{files}")
+
+        dayParams = dict(settings, start=start, end=end)
+        particlePlans = {}
+        for particle in particles:
+            plan = planJob(connection, particle, date, files, fingerprints, dayParams, sensorsWithNonPSTTime,
+                           stageParams, processAll or date in changed, tail)
+            if plan is None:
+                logger.info(f"skipping {date} {particle}, the manifest shows its outputs are up to date")
+                continue
+            particlePlans[particle] = plan
+        if particlePlans:
+            job, plan = planDay(date, files, start, end, particlePlans)
+            jobs.append(job)
+            plans.append(plan)
+
+    if progress:
+        progress(0, len(jobs))
+
+    parseArgs = (sensorsWithNonPSTTime, columns, badTimes, parseCachePath, fingerprints)
+    results = []
+    if jobs:
+        # numpy and pandas are only loaded once there is something to process
+        import dayProcessing
+        if tail:
+            results = dayProcessing.afterWrites(dayProcessing.runJobsTail(
+                jobs, plans, parseArgs, stageParams, chunkSize or tailChunkSize), writeQueue)
+        elif chunkSize:
+            results = dayProcessing.runJobsChunked(jobs, parseArgs, stageParams, chunkSize, workers)
+        elif workers > 1:
+            results = dayProcessing.runJobsInPool(jobs, parseArgs, stageParams, workers)
+        else:
+            results = dayProcessing.afterWrites(dayProcessing.runJobs(jobs, parseArgs, stageParams, prefetch), writeQueue)
+
+    # results come back in job order, so logs and the manifest are written the same way for any worker count
+    for done, (job, plan, (frequencyLog, interpolationLog, sensors)) in enumerate(zip(jobs, plans, results), 1):
+        particles, date, order = job[0], job[1], job[6]
+        recordDayLogs(dayLogs, date, order, frequencyLog, interpolationLog)
+        writeLogs(dayLogs, days, conditionDictionary["Particles"])
+
+        # recorded as each job finishes, so an interrupted run keeps what it already did.
+        # every sensor that went through the stages was written for all the particles of the job
+        for particle in particles:
+            for sensor, (source, params) in plan["sensors"].items():
+                interpolated = sensor in sensors and sensors[sensor]["interpolated"]
+                recordOutput(connection, date, particle, sensor, source, params, interpolated)
+                if tail and sensor in sensors:
+                    position = plan["positions"][sensor]
+                    recordTail(connection, date, particle, sensor, plan["files"][sensor], params,
+                               position["offset"], position.get("lastTime"), sensors[sensor]["state"])
+            recordOutput(connection, date, particle, "merged", *plan["particles"][particle]["merged"])
+        if progress:
+            progress(done, len(jobs), ", ".join(particles), date)
+    connection.close()
+    if not jobs:
+        writeLogs(dayLogs, days, conditionDictionary["Particles"])
+    recordDayHashes(conditionDictionary)
+    writeReport(dataInfoPath, {
+        "started": started.isoformat(timespec="seconds"), "wall": round(perf_counter() - runStart, 6),
+        "cpu": round(time.process_time() - runCPU, 6), "jobs": len(jobs),
+        "workers": workers, "chunkSize": chunkSize, "tail": tail, "prefetch": prefetch, "writeQueue": writeQueue})
+    return
 
-    for particle in particles:
-
-        for date, condition in conditionDictionary["Days"].items():
-
-            if not processAll:
-                try:
-                    if condition["processed"][particle]:
-                        logger.info(
-                            f"skipping {date}, params file indicates data is already processed")
-                        continue
-                except KeyError:
-                    logger.info(
-                        f"for {date}, {particle} was not set in processed dict")
-                    pass
-
-            filePattern = condition["filePattern"]
-            confirmedFiles = [os.path.join(dirname,file) for file in condition["confirmedFiles"]]
-            start = f"{date.replace('-','/')} {dayStart}"
-            end = f"{date.replace('-','/')} {dayEnd}"
-
-            # this is not a pointer, in python this is the splat operator. This feeds
-            # the list of arguments to os.path.join from a list
-            files = glob.glob(os.path.join(dirname,*filePattern))
-            logger.info(f"filenames for {condition}:{files}")
-
-            data, filesChecked = cleanUp(start, sensorsWithNonPSTTime,
-                                         files, columns, badTimes, date, confirmedFiles)
-
-            checkFileList = set(
-                conditionDictionary["Days"][date]["confirmedFiles"])
-            for specificFile, check in filesChecked.items():
-                if check:
-                    checkFileList.add(specificFile.replace(f"{dirname}{os.path.sep}",''))
-            conditionDictionary["Days"][date]["confirmedFiles"] = list(checkFileList)
-
-            saveToCSV(os.path.join(dirname, "..", "..", "proccessedData",
-                      date, re.sub(r'\W', '', particle)), data)
-
-            logger.debug(data)
-
-            checkDataRecordingPerformance(
-                data, date, particle, start, end)
 
-            interpDF = interpolateMissingData(
-                data, cutOffTime=start, endTime=end, date=date)
-            saveToCSV(os.path.join(dirname, "..", "..", "interpolatedData",
-                      date, re.sub(r'\W', '', particle)), interpDF)
+def loadDayLogs(path=dayLogsPath):
+    # the log entries kept by writeLogs, see recordDayLogs
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as fin:
+        return json.load(fin)
 
-            mergedDataFrame = mergeDataFrames(interpDF, particle)
 
-            saveToCSV(os.path.join(dirname, "..", "..", "mergedData", re.sub(
-                r'\W', '', particle)), {f"mergedData_{date}": mergedDataFrame})
+def recordDayLogs(dayLogs, date, order, frequencyLog, interpolationLog):
+    '''
+    puts the logs of a finished job into {dayLogs}, which is
+    {date: {"frequency": {particle: {sensor: text}}, "interpolation": {sensor: text}}}.
+    the sensors the job didn't go through keep their entries from the run that did, the
+    entries follow the day's sensor {order} and sensors no longer in it are dropped
+    '''
+    day = dayLogs.setdefault(date, {"frequency": {}, "interpolation": {}})
 
-            # Set process flag to True so that time won't be wasted processing old data
-            conditionDictionary["Days"][date]["processed"][particle] = True
+    def merge(old, new):
+        merged = dict(old, **new)
+        return {sensor: merged[sensor] for sensor in order if sensor in merged}
 
-            if not (conditionDictionary == getConditions()):
-                # update the params on each iteration to prevent cleaning the same data file multiple times.
-                logger.info("overwriting yaml parameter file with new params")
-                with open(os.path.join(dirname, "dataCleaningParams.yaml"), 'w') as outfile:
-                    yaml.dump(conditionDictionary, outfile, default_flow_style=False)
-    return
+    day["interpolation"] = merge(day["interpolation"], interpolationLog)
+    for particle, texts in frequencyLog.items():
+        day["frequency"][particle] = merge(day["frequency"].get(particle, {}), texts)
 
 
-def getConditions():
+def writeLogs(dayLogs, days, particles, directory=dataInfoPath, path=dayLogsPath):
     '''
-    yaml file should contain the specific variables for the data cleaning:
-    filePattern, sensorConditions, columns, DataChecking, preCursorFactor, particle
+    rewrites time_Frequency_Error_Log.txt and interpolation_Effect_Log.txt in {directory} from
+    {dayLogs}, in the order of the yaml {days} and {particles}, and keeps {dayLogs} at {path}
+    for the next run. days and particles no longer in the yaml are left out
     '''
-    with open(os.path.join(dirname, "dataCleaningParams.yaml"), "r") as stream:
-        try:
-            allConditions = yaml.safe_load(stream)
-        except yaml.YAMLError as exc:
-            logger.exception(exc)
-    return allConditions
-
-
-def saveToCSV(directory, data):
-    # saving the pandas data frame passed into function as a csv file
-    for x in data:
-        temp = data[x]
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        location = os.path.join(directory, x+'.csv')
-        temp.to_csv(location, index=False)
-    return
-
-
-def checkDataRecordingPerformance(data, date, particle, start, end):
+    for date in [date for date in dayLogs if date not in days]:
+        del dayLogs[date]
+    for day in dayLogs.values():
+        day["frequency"] = {particle: texts for particle, texts in day["frequency"].items() if particle in particles}
+    with atomicWrite(path) as fout:
+        json.dump(dayLogs, fout)
+
+    logged = [(date, dayLogs[date]) for date in days if date in dayLogs]
+    with atomicWrite(os.path.join(directory, "time_Frequency_Error_Log.txt")) as fout:
+        for date, day in logged:
+            for particle in particles:
+                if particle in day["frequency"]:
+                    fout.write(f"{'-'*60}\n{date}\n{'-'*60}\n")
+                    fout.write("".join(day["frequency"][particle].values()))
+    with atomicWrite(os.path.join(directory, "interpolation_Effect_Log.txt")) as fout:
+        for date, day in logged:
+            fout.write(f"\n{date}\n\n")
+            fout.write("".join(day["interpolation"].values()))
+
+
+def planJob(connection, particle, date, files, fingerprints, dayParams, sensorsWithNonPSTTime,
+            stageParams, processAll=False, tail=False):
     '''
-    This function scans through the data set and looks for irregularities in the timestamps
-    This will give a general idea of the health of the device.
-    Also will calculate the percentage of recorded data that is 0, if this count is too high
-    an error is likely to have occoured.
-    Will also tally the amount of lost time between startTime and endTime, i.e. how long the
-    sensor was off during the window where we would like to collect.
+    checks the manifest for the outputs of one (particle, day), the sources of the {files} being
+    the sha1 in their {fingerprints} from dataIndex. with {processAll} everything is stale. returns None when nothing changed, otherwise the plan of manifest rows to record once
+    the day is done: {"sensors": {sensor: (source, params)}, "merged": (source, params)}.
+    the plan also holds the stale sensors' "files", the "fresh" sensors whose interpolated data
+    is up to date in the output store and, in {tail} mode, the tail rows of the sensors that can
+    "resume" from where the last tail run stopped
     '''
-
-    startTime = pd.Timestamp(start)
-    endTime = pd.Timestamp(end)
-
-    directory = os.path.join(dataInfoPath)
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-
-    fout = open(os.path.join(
-        dataInfoPath, 'time_Frequency_Error_Log.txt'), 'a')
-    fout.write(f"{'-'*60}\n{date}\n{'-'*60}\n")
-    errors = {}
-    errorCount = {}
-    # Enter the expected interval here
-    interval = 20
-    for x in data:
-        # errors keeps track of length of each time interval error that occurs
-        errors[x] = set(())
-        # errorCount keeps track of how many times each time interval error occured
-        errorCount[x] = {}
-        # counter keeps track of the total time interval errors per sensor
-        counter = 0
-        # filter the data frame to include only the values we care about
-        temp = data[x][(data[x]["Date_Time"] > startTime)
-                       & (data[x]["Date_Time"] < endTime)]
-
-        for idx, time in enumerate(temp['Date_Time']):
-            try:
-                test = (temp['Date_Time'][idx+1] -
-                        time) <= pd.Timedelta(seconds=interval)
-                if not test:
-                    timeErr = temp['Date_Time'][idx+1] - time
-                    if str(timeErr.seconds) in errorCount[x]:
-                        errorCount[x][str(timeErr.seconds)] += 1
-                    else:
-                        errorCount[x][str(timeErr.seconds)] = 1
-                    errors[x].add(timeErr)
-                    counter += 1
-            except:
-                continue
-        if not temp.empty:
-            timeDeltaStart = pd.Timedelta(seconds=0)
-            timeDeltaEnd = pd.Timedelta(seconds=0)
-            if temp["Date_Time"].iloc[0] > startTime:
-                timeDeltaStart = temp["Date_Time"].iloc[0] - startTime
-            if temp["Date_Time"].iloc[-1] < endTime:
-                timeDeltaEnd = endTime - temp["Date_Time"].iloc[-1]
-            timeDeltaDuring = sum([pd.Timedelta(seconds=int(
-                time))*amount for time, amount in errorCount[x].items()], pd.Timedelta(seconds=0))
-            totalTimeLost = timeDeltaDuring+timeDeltaEnd+timeDeltaStart
-
-            percentZero = round(
-                sum([1 if i == 0 else 0 for i in temp[particle]])/len(temp[particle]), 2)
-            # logger.exception(data)
-            # display the different types of errors
-            listOfErrors = [i.seconds for i in errors[x]]
-            autoFrmt = [f"{{:>{round(math.log(error+1,10))+2}}}"if error >
-                        10**3 else "{:>4}" for error in listOfErrors]
-            frmt = "".join(autoFrmt)
-
-            # display the quantity of each type of error
-            listOfErrorQuantity = [errorCount[x]
-                                   [str(i.seconds)] for i in errors[x]]
-
-            logger.info(f"{x}: counter:{counter}, temp: {len(temp)}")
-            logger.info(
-                f" {str(round(counter/len(temp)*100,2))}% of data set is over {interval} second recording intervals")
-            logger.info(frmt.format(*listOfErrors))
-            logger.info(frmt.format(*listOfErrorQuantity))
-            logString = f"{x}\n"
-            logString += f" {round(totalTimeLost/(endTime - startTime)*100,2)}%  Time lost -- Total Time Lost : {totalTimeLost}\n"
-            logString += f" {str(round(counter/len(temp)*100, 2))}% of data set is over {interval} second recording intervals\n"
-            logString += f' {percentZero*100}% of data set is 0 for paricle size : {particle}\n'
-            logString += f" during: {timeDeltaDuring}\n start: {timeDeltaStart}\n end: {timeDeltaEnd}\n"
-            logString += f" Time Errors {frmt.format(*listOfErrors)}\n"
-            logString += f" # Observed {frmt.format(*listOfErrorQuantity)}\n"
-            fout.write(logString)
-            fout.write('\n')
-
-        else:
-            totalTimeLost = endTime-startTime
-            logger.info(f"no data was found in time range for {x}")
-            fout.write(f"no data was found in time range for {x}\n")
-            fout.write('\n')
-
-    fout.close()
-    return
-
-
-def interpolateMissingData(data, cutOffTime, endTime, date, cutoff: int = 40, freq: str = '10s'):
+    # a later file wins when two share a sensor name, same as in sliceDay
+    sensorFiles = {sensorName(file): file for file in files}
+
+    plan = {"sensors": {}, "files": {}, "resume": {}, "fresh": []}
+    sources = {}
+    for sensor, file in sensorFiles.items():
+        sources[sensor] = fingerprints[file]["sha1"]
+        params = paramsKey(dict(dayParams, offset=sensorsWithNonPSTTime.get(sensor)))
+        row = None if processAll else lookupOutput(connection, date, particle, sensor, sources[sensor], params)
+        interpolatedDir = partitionDir(outputStorePath, "interpolated", date, allParticles, sensor)
+        # a partition left without any complete part by an interrupted write is stale
+        if row is not None and (not row["interpolated"] or partPaths(interpolatedDir)):
+            if row["interpolated"]:
+                plan["fresh"].append(sensor)
+            continue
+        plan["sensors"][sensor] = (sources[sensor], params)
+        plan["files"][sensor] = file
+        resume = lookupTail(connection, date, particle, sensor, file, params) if tail and not processAll else None
+        if resume is not None:
+            plan["resume"][sensor] = resume
+
+    mergedSource = paramsKey(sources)
+    mergedParams = paramsKey(dict(dayParams, upsampleFactor=stageParams["upsampleFactor"],
+                                  rollingStats=stageParams["rollingStats"]))
+    plan["merged"] = (mergedSource, mergedParams)
+    if not plan["files"] and lookupOutput(connection, date, particle, "merged", mergedSource, mergedParams):
+        return None
+    return plan
+
+
+def planDay(date, files, start, end, particlePlans):
     '''
-    takes in a dictionary object {data} with n pandas data frames as values. then handles calling fillDf
-    with the specified parameter to interpolate the data. defualt set to 10 second intervals and won't interpolate data over 40 seconds
-    you can reduce the time frequency lower, however this can drastically increase the time it take to run the data cleaning process,
-    especially with larger sets of data.
+    puts the {particlePlans} of one day, {particle: plan from planJob}, together into a single
+    job, so the day's files are parsed and resampled once for all of the particles. a sensor
+    that is stale for any of them goes through the stages for all of them, only the sensors up
+    to date for every particle are read back from the output store for the merge. a tail row
+    is only resumed from when every particle stopped at the same byte of the file.
+    returns the job (particles, date, files, start, end, reused, order), order being the day's
+    sensors in the order of its files, and the plan of the day,
+    {"particles": particlePlans} with the "sensors", "files" and "resume" of the job
     '''
-    fout = open(os.path.join(
-        dataInfoPath, 'interpolation_Effect_Log.txt'), 'a')
-    interpDF = {}
-    fout.write(f"\n{date}\n\n")
-    for x in data:
-        df = data[x]
-        try:
-            interpDF[x], accuracy = fillDf(
-                df, freq, cutOffTime, endTime, cutoff)
-            logger.info(f"{x}     {accuracy}")
-            fout.write(f"{x}\n{accuracy[0]}\n{accuracy[1]}\n{accuracy[2]}\n\n")
-        except IndexError:
-            logger.exception(f"{x} NO DATA")
-            fout.write(f"{x} NO DATA\n")
-    fout.close()
-    return interpDF
-
-
-def mergeDataFrames(interpDF, particle):
-
-    length_list = []
-    for x in interpDF:
-        length_list.append(len(interpDF[x]))
-    lowValue = min(length_list)
-    lowIDX = length_list.index(lowValue)
-    columns = list(interpDF.keys())
-    mergedData = pd.DataFrame(
-        {'Date_Time': interpDF[columns[lowIDX]]['Date_Time']})
-
-    for idx, column in enumerate(columns):
-        mergedData[column] = interpDF[column][particle]
-    mergedData['Average'] = np.mean(mergedData, axis=1)
-    mergedData['Variance'] = np.var(mergedData, axis=1)
-    for i in mergedData:
-        tempFrame = mergedData.values
-        tempList = []
-        for idx, x in enumerate(tempFrame):
-            try:
-                increment = (tempFrame[idx+1] - x)/10
-                for count in range(10):
-                    tempList.append(x+increment*count)
-            except IndexError:
-                tempList.append(x)
-                continue
-        hiResMergedDF = pd.DataFrame(tempList, columns=mergedData.keys())
-    return hiResMergedDF
-
-
-if __name__ == "__main__":
+    plan = {"particles": particlePlans, "sensors": {}, "files": {}, "resume": {}}
+    for particlePlan in particlePlans.values():
+        plan["sensors"].update(particlePlan["sensors"])
+        plan["files"].update(particlePlan["files"])
+    # in the order planJob found them, which is the order of the sensors in sliceDay
+    sensorFiles = {sensorName(file): file for file in files}
+    staleFiles = [file for sensor, file in sensorFiles.items() if sensor in plan["files"]]
+
+    for sensor in plan["files"]:
+        rows = [particlePlan["resume"].get(sensor) for particlePlan in particlePlans.values()]
+        if all(rows) and len({row["offset"] for row in rows}) == 1:
+            plan["resume"][sensor] = rows[0]
+
+    # the interpolated block holds every particle column, it is stored once for all of them
+    first = next(iter(particlePlans))
+    fresh = [sensor for sensor in particlePlans[first]["fresh"] if sensor not in plan["files"] and
+             all(sensor in particlePlan["fresh"] for particlePlan in particlePlans.values())]
+    from outputStore import readPartition
+    reused = {}
+    for sensor in fresh:
+        frame = readPartition(partitionDir(outputStorePath, "interpolated", date, allParticles, sensor))
+        reused[sensor] = {"columns": list(frame.columns[1:]), "block": frame.iloc[:, 1:].to_numpy()}
+    return (list(particlePlans), date, staleFiles, start, end, reused, list(sensorFiles)), plan
+
+
+def addArguments(parser):
+    # the command line options of a run, shared with python -m project clean
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to spread the files and days over")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream the raw files this many rows at a time instead of reading them whole")
+    parser.add_argument("--tail", action="store_true",
+                        help="only parse the rows appended to the raw files since the last tail run")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"],
+                        help="profile the run, only the main process is profiled when running with workers")
+    parser.add_argument("--prefetch", type=int, default=2,
+                        help="raw files read ahead of the jobs on background threads, 0 reads them as they are needed")
+    parser.add_argument("--writequeue", type=int, default=8,
+                        help="outputs that can wait to be written before the stages wait for the disk, 0 writes them in line")
+
+
+def run(args):
+    # runs main with the parsed command line {args}, under the profiler when one was asked for
     start = perf_counter()
-    main()
+    if args.profile == "cprofile":
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.runcall(main, workers=args.workers, chunkSize=args.chunksize, tail=args.tail,
+                         prefetch=args.prefetch, writeQueue=args.writequeue)
+        profiler.dump_stats(os.path.join(dataInfoPath, "profile.prof"))
+        with open(os.path.join(dataInfoPath, "profile.txt"), "w") as fout:
+            pstats.Stats(profiler, stream=fout).sort_stats("cumulative").print_stats(40)
+    elif args.profile == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start(10)
+        main(workers=args.workers, chunkSize=args.chunksize, tail=args.tail,
+             prefetch=args.prefetch, writeQueue=args.writequeue)
+        snapshot = tracemalloc.take_snapshot()
+        with open(os.path.join(dataInfoPath, "tracemalloc.txt"), "w") as fout:
+            fout.write(f"peak traced memory {tracemalloc.get_traced_memory()[1] / 2**20:.1f} MB\n")
+            for stat in snapshot.statistics("lineno")[:40]:
+                fout.write(f"{stat}\n")
+        tracemalloc.stop()
+    else:
+        main(workers=args.workers, chunkSize=args.chunksize, tail=args.tail,
+             prefetch=args.prefetch, writeQueue=args.writequeue)
     end = perf_counter()
     logger.info(end-start)
+
+
+if __name__ == "__main__":
+    setupLogging()
+    parser = argparse.ArgumentParser(description="clean, interpolate and merge the sensor data")
+    addArguments(parser)
+    run(parser.parse_args())
@@ -0,0 +1,119 @@
+import fnmatch
+import glob
+import json
+import logging
+import os
+from dataPaths import atomicWrite, dataInfoPath, dataPath, dayKey, fileFingerprint, parseFileName, sensorPattern
+
+dirname = os.path.dirname(__file__)
+# file names and fingerprints of the last index, see loadIndex
+indexCachePath = os.path.join(dataInfoPath, "dataIndex.json")
+logger = logging.getLogger("data-index")
+logger.propagate = True
+
+'''
+Index of the raw files in Data, built once per run:
+
+    directory: the folder that was indexed
+    files    : {path: {"sensor", "stamp", "days", "size", "mtime", "sha1"}}
+    byDay    : {(year, month, day): [paths]}      <---- year is None for files named with a range
+    bySensor : {sensor: [paths]}
+
+the sensor and days come from the file name, see dataPaths.parseFileName, and are kept in
+dataInfo/dataIndex.json. adding, removing or renaming a file changes the folder's mtime and
+the names are parsed again, appending to a file doesn't so size and mtime are always read
+fresh. the sha1 of each file is kept in dataIndex.json too and only worked out again for the
+files whose size or mtime changed, the manifest and the parse cache take their fingerprints
+from here rather than hashing the files again, see fingerprint. paths are joined the same way
+the yaml filePatterns are, and kept in directory order
+'''
+
+
+def loadIndex(directory=dataPath, cachePath=indexCachePath):
+    folderTime = os.stat(directory).st_mtime_ns
+    names = None
+    fingerprints = {}
+    if cachePath and os.path.exists(cachePath):
+        with open(cachePath, "r") as fin:
+            cached = json.load(fin)
+        if cached["directory"] == os.path.abspath(directory):
+            fingerprints = cached.get("fingerprints", {})
+            if cached["mtime"] == folderTime:
+                names = cached["names"]
+    changed = names is None
+    if names is None:
+        names = {}
+        for entry in os.scandir(directory):
+            if not (entry.name.endswith(".txt") and entry.is_file()):
+                continue
+            parsed = parseFileName(entry.name)
+            sensor = sensorPattern.match(entry.name)
+            if parsed is None and sensor:
+                # no date in the name, the file can still be picked out by a filePattern
+                parsed = {"sensor": sensor[0], "stamp": None, "days": []}
+            names[entry.name] = parsed
+        unnamed = [name for name, parsed in names.items() if parsed is None]
+        if unnamed:
+            logger.warning(f"can't tell the sensor of {unnamed}, they are left out of the index")
+
+    index = {"directory": directory, "files": {}, "byDay": {}, "bySensor": {}, "others": {}}
+    for name, parsed in names.items():
+        if parsed is None:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+            fingerprint = fingerprints.get(name)
+            # the contents are only hashed again when the size or mtime moved
+            if not fingerprint or (fingerprint["size"], fingerprint["mtime"]) != (stat.st_size, stat.st_mtime_ns):
+                fingerprint = fingerprints[name] = fileFingerprint(path)
+                changed = True
+        except FileNotFoundError:
+            continue
+        days = [tuple(day) for day in parsed["days"]]
+        index["files"][path] = dict(parsed, days=days, **fingerprint)
+        for day in days:
+            index["byDay"].setdefault(day, []).append(path)
+        index["bySensor"].setdefault(parsed["sensor"], []).append(path)
+
+    if cachePath and changed:
+        os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+        fingerprints = {name: fingerprints[name] for name in names if name in fingerprints}
+        with atomicWrite(cachePath) as fout:
+            json.dump({"directory": os.path.abspath(directory), "mtime": folderTime, "names": names,
+                       "fingerprints": fingerprints}, fout)
+    return index
+
+
+def dayFiles(index, date, filePattern=None):
+    '''
+    the files holding data for the yaml {date}, i.e. every file named with that day or with a
+    range covering it, plus anything else the day's {filePattern} picks out. a pattern in Data
+    is matched against the index, one pointing anywhere else is globbed like it always was
+    '''
+    named = set()
+    if dayKey(date) is not None:
+        year, month, day = dayKey(date)
+        named.update(index["byDay"].get((year, month, day), []), index["byDay"].get((None, month, day), []))
+    others = []
+    if filePattern:
+        pattern = os.path.join(dirname, *filePattern)
+        if os.path.abspath(os.path.dirname(pattern)) == os.path.abspath(index["directory"]):
+            named.update(path for path in index["files"]
+                         if fnmatch.fnmatch(os.path.basename(path), os.path.basename(pattern)))
+        else:
+            others = glob.glob(pattern)
+    return [path for path in index["files"] if path in named] + others
+
+
+def fingerprint(index, path):
+    '''
+    {"size", "mtime", "sha1"} of {path}, straight from the index for the files in Data. a file a
+    filePattern picks out anywhere else is hashed the first time it is asked for
+    '''
+    entry = index["files"].get(path)
+    if entry is None:
+        if path not in index["others"]:
+            index["others"][path] = fileFingerprint(path)
+        entry = index["others"][path]
+    return {key: entry[key] for key in ("size", "mtime", "sha1")}
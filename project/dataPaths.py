@@ -0,0 +1,149 @@
+import datetime
+import glob
+import hashlib
+import importlib.util
+import os
+import re
+from contextlib import contextmanager
+
+dirname = os.path.dirname(__file__)
+# settings of the pipeline, see yamlParams.py
+paramsPath = os.path.join(dirname, "dataCleaningParams.yaml")
+# raw sensor files, see dataIndex.py
+dataPath = os.path.join(dirname, "..", "Data")
+dataInfoPath = os.path.join(dirname, "..", "..", "dataInfo")
+# cleaned raw files are cached here between runs, see parseCache.py
+parseCachePath = os.path.join(dirname, "..", "..", "parseCache")
+# typed output of every stage, see outputStore.py
+outputStorePath = os.path.join(dirname, "..", "..", "outputStore")
+# what every output in the store was derived from, see manifest.py
+manifestPath = os.path.join(dataInfoPath, "manifest.sqlite")
+# folders of the optional csv export
+csvFolders = {"processed": "proccessedData", "interpolated": "interpolatedData", "merged": "mergedData",
+              "rollingStats": "mergedData"}
+storeFormats = ("parquet", "feather", "npy")
+# the processed and interpolated frames of a sensor hold every column whatever the particle, so
+# they are stored once per day and sensor under this folder in place of a particle
+allParticles = "all"
+# statistics the rollingStats stage can work out besides quantiles, see rollingStats.py
+rollingStatNames = ("mean", "variance", "min", "max", "corr")
+sensorPattern = re.compile(r"[a-zA-Z]+\d+")
+# A16_4_13_22.txt or A16-5-13_5-17.txt, see parseFileName
+fileNamePattern = re.compile(r"(?P<sensor>[a-zA-Z]+\d+)[-_]"
+                             r"(?P<stamp>\d{1,2}[-_]\d{1,2}[-_]\d{1,2}(?:[-_]\d{1,2})?)\.txt$")
+
+'''
+Where everything lives and what it is called. only the standard library is imported here,
+so deciding what needs to be processed never has to load pandas or pyarrow
+'''
+
+
+def sensorName(file):
+    # the letters and digits the file name starts with, e.g. A16 for ../Data/A16_4_13_22.txt
+    return sensorPattern.match(os.path.basename(file))[0]
+
+
+def parseFileName(name):
+    '''
+    reads the sensor and dates out of a raw file name, "-" and "_" can be mixed freely:
+
+        A16_4_13_22.txt, A16-4-13-22.txt, A16_4-14-22.txt   <---- one day, M D YY
+        A16-5-13_5-17.txt                                   <---- every day from 5/13 to 5/17, no year
+
+    returns {"sensor", "stamp", "days"} with days as [(year, month, day)], year is None for a
+    range of days. None for names that follow neither form
+    '''
+    match = fileNamePattern.match(name)
+    if match is None:
+        return None
+    numbers = [int(number) for number in re.split(r"[-_]", match["stamp"])]
+    if len(numbers) == 3:
+        month, day, year = numbers
+        days = [(2000 + year, month, day)]
+    else:
+        # a leap year so 2/29 can be in a range, ranges over new year run into the next one
+        try:
+            first = datetime.date(2000, numbers[0], numbers[1])
+            last = datetime.date(2000, numbers[2], numbers[3])
+        except ValueError:
+            return None
+        if last < first:
+            last = last.replace(year=2001)
+        days = [(None, date.month, date.day) for date in
+                (first + datetime.timedelta(days=offset) for offset in range((last - first).days + 1))]
+    return {"sensor": match["sensor"], "stamp": match["stamp"], "days": days}
+
+
+def dayKey(date):
+    # (year, month, day) of a yaml date like 4-13-22 or 05-13-22, None for anything else e.g. MM-dd-YY
+    match = re.fullmatch(r"(\d{1,2})-(\d{1,2})-(\d{2})", date)
+    if match is None:
+        return None
+    month, day, year = (int(number) for number in match.groups())
+    return (2000 + year, month, day)
+
+
+def partitionDir(storeDir, stage, date, particle, sensor):
+    return os.path.join(storeDir, stage, date, particle, sensor)
+
+
+@contextmanager
+def atomicWrite(path, mode="w"):
+    '''
+    open file to write {path} with. the data goes to a temporary file that is only renamed over
+    {path} once it is complete, so a crash never leaves half a file behind and anything reading
+    {path} sees either the old contents or the new ones
+    '''
+    tempPath = path + ".tmp"
+    try:
+        with open(tempPath, mode) as fout:
+            yield fout
+    except BaseException:
+        os.remove(tempPath)
+        raise
+    os.replace(tempPath, path)
+
+
+def fileFingerprint(file, blockSize=1 << 20):
+    # size and mtime are cheap to check, the content hash is what caches are validated against
+    stat = os.stat(file)
+    sha1 = hashlib.sha1()
+    with open(file, 'rb') as fin:
+        for block in iter(lambda: fin.read(blockSize), b''):
+            sha1.update(block)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha1": sha1.hexdigest()}
+
+
+def partPaths(directory):
+    # the complete parts of a partition of the output store in the order they were written
+    return [path for path in sorted(glob.glob(os.path.join(directory, "part-*")))
+            if not os.path.isdir(path) or os.path.exists(os.path.join(path, "meta.json"))]
+
+
+def resolveFormat(outputFormat='auto'):
+    # auto picks parquet when pyarrow is installed and falls back to npy parts otherwise
+    hasArrow = importlib.util.find_spec("pyarrow") is not None
+    if outputFormat == 'auto':
+        return 'parquet' if hasArrow else 'npy'
+    if outputFormat not in storeFormats:
+        raise ValueError(f"unknown output format {outputFormat}, expected auto or one of {storeFormats}")
+    if outputFormat != 'npy' and not hasArrow:
+        raise ImportError(f"pyarrow is needed to write {outputFormat}, use outputFormat: npy instead")
+    return outputFormat
+
+
+def resolveRollingStats(setting):
+    # the rollingStats yaml entry with the missing keys filled in, None when the stage is off
+    if not setting:
+        return None
+    settings = {"windows": [str(window) for window in setting.get("windows", [])],
+                "stats": list(setting.get("stats", [])),
+                "quantiles": [float(q) for q in setting.get("quantiles", [])]}
+    unknown = [stat for stat in settings["stats"] if stat not in rollingStatNames]
+    if unknown:
+        raise ValueError(f"unknown rolling stats {unknown}, expected some of {rollingStatNames}")
+    if not all(0 <= q <= 1 for q in settings["quantiles"]):
+        raise ValueError(f"rolling stats quantiles have to be between 0 and 1, got {settings['quantiles']}")
+    if not settings["windows"] or not (settings["stats"] or settings["quantiles"]):
+        raise ValueError("rollingStats needs at least one window and one of stats or quantiles")
+    return settings
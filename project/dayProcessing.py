@@ -0,0 +1,516 @@
+import io
+import logging
+import os
+import re
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import pandas as pd
+from backgroundIO import BackgroundWriter, Prefetcher
+from fillDataFrame import fillArrays, fillChunk, finishFill, resampleState, timeGrid
+from cleanUpData import dayChunks, ingestFiles, sensorName, sliceDay, sliceDayChunks
+from rollingStats import rollingStatsFrame
+from recordingHealth import SensorHealth, sensorHealth, updateHealth, renderHealth
+from outputStore import writePart
+from sensorSeries import SensorSeries, asSeries
+from sharedFrames import startTracking, shareSeries, attachSeries, releaseFrame
+from stageMetrics import measure, mergeRecords, popRecords
+from dataPaths import allParticles, csvFolders, dataInfoPath, outputStorePath
+
+dirname = os.path.dirname(__file__)
+logger = logging.getLogger("data-cleaning")
+logger.propagate = True
+# while a runner has background writes open saveOutput hands the frames to it, see backgroundWrites
+outputWriter = None
+# the time grid every sensor is resampled onto, the longest gap in seconds that is interpolated
+# rather than 0 padded, and the recording interval in seconds the health check expects
+gridFreq = '10s'
+gapCutoff = 40
+recordingInterval = 20
+
+'''
+The stages every day's job goes through once dataCleaning has decided it is stale,
+and the runners that feed the jobs through them one at a time, on a pool of processes,
+chunked or in tail mode. this is where numpy and pandas come in, dataCleaning only imports
+it when there is something to process.
+the outputs are written on a background thread, stageParams["writeQueue"] sets how many frames
+can be waiting to be written before the stages have to wait for the disk, see backgroundIO.py
+'''
+
+
+def runJobsTail(jobs, plans, parseArgs, stageParams, chunkSize):
+    '''
+    tail mode for files that are still being appended to. a sensor with a tail row only has the
+    lines after its byte offset parsed, and its stages carry on from the saved state, so a
+    refresh costs about as much as the new rows. processed data is appended to the store and
+    the interpolated data of the day is rewritten from the carried over blocks.
+    the byte offset and last timestamp read from each file go into plan["positions"]
+    '''
+    sensorsWithNonPSTTime, columns, badTimes, cacheDir, fingerprints = parseArgs
+    for (particles, date, files, start, end, reused, order), plan in zip(jobs, plans):
+        plan["positions"] = {}
+        data = {}
+        for file in files:
+            name = sensorName(file)
+            resume = plan["resume"].get(name)
+            plan["positions"][name] = {"offset": 0}
+            if resume:
+                # a file without new rows keeps the last timestamp read from it before
+                plan["positions"][name].update(offset=resume["offset"], lastTime=resume["lastTime"])
+                logger.info(f"{name}: carrying on from byte {resume['offset']}, last read {resume['lastTime']}")
+            data[name] = dayChunks(file, columns, badTimes, sensorsWithNonPSTTime, start, chunkSize,
+                                   plan["positions"][name])
+        resume = {name: row["state"] for name, row in plan["resume"].items()}
+        yield processDay(particles, date, data, start, end, stageParams, reused, resume, order)
+
+
+def runJobs(jobs, parseArgs, stageParams, prefetch=2):
+    '''
+    runs every job one after another in this process, yielding results as they finish.
+    every raw file is parsed once per run into the sensor table, keyed by file path.
+    the day jobs only slice their window out of it. the files are parsed on
+    {prefetch} background threads in the order the jobs need them, so the next job's files
+    are being read while the current job is processed
+    '''
+    sensorTable = {}
+    runFiles = dict.fromkeys(file for job in jobs for file in job[2])
+    with Prefetcher(runFiles, lambda file: parseFile(file, *parseArgs), prefetch) as prefetcher:
+        for particles, date, files, start, end, reused, order in jobs:
+            for file in files:
+                if file not in sensorTable:
+                    # files that could not be parsed come back as None, they are tried again by the next job
+                    entry = prefetcher.get(file)
+                    if entry is not None:
+                        sensorTable[file] = entry
+            data = sliceDay(sensorTable, files, start)
+            yield processDay(particles, date, data, start, end, stageParams, reused, order=order)
+
+
+@contextmanager
+def backgroundWrites(writeQueue):
+    # saveOutput queues its frames on a BackgroundWriter for the duration of the with block
+    global outputWriter
+    writer = BackgroundWriter(writeQueue)
+    outputWriter = writer
+    try:
+        yield writer
+    finally:
+        outputWriter = None
+        writer.close()
+
+
+def afterWrites(results, writeQueue):
+    '''
+    runs the jobs of the runner {results} with their outputs written in the background.
+    a result is only handed on once everything its job wrote is on disk, so the manifest never
+    gets ahead of the store, but the next job is already running while those writes finish
+    '''
+    with backgroundWrites(writeQueue) as writer:
+        written = None
+        for result in results:
+            if written is not None:
+                yield written.result()
+            written = writer.barrier(result)
+        if written is not None:
+            yield written.result()
+
+
+def runJobsInPool(jobs, parseArgs, stageParams, workers):
+    '''
+    runs the jobs on a pool of {workers} processes as a small task graph. every raw file is
+    parsed once by a parseTask, and each day's job is submitted as soon as all of
+    its files are parsed. parsed frames stay in shared memory, only handles to them are
+    pickled. results are yielded in job order no matter which job finishes first
+    '''
+    parsing = {}
+    startTracking()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for file in dict.fromkeys(file for job in jobs for file in job[2]):
+                parsing[file] = pool.submit(parseTask, file, *parseArgs)
+            pending = dict(enumerate(jobs))
+            running = {}
+            while pending:
+                for idx, (particles, date, files, start, end, reused, order) in list(pending.items()):
+                    if all(parsing[file].done() for file in files):
+                        # files that could not be parsed come back as None and are left out
+                        handles = {file: parsing[file].result() for file in files}
+                        handles = {file: handle for file, handle in handles.items() if handle}
+                        for handle in handles.values():
+                            # a file's read stages are only folded in once, by the first job using it
+                            mergeRecords(handle.pop("metrics", []))
+                        running[idx] = pool.submit(dayTask, particles, date, handles, start, end, reused, order,
+                                                   stageParams)
+                        del pending[idx]
+                if pending:
+                    wait([parsing[file] for job in pending.values() for file in job[2]],
+                         return_when=FIRST_COMPLETED)
+            for idx in range(len(jobs)):
+                result, metrics = running[idx].result()
+                mergeRecords(metrics)
+                yield result
+    finally:
+        for file, future in parsing.items():
+            if future.done() and not future.exception() and future.result():
+                releaseFrame(future.result()["data"])
+
+
+def parseFile(file, sensorsWithNonPSTTime, columns, badTimes, cacheDir, fingerprints=None):
+    # the sensor table entry of one raw file, None when it could not be parsed
+    sensorTable = {}
+    ingestFiles(sensorTable, sensorsWithNonPSTTime, [file], columns, badTimes, cacheDir, fingerprints)
+    return sensorTable.get(file)
+
+
+def parseTask(file, sensorsWithNonPSTTime, columns, badTimes, cacheDir, fingerprints=None):
+    # runs in a pool worker, parses one raw file and moves its frame into shared memory
+    entry = parseFile(file, sensorsWithNonPSTTime, columns, badTimes, cacheDir, fingerprints)
+    if entry is None:
+        return None
+    return {"name": entry["name"], "mod": entry["mod"], "data": shareSeries(entry["data"]), "metrics": popRecords()}
+
+
+def dayTask(particles, date, handles, start, end, reused, order, stageParams):
+    # runs in a pool worker, rebuilds the sensor table from shared memory and processes one day
+    sensorTable = {file: {"name": handle["name"], "mod": handle["mod"], "data": attachSeries(handle["data"])}
+                   for file, handle in handles.items()}
+    data = sliceDay(sensorTable, list(handles), start)
+    with backgroundWrites(stageParams["writeQueue"]) as writer:
+        result = processDay(particles, date, data, start, end, stageParams, reused, order=order)
+        writer.barrier().result()
+    return result, popRecords()
+
+
+def runJobsChunked(jobs, parseArgs, stageParams, chunkSize, workers=1):
+    '''
+    runs every job straight off the raw files, {chunkSize} rows at a time. nothing is kept
+    between jobs, so a file shared by several days is read again for each of them
+    and the parse cache is skipped, in exchange memory use stays flat however long the
+    recordings are. with more than one of {workers} the jobs run side by side in a pool
+    '''
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(chunkedDayTask, *job, parseArgs, stageParams, chunkSize) for job in jobs]
+            for future in futures:
+                result, metrics = future.result()
+                mergeRecords(metrics)
+                yield result
+    else:
+        for job in jobs:
+            result, metrics = chunkedDayTask(*job, parseArgs, stageParams, chunkSize)
+            mergeRecords(metrics)
+            yield result
+
+
+def chunkedDayTask(particles, date, files, start, end, reused, order, parseArgs, stageParams, chunkSize):
+    # streams one day from its raw files, may run in a pool worker.
+    # the stage timings of the job are handed back with the result
+    sensorsWithNonPSTTime, columns, badTimes, cacheDir, fingerprints = parseArgs
+    data = sliceDayChunks(sensorsWithNonPSTTime, files, columns, badTimes, start, chunkSize)
+    with backgroundWrites(stageParams["writeQueue"]) as writer:
+        result = processDay(particles, date, data, start, end, stageParams, reused, order=order)
+        writer.barrier().result()
+    return result, popRecords()
+
+
+def processDay(particles, date, data, start, end, stageParams, reused=None, resume=None, order=None):
+    '''
+    runs the health check, interpolation, merge and rolling stats for one day and saves the
+    outputs of each of the {particles}. the resampler works on every column of a sensor at
+    once, so each sensor is only checked, resampled and written once however many particles
+    there are, its processed and interpolated frames go under the allParticles folder of the
+    store. the merge upsamples the particle columns together before slicing out each particle.
+    {data} is {sensorName: SensorSeries}, or {sensorName: iterable of SensorSeries chunks} in
+    chunked mode, data frames are accepted too. each sensor goes through the stages one chunk
+    at a time, so apart from the chunk being worked on only the day's resampled grid is held
+    in memory.
+    the text logs are returned per sensor rather than appended to dataInfo, so the caller can
+    keep the entries of each day and write them in a fixed order. {stageParams} holds the
+    optional yaml settings for the stages.
+    {reused} is {sensorName: interpolated block} of sensors that are already up to date in the
+    output store, they are only merged in. {resume} is {sensorName: state} of sensors whose
+    {data} only holds the rows appended since the state was returned by an earlier call.
+    {order} lists the sensors of the day in the order of its files, the merged columns follow it.
+    returns (time frequency log, interpolation log, {sensorName: {"interpolated", "state"}}),
+    the logs being {particle: {sensorName: text}} and {sensorName: text} of the sensors that went
+    through the stages, and interpolated whether the sensor had data in the window
+    '''
+    frequencyLog = {}
+    interpolationLog = {}
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(data)
+
+    reports = {}
+    interp = {"grid": timeGrid(start, end, gridFreq), "sensors": {}}
+    sensors = {}
+    for x, chunks in data.items():
+        if isinstance(chunks, (pd.DataFrame, SensorSeries)):
+            chunks = [chunks]
+        # everything the stages carry from one chunk to the next, a tail run picks it up again
+        state = (resume or {}).get(x) or {
+            "report": SensorHealth(x, pd.Timestamp(start), pd.Timestamp(end), recordingInterval),
+            "health": {}, "resample": resampleState(), "blocks": [], "parts": 0, "columns": None}
+        for chunk in chunks:
+            chunk = asSeries(chunk, x)
+            saveOutput("processed", date, allParticles, x, chunk.toFrame(), stageParams, state["parts"])
+            state["parts"] += 1
+            # the stages below cover every particle, their metrics aren't put down to any one of them
+            with measure("health", x, date, "", len(chunk)):
+                updateHealth(state["report"], state["health"], chunk)
+            with measure("resample", x, date, "", len(chunk)) as counts:
+                state["blocks"].append(fillChunk(chunk, interp["grid"], gapCutoff, state["resample"]))
+                counts["rowsOut"] = len(state["blocks"][-1])
+            state["columns"] = chunk.columns
+        if state["columns"] is None:
+            # none of the sensor's file could be read, it is left out like in ingestFiles
+            continue
+
+        reports[x] = state["report"]
+        state["blocks"] = [np.concatenate(state["blocks"], 0)]
+        try:
+            # padding the rest of the day works on copies, the state stays where the data stopped
+            with measure("resample", x, date, "") as counts:
+                block, accuracy = finishFill(list(state["blocks"]), interp["grid"], dict(state["resample"]))
+                # only the padding is new, the rest of the block was counted as the chunks went through
+                counts["rowsOut"] = len(block) - len(state["blocks"][0])
+            interp["sensors"][x] = {"columns": state["columns"], "block": block}
+        except IndexError:
+            accuracy = None
+        text = io.StringIO()
+        logAccuracy(x, accuracy, text)
+        interpolationLog[x] = text.getvalue()
+        sensors[x] = {"interpolated": accuracy is not None, "state": state}
+
+    for particle in particles:
+        frequencyLog[particle] = {x: healthText(x, report, particle) for x, report in reports.items()}
+
+    # the per sensor frames only exist one at a time while they are being written
+    for x in interp["sensors"]:
+        saveOutput("interpolated", date, allParticles, x, interpolatedFrame(interp, x), stageParams)
+
+    interp["sensors"].update(reused or {})
+    if order:
+        # the same column order as a full run, whichever of the sensors had to be processed again
+        interp["sensors"] = {x: interp["sensors"][x] for x in order if x in interp["sensors"]}
+    with measure("merge", "merged", date, "",
+                 sum(len(entry["block"]) for entry in interp["sensors"].values())) as counts:
+        mergedFrames = mergeParticles(interp, particles, stageParams["upsampleFactor"])
+        counts["rowsOut"] = sum(len(frame) for frame in mergedFrames.values())
+
+    for particle, mergedDataFrame in mergedFrames.items():
+        saveOutput("merged", date, particle, "merged", mergedDataFrame, stageParams)
+        if stageParams["rollingStats"]:
+            # a stage of its own, so loading the merged stage only ever gives the merged data
+            with measure("stats", "merged", date, particle, len(mergedDataFrame)):
+                statsFrame = rollingStatsFrame(mergedDataFrame, list(interp["sensors"]), stageParams["rollingStats"])
+            saveOutput("rollingStats", date, particle, "merged", statsFrame, stageParams)
+
+    return frequencyLog, interpolationLog, sensors
+
+
+def saveOutput(stage, date, particle, name, df, stageParams, part=0):
+    '''
+    writes one frame of a stage to the output store, see outputStore.py. chunked runs write a
+    part per chunk. with csvExport set the frame also goes to the csv folders the way it used
+    to, proccessedData/{date}/all, interpolatedData/{date}/all and mergedData/{particle}, the
+    rolling stats going next to the merged data.
+    inside backgroundWrites the frame is queued and written on the writer thread
+    '''
+    if outputWriter is None:
+        timedWrite(stage, date, particle, name, df, stageParams, part)
+    else:
+        outputWriter.submit(timedWrite, stage, date, particle, name, df, stageParams, part)
+
+
+def timedWrite(stage, date, particle, name, df, stageParams, part):
+    with measure("write", name, date, particle, len(df)):
+        writeOutput(stage, date, particle, name, df, stageParams, part)
+
+
+def writeOutput(stage, date, particle, name, df, stageParams, part):
+    particleDir = re.sub(r'\W', '', particle)
+    writePart(outputStorePath, stage, date, particleDir, name, df, part, stageParams["outputFormat"])
+    if not stageParams["csvExport"]:
+        return
+
+    if stage in ("merged", "rollingStats"):
+        directory = os.path.join(dirname, "..", "..", csvFolders[stage], particleDir)
+        name = f"mergedData_{date}" if stage == "merged" else f"{stage}_{date}"
+    else:
+        directory = os.path.join(dirname, "..", "..", csvFolders[stage], date, particleDir)
+    # pool workers writing the same particle's csvs can get here at the same time
+    os.makedirs(directory, exist_ok=True)
+    # the first part starts the file with a header, later chunks are appended to it
+    df.to_csv(os.path.join(directory, name+'.csv'), index=False,
+              mode='a' if part else 'w', header=not part)
+
+
+def checkDataRecordingPerformance(data, date, particle, start, end, fout=None, interval: int = recordingInterval):
+    '''
+    This function scans through the data set and looks for irregularities in the timestamps
+    This will give a general idea of the health of the device.
+    Also will calculate the percentage of recorded data that is 0, if this count is too high
+    an error is likely to have occoured.
+    Will also tally the amount of lost time between startTime and endTime, i.e. how long the
+    sensor was off during the window where we would like to collect.
+    {interval} is the expected recording interval in seconds.
+    the report is written to the open text file {fout}, or appended to the log in dataInfo.
+    returns {sensorName: SensorHealth}, see recordingHealth.py
+    '''
+    reports = {x: sensorHealth(data[x], x, start, end, interval) for x in data}
+
+    closeLog = fout is None
+    if closeLog:
+        fout = open(os.path.join(
+            dataInfoPath, 'time_Frequency_Error_Log.txt'), 'a')
+    writeHealthLog(reports, date, particle, fout)
+    if closeLog:
+        fout.close()
+    return reports
+
+
+def writeHealthLog(reports, date, particle, fout):
+    # writes the {sensorName: SensorHealth} reports for one day to the open text file {fout}
+    fout.write(f"{'-'*60}\n{date}\n{'-'*60}\n")
+    for x, report in reports.items():
+        fout.write(healthText(x, report, particle))
+
+
+def healthText(sensor, report, particle):
+    # the entry of one sensor's SensorHealth report in the time frequency log
+    if report.samples:
+        logger.info(f"{sensor}: gaps:{report.gaps}, samples: {report.samples}, gap lengths: {report.gapHistogram}")
+    else:
+        logger.info(f"no data was found in time range for {sensor}")
+    return renderHealth(report, particle) + '\n'
+
+
+def interpolateMissingData(data, cutOffTime, endTime, date, cutoff: int = gapCutoff, freq: str = gridFreq,
+                           fout=None):
+    '''
+    takes in a dictionary object {data} with n SensorSeries or pandas data frames as values. then handles calling fillArrays
+    with the specified parameter to interpolate the data. defaults to the gridFreq and gapCutoff processDay uses, 10 second
+    intervals without interpolating over gaps of more than 40 seconds
+    you can reduce the time frequency lower, however this can drastically increase the time it take to run the data cleaning process,
+    especially with larger sets of data.
+    the interpolation stats go to the open text file {fout}, or are appended to the log in dataInfo.
+    every sensor is resampled onto the same time grid and kept as a bare numpy block:
+    {"grid": int64 timestamps, "sensors": {sensorName: {"columns": [...], "block": 2-D array}}}
+    a sensor's block covers grid[:len(block)], sensors with no data in the window are left out
+    '''
+    closeLog = fout is None
+    if closeLog:
+        fout = open(os.path.join(
+            dataInfoPath, 'interpolation_Effect_Log.txt'), 'a')
+    interp = {"grid": timeGrid(cutOffTime, endTime, freq), "sensors": {}}
+    fout.write(f"\n{date}\n\n")
+    for x in data:
+        series = asSeries(data[x], x)
+        try:
+            block, accuracy = fillArrays(series, interp["grid"], cutoff)
+            interp["sensors"][x] = {"columns": series.columns, "block": block}
+        except IndexError:
+            accuracy = None
+        logAccuracy(x, accuracy, fout)
+    if closeLog:
+        fout.close()
+    return interp
+
+
+def logAccuracy(sensor, accuracy, fout):
+    # writes the interpolation stats of one sensor to {fout}, None when it had no data in the window
+    if accuracy is None:
+        logger.error(f"{sensor} NO DATA")
+        fout.write(f"{sensor} NO DATA\n")
+        return
+    logger.info(f"{sensor}     {accuracy}")
+    fout.write(f"{sensor}\n{accuracy[0]}\n{accuracy[1]}\n{accuracy[2]}\n\n")
+
+
+def interpolatedFrame(interp, sensor):
+    # data frame of one sensor's interpolated data, only built when it is written out
+    entry = interp["sensors"][sensor]
+    df = pd.DataFrame(entry["block"], columns=entry["columns"])
+    df.insert(0, 'Date_Time', interp["grid"][:len(df)].view('datetime64[ns]'))
+    return df
+
+
+def mergeDataFrames(interp, particle, upsampleFactor: int = 10):
+    '''
+    merges the {particle} column of every sensor into one data frame on the shared time grid,
+    linearly upsampled by {upsampleFactor}, i.e. with the default of 10 a 10 second grid becomes
+    a 1 second grid. grid points a sensor has no data for are left as NaN.
+    Average, Variance and Count are taken across the sensors that have data at each point
+    '''
+    return mergeParticles(interp, [particle], upsampleFactor)[particle]
+
+
+def mergeParticles(interp, particles, upsampleFactor: int = 10):
+    '''
+    mergeDataFrames for several particles at once. the readings go into one
+    (time x sensor x particle) block that is upsampled in a single pass, then each particle's
+    merged data frame is sliced out of it. returns {particle: merged data frame}
+    '''
+    sensors = list(interp["sensors"])
+    grid = interp["grid"]
+
+    # straight from the resampler output, which already holds every particle column
+    readings = np.full((len(grid), len(sensors), len(particles)), np.nan)
+    for idx, x in enumerate(sensors):
+        entry = interp["sensors"][x]
+        block = entry["block"]
+        readings[:len(block), idx] = block[:, [entry["columns"].index(particle) for particle in particles]]
+
+    readings = upsample(readings, upsampleFactor)
+    times = upsample(grid, upsampleFactor, integer=True).view('datetime64[ns]')
+
+    merged = {}
+    for idx, particle in enumerate(particles):
+        particleReadings = np.ascontiguousarray(readings[:, :, idx])
+        count, average, variance = sensorAggregates(particleReadings)
+
+        hiResMergedDF = pd.DataFrame(particleReadings, columns=sensors)
+        hiResMergedDF.insert(0, 'Date_Time', times)
+        hiResMergedDF['Average'] = average
+        hiResMergedDF['Variance'] = variance
+        hiResMergedDF['Count'] = count
+        merged[particle] = hiResMergedDF
+    return merged
+
+
+def sensorAggregates(readings):
+    '''
+    count, mean and population variance of each row of the (time x sensor) block, skipping NaN.
+    rows without any readings get a count of 0 and NaN for the mean and variance
+    '''
+    present = ~np.isnan(readings)
+    count = present.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average = np.where(present, readings, 0).sum(axis=1) / count
+        deviation = np.where(present, readings - average[:, None], 0)
+        variance = (deviation ** 2).sum(axis=1) / count
+    return count, average, variance
+
+
+def upsample(values, factor, integer=False):
+    '''
+    linearly interpolates {factor} - 1 evenly spaced rows between each pair of consecutive rows.
+    n rows come back as (n - 1) * factor + 1 rows, the last row is kept as is.
+    set {integer} for int64 timestamps so the steps stay in whole nanoseconds
+    '''
+    if len(values) < 2:
+        return values
+    steps = np.arange(factor).reshape((-1,) + (1,) * values.ndim)
+    if integer:
+        increment = np.diff(values, axis=0) // factor
+    else:
+        increment = np.diff(values, axis=0) / factor
+    rows = values[:-1] + increment * steps
+    # the original rows are copied over as is, a NaN neighbour would otherwise blank them out
+    rows[0] = values[:-1]
+    # (step, row, ...) -> (row, step, ...) so the new rows land between the old ones
+    rows = np.swapaxes(rows, 0, 1).reshape(((len(values) - 1) * factor,) + values.shape[1:])
+    return np.concatenate((rows, values[-1:]), 0)
+
+
@@ -1,140 +1,186 @@
 import pandas as pd
 import numpy as np
+from sensorSeries import SensorSeries, asSeries
 
 
 def fillDf(df, freq, start, end, cutoff):
-
+    '''
+    resamples the data frame onto a regular {freq} time grid between start and end.
+    gaps shorter than {cutoff} seconds are linearly interpolated, longer gaps are 0 padded.
+    the first column of the data frame is expected to be the timestamp, should look like:
+
+    Date_Time  Dp>0.3  Dp>0.5  Dp>1.0  Dp>2.5  Dp>5.0  Dp>10.0
+    0  2022-04-13 12:04:14      27       9       3       3       3        0
+    1  2022-04-13 12:04:34       9       3       0       0       0        0
+    2  2022-04-13 12:04:54      18       6       0       0       0        0
+
+    the heavy lifting is done on typed numpy arrays by fillArrays
+    '''
     # if a start time is specified then use it, otherwise use the dataframe values
-    if start:
-        startTime = pd.Timestamp(start)
-    else:
-        startTime = df.values[0][0]
+    if not start:
+        start = df.iloc[0, 0]
+    if not end:
+        end = df.iloc[-1, 0] + pd.Timedelta(freq)
 
-    if end:
-        endTime = pd.Timestamp(end)
-    else:
-        endTime = df.values[-1][0] + pd.Timedelta(seconds=freq)
-
-    # variables to keep track of the properties of the data set
-    volatility = 0
-    padding = 0
-    nochange = 0
-
-    # how long between data points we will allow to be interpolated
-    threshold = pd.Timedelta(seconds=cutoff)
-
-    # creates a pandas dataframe of time timestamps
-    index = pd.date_range(startTime, endTime, freq=freq)
-
-    # keeps track of the index in the date range set we are in
-    count = 0
-
-    overall = []
-
-    for idx, row in enumerate(df.values):
-        oldCount = count
-
-        try:
-            '''
-            keep increasing the count until we reach a timestamp in our data frame
-            that is greater than or equal to the test frame we created
-            row[0] is the timestamp of that row in the data frame, should look like:
-
-            Date_Time  Dp>0.3  Dp>0.5  Dp>1.0  Dp>2.5  Dp>5.0  Dp>10.0
-            0  2022-04-13 12:04:14      27       9       3       3       3        0
-            1  2022-04-13 12:04:34       9       3       0       0       0        0
-            2  2022-04-13 12:04:54      18       6       0       0       0        0
-            3  2022-04-13 12:05:14      39      10       0       0       0        0
-            4  2022-04-13 12:05:34      39      13       0       0       0        0
-            5  2022-04-13 12:05:54      27       9       0       0       0        0
-            6  2022-04-13 12:06:14      48      13       0       0       0        0
-
-            index[count] will go through the dataframe we created with the timestamp
-            '''
-            while row[0] >= index[count]:
-                count += 1
-        except IndexError:
-            continue
-
-        # val is the time since the last entry we recorded divided by the frequency
-        val = count - oldCount
-
-        # if sensor measurements are more frequent than the sampling rate we just skip them
-        if not val:
-            continue
-
-        # Threshold exceeded Case
-        # check if the time passed exceeds our threshold
-        if threshold < (index[count] - index[oldCount]):
-            # take the first row of the df to set to 0
-            temp = df.values[0][1:]
-
-            # since the time gap is over the threshold entries are 0 padded instead of interpolated
-            for step, ovrwrt in enumerate(range(oldCount, count)):
-                padding += 1
-                tempdata = np.concatenate(
-                    (np.array([index[ovrwrt]]),
-                     np.floor(np.array(temp * 0))), 0
-                )
-                overall.append(tempdata)
-            continue
-
-        # Interpolate linearly Case
-        # if there have been more than 1 missed value then we need to interpolate
-        if val > 1:
-
-            # time gaps < threshold will be linearly interpolated
-            if not idx:
-                temp = df.values[0][1:]
-            else:
-                temp = df.values[idx - 1][1:]
-
-            # calculate the slope between the two points for linear interpolation
-            inc = (row[1:] - temp) / val
-
-            # create n rows of linearly interpolated data and then add them to overall
-            for step, ovrwrt in enumerate(range(oldCount, count)):
-                volatility += 1
-                tempdata = np.concatenate(
-                    (np.array([index[ovrwrt]]), np.floor(
-                        np.array(temp + inc * step))),
-                    0
-                )
-                overall.append(tempdata)
-
-        # pass on point to new time stamp case.
-        else:
-            nochange += 1
-            temp = row[1:]
-            tempdata = np.concatenate(
-                (np.array([index[oldCount]]), np.floor(np.array(temp))), 0
-            )
-            overall.append(tempdata)
-
-    if overall[-1][0] < index[-1]:
-        # take the first row of the df to set to 0
-        temp = df.values[0][1:]
-
-        # since the time gap is over the threshold entries are 0 padded instead of interpolated
-        for step, ovrwrt in enumerate(range(count, len(index))):
-            padding += 1
-            tempdata = np.concatenate(
-                (np.array([index[ovrwrt]]),
-                    np.floor(np.array(temp * 0))), 0
-            )
-            overall.append(tempdata)
-
-    total = len(overall)
+    grid = timeGrid(start, end, freq)
+    block, accuracy = fillArrays(SensorSeries.fromFrame(df), grid, cutoff)
+
+    newDF = pd.DataFrame(block, columns=df.columns[1:])
+    newDF.insert(0, df.columns[0], grid[:len(block)].view('datetime64[ns]'))
+
+    return newDF, accuracy
+
+
+def timeGrid(start, end, freq):
+    # int64 nanosecond timestamps of the regular {freq} grid from start to end
+    return pd.date_range(pd.Timestamp(start), pd.Timestamp(end), freq=freq).asi8
+
+
+def fillArrays(series, grid, cutoff):
+    '''
+    resamples a SensorSeries (or data frame) onto {grid} and returns the measurement block
+    without ever building a data frame around it.
+    grid   : int64 epoch nanoseconds of the regular target time grid
+    cutoff : seconds, the longest gap that will be interpolated
+
+    returns (block, accuracy), block being the floored (time x column) values aligned to
+    grid[:len(block)], int64 when every value is finite, and accuracy the 3 lines logged for the
+    interpolated, 0-padded and unchanged rows. raises IndexError when no sample lands inside
+    the grid so callers can report NO DATA
+    '''
+    state = resampleState()
+    block = fillChunk(series, grid, cutoff, state)
+    return finishFill([block], grid, state)
+
+
+def fillChunk(series, grid, cutoff, state):
+    '''
+    resamples the next chunk of a sensor's SensorSeries (or data frame) onto {grid}, carrying
+    {state} over from the chunks before it. returns the floored rows of the grid that this
+    chunk completed
+    '''
+    series = asSeries(series)
+    values = series.values.astype('float64')
+    return resampleChunk(series.times, values, grid, pd.Timedelta(seconds=cutoff).value, state)
+
+
+def finishFill(blocks, grid, state):
+    '''
+    joins the blocks returned by fillChunk and 0 pads the rest of the grid.
+    returns (block, accuracy), raises IndexError when none of the chunks had data in the grid
+    '''
+    blocks.append(finishResample(grid, state))
+    block = np.concatenate(blocks, 0)
+    if np.isfinite(block).all():
+        block = block.astype('int64')
+
+    total = len(block)
 
     if total:
-        accuracy = ["% of values from interpolation : " + str(np.round(volatility/total*100, 3)),
+        accuracy = ["% of values from interpolation : " + str(np.round(state["volatility"]/total*100, 3)),
                     "% of values from 0-padding : " +
-                    str(np.round(padding/total*100, 3)),
-                    "% of values not changed : " + str(np.round(nochange/total*100, 3))]
+                    str(np.round(state["padding"]/total*100, 3)),
+                    "% of values not changed : " + str(np.round(state["nochange"]/total*100, 3))]
     else:
         accuracy = 'NO DATA'
 
-    newDF = pd.DataFrame(overall, columns=df.columns)
-
-    return newDF, accuracy
-
+    return block, accuracy
+
+
+def resampleState():
+    '''
+    what the resampler carries from one chunk of samples to the next:
+    count    : how many grid points the samples have walked past so far
+    emitted  : how many grid rows have been returned so far
+    previous : the last sample seen, where interpolation into the next chunk starts from
+    zeros    : the first sample multiplied by 0, used for padding
+    and the volatility/padding/nochange counters
+    '''
+    return {"count": 0, "emitted": 0, "previous": None, "zeros": None,
+            "volatility": 0, "padding": 0, "nochange": 0}
+
+
+def resampleChunk(times, values, grid, cutoff, state):
+    '''
+    resamples one chunk of samples in recorded order.
+    times  : int64 epoch nanoseconds of each sample, in recorded order
+    values : 2-D float64 array of measurements, one row per sample
+    grid   : int64 epoch nanoseconds of the regular target time grid
+    cutoff : int64 nanoseconds, the longest gap that will be interpolated
+    returns the floored rows for grid[state["emitted"]:] that this chunk completes and
+    updates {state} so the next chunk carries on exactly where this one stopped
+    '''
+    n = len(grid)
+    if not len(times):
+        return np.empty((0, values.shape[1]))
+    if state["previous"] is None:
+        # the first sample starts interpolating from itself
+        state["previous"] = values[0]
+        state["zeros"] = values[0] * 0
+
+    # count is how many grid points each sample has walked past, it never moves backwards.
+    # the previous value of count is where the rows emitted by that sample begin
+    count = np.maximum.accumulate(
+        np.maximum(np.searchsorted(grid, times, side='right'), state["count"]))
+    oldCount = np.concatenate(([state["count"]], count[:-1]))
+    val = count - oldCount
+    # row i of withPrevious is the sample before sample i, carried over from the last chunk for i = 0
+    withPrevious = np.concatenate(([state["previous"]], values), 0)
+
+    state["count"] = int(count[-1])
+    state["previous"] = values[-1]
+
+    # a sample that walks off the end of the grid is dropped along with everything after it,
+    # so rows are only emitted for samples that stay within the grid and move it forward
+    emitting = np.flatnonzero((count < n) & (val > 0))
+    if not len(emitting):
+        return np.empty((0, values.shape[1]))
+
+    emitStart = oldCount[emitting]
+    emitVal = val[emitting]
+    emitEnd = count[emitting]
+
+    # Threshold exceeded Case, since the time gap is over the threshold entries are 0 padded
+    padRow = emitting[cutoff < (grid[emitEnd] - grid[emitStart])]
+    # Interpolate linearly Case, time gaps < threshold with more than 1 missed value
+    interpRow = (~np.isin(emitting, padRow)) & (emitVal > 1)
+    # pass on point to new time stamp case
+    passRow = (~np.isin(emitting, padRow)) & (emitVal == 1)
+
+    # every grid point from the last emitted row up to this chunk's last emitting sample
+    # belongs to exactly one sample
+    owner = np.repeat(emitting, emitVal)
+    step = np.arange(state["emitted"], emitEnd[-1]) - oldCount[owner]
+
+    previous = withPrevious[owner]
+    inc = (values[owner] - previous) / val[owner][:, None]
+    block = previous + inc * step[:, None]
+
+    ownerPasses = np.repeat(passRow, emitVal)
+    block[ownerPasses] = values[owner[ownerPasses]]
+
+    # the first row of the df multiplied by 0 gives us our padding values
+    ownerPads = np.isin(owner, padRow)
+    block[ownerPads] = state["zeros"]
+
+    state["padding"] += int(val[padRow].sum())
+    state["volatility"] += int(emitVal[interpRow].sum())
+    state["nochange"] += int(passRow.sum())
+    state["emitted"] = int(emitEnd[-1])
+
+    return np.floor(block)
+
+
+def finishResample(grid, state):
+    '''
+    call once every chunk has been resampled. if no sample ran off the end of the grid the
+    remainder of the window is 0 padded, those rows are returned.
+    raises IndexError when no sample ever landed inside the grid
+    '''
+    n = len(grid)
+    if not state["emitted"]:
+        raise IndexError("no samples fall within the time grid")
+    if state["count"] >= n:
+        return np.empty((0, len(state["zeros"])))
+    state["padding"] += n - state["count"]
+    return np.floor(np.repeat([state["zeros"]], n - state["count"], axis=0))
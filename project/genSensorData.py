@@ -0,0 +1,123 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+import numpy as np
+
+dirname = os.path.dirname(__file__)
+
+'''
+Generates raw sensor files in the same text format as the files in Data, for trying the
+pipeline on deployments much bigger than the sample data. every file starts with a label
+line and the padded header, and each row has all 22 columns of the A16 sensors:
+
+    Beta-19
+          Date,      Time,   Battery,  Fix,       Latitude,      Longitude,    Dp>0.3, etc....
+     2022/4/13,   12:18:0,  3.971250,    0,       0.000000,       0.000000,        39, etc....
+
+the faults seen in the real data can be mixed in at a given rate per row: gaps in the
+recording, duplicated stamps, rows stamped in UTC with a 2 digit year and zero stamps
+(0/0/0 0:0:0, which is in the badTimes list of the shipped params)
+'''
+
+header = ("      Date,      Time,   Battery,  Fix,       Latitude,      Longitude,    Dp>0.3,    Dp>0.5,"
+          "    Dp>1.0,    Dp>2.5,    Dp>5.0,   Dp>10.0,   PM1_Std, PM2.5_Std,  PM10_Std,   PM1_Env, PM2.5_Env,"
+          "  PM10_Env,   Temp(C),     RH(%),    P(hPa),   Alti(m)")
+# everything after the timestamp, Dp>0.3 through PM10_Env are the 12 counts
+rowFormat = ",%10.6f,%5d,%15.6f,%15.6f" + ",%10d" * 12 + ",%10.6f,%.6f,%.6f,%.6f\n"
+
+
+def genSensorFile(path, start, hours, interval=10, gapRate=0.001, gapMean=300, duplicateRate=0.001,
+                  utcRate=0.0, badRate=0.0, seed=None, label="Beta-19"):
+    '''
+    writes one raw file to {path} covering {hours} from {start}, one row every {interval} seconds.
+    each rate is the chance of a row having that fault. gaps are exponentially distributed
+    with a mean of {gapMean} seconds. returns the number of rows written
+    '''
+    rng = np.random.default_rng(seed)
+    rows = int(hours * 3600 / interval)
+
+    # seconds since start, a gap pushes back every row after it
+    steps = np.full(rows, float(interval))
+    steps[0] = 0
+    gaps = rng.random(rows) < gapRate
+    steps[gaps] += rng.exponential(gapMean, gaps.sum())
+    seconds = np.floor(np.cumsum(steps)).astype(np.int64)
+    duplicates = np.flatnonzero(rng.random(rows) < duplicateRate)
+    seconds[duplicates[duplicates > 0]] = seconds[duplicates[duplicates > 0] - 1]
+    stamps = np.datetime64(start, 's') + seconds
+
+    # particle counts drift around a random walk, the bigger sizes are a fraction of the smaller ones
+    level = np.abs(200 + np.cumsum(rng.normal(0, 5, rows)))
+    fractions = np.array([1, 0.3, 0.05, 0.02, 0.01, 0.005])
+    counts = rng.poisson(level[:, None] * fractions)
+    pm = rng.poisson(level[:, None] * np.array([0.002, 0.004, 0.006]))
+    values = np.column_stack((
+        np.linspace(4.1, 3.5, rows),                      # Battery
+        np.zeros(rows), np.zeros(rows), np.zeros(rows),   # Fix, Latitude, Longitude
+        counts, pm, pm,                                   # Dp counts, PM Std, PM Env
+        20 + rng.normal(0, 0.5, rows),                    # Temp(C)
+        40 + rng.normal(0, 2, rows),                      # RH(%)
+        101000 + rng.normal(0, 50, rows),                 # P(hPa)
+        15 + rng.normal(0, 2, rows)))                     # Alti(m)
+
+    utc = rng.random(rows) < utcRate
+    bad = rng.random(rows) < badRate
+    with open(path, 'w') as fout:
+        fout.write(f"{label}\n{header}\n")
+        for stamp, isUTC, isBad, row in zip(stamps.tolist(), utc, bad, values.tolist()):
+            if isBad:
+                fout.write("     0/0/0,     0:0:0" + rowFormat % tuple(row))
+                continue
+            if isUTC:
+                stamp = stamp + timedelta(hours=7)
+                date = f"{stamp.year % 100}/{stamp.month}/{stamp.day}"
+            else:
+                date = f"{stamp.year}/{stamp.month}/{stamp.day}"
+            time = f"{stamp.hour}:{stamp.minute}:{stamp.second}"
+            fout.write(f"{date:>10},{time:>10}" + rowFormat % tuple(row))
+    return rows
+
+
+def genDeployment(directory, sensors, start, days, seed=0, **faults):
+    '''
+    writes a file for each of {sensors} sensors named the way genNewYamlParams expects,
+    {sensorName}_{M}_{D}_{YY}.txt for the first day. {faults} are passed on to genSensorFile.
+    returns the paths written
+    '''
+    os.makedirs(directory, exist_ok=True)
+    first = datetime.fromisoformat(start)
+    paths = []
+    for idx in range(sensors):
+        path = os.path.join(directory, f"S{idx + 1}_{first.month}_{first.day}_{first.year % 100}.txt")
+        genSensorFile(path, start, days * 24, seed=seed + idx, **faults)
+        paths.append(path)
+    return paths
+
+
+def addFaultArguments(parser):
+    # the options for the rows and faults of genSensorFile, shared with python benchmarks.py stages
+    parser.add_argument("--interval", type=int, default=10, help="seconds between rows")
+    parser.add_argument("--gapRate", type=float, default=0.001)
+    parser.add_argument("--gapMean", type=float, default=300, help="mean gap length in seconds")
+    parser.add_argument("--duplicateRate", type=float, default=0.001)
+    parser.add_argument("--utcRate", type=float, default=0.0)
+    parser.add_argument("--badRate", type=float, default=0.0)
+
+
+def faultArguments(args):
+    # the genSensorFile keyword arguments out of the options added by addFaultArguments
+    return {name: getattr(args, name) for name in ("interval", "gapRate", "gapMean", "duplicateRate", "utcRate", "badRate")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="write synthetic raw sensor files")
+    parser.add_argument("--out", default=os.path.join(dirname, "..", "..", "syntheticData", "Data"),
+                        help="folder to write to")
+    parser.add_argument("--sensors", type=int, default=12)
+    parser.add_argument("--start", default="2022-04-13T00:00:00")
+    parser.add_argument("--days", type=float, default=1)
+    addFaultArguments(parser)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    paths = genDeployment(args.out, args.sensors, args.start, args.days, args.seed, **faultArguments(args))
+    print(f"wrote {len(paths)} files to {os.path.abspath(args.out)}")
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+
+logger = logging.getLogger("manifest")
+logger.propagate = True
+
+'''
+SQLite record of what every output in the store was derived from, kept in dataInfo/manifest.sqlite.
+
+    outputs : date, particle, sensor, source, params, interpolated
+    tails   : date, particle, sensor, file, params, offset, anchor, lastTime, state
+
+an outputs row is written once the processed and interpolated data of a sensor for a
+(date, particle) is in the store, source being the sha1 of the raw file and params the hash
+of every setting the outputs depend on, the sha1 comes from the fingerprint kept by dataIndex. the merged data of a day is stored under the sensor
+"merged", its source covers the raw files of every sensor of the day. an output is stale as
+soon as its raw file or its params no longer match the row.
+tail runs also keep a tails row per sensor, with the byte offset and last timestamp read
+from the raw file and the stage state to carry on from when more rows are appended
+'''
+
+
+def openManifest(path):
+    connection = sqlite3.connect(path)
+    # the raw file fingerprints used to be kept here as well, dataIndex has them now
+    connection.execute("DROP TABLE IF EXISTS inputs")
+    connection.execute("CREATE TABLE IF NOT EXISTS outputs "
+                       "(date TEXT, particle TEXT, sensor TEXT, source TEXT, params TEXT, "
+                       "interpolated INTEGER, PRIMARY KEY (date, particle, sensor))")
+    connection.execute("CREATE TABLE IF NOT EXISTS tails "
+                       "(date TEXT, particle TEXT, sensor TEXT, file TEXT, params TEXT, offset INTEGER, "
+                       "anchor TEXT, lastTime TEXT, state BLOB, PRIMARY KEY (date, particle, sensor))")
+    return connection
+
+
+def paramsKey(params):
+    # hash of a json serialisable dict of settings
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def lookupOutput(connection, date, particle, sensor, source, params):
+    '''
+    returns the outputs row for (date, particle, sensor) as {"interpolated": bool}
+    when it was derived from {source} with {params}, None when the outputs are stale
+    '''
+    row = connection.execute("SELECT source, params, interpolated FROM outputs "
+                             "WHERE date = ? AND particle = ? AND sensor = ?",
+                             (date, particle, sensor)).fetchone()
+    if row is None or row[0] != source or row[1] != params:
+        return None
+    return {"interpolated": bool(row[2])}
+
+
+def recordOutput(connection, date, particle, sensor, source, params, interpolated=False):
+    with connection:
+        connection.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?)",
+                           (date, particle, sensor, source, params, int(interpolated)))
+
+
+def lookupTail(connection, date, particle, sensor, file, params):
+    '''
+    returns the tail row of a sensor for (date, particle) as {"offset", "lastTime", "state"} when
+    {file} has only been appended to since the row was written with the same {params}, else None.
+    the last few kB before the offset are checked, a file that was rewritten starts over
+    '''
+    row = connection.execute("SELECT file, params, offset, anchor, lastTime, state FROM tails "
+                             "WHERE date = ? AND particle = ? AND sensor = ?",
+                             (date, particle, sensor)).fetchone()
+    if row is None or row[0] != os.path.abspath(file) or row[1] != params:
+        return None
+    if os.path.getsize(file) < row[2] or tailAnchor(file, row[2]) != row[3]:
+        logger.info(f"{file} was rewritten since the last tail run")
+        return None
+    return {"offset": row[2], "lastTime": row[4], "state": pickle.loads(row[5])}
+
+
+def recordTail(connection, date, particle, sensor, file, params, offset, lastTime, state):
+    # {state} is the stage state processDay hands back, it is stored pickled
+    with connection:
+        connection.execute("INSERT OR REPLACE INTO tails VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (date, particle, sensor, os.path.abspath(file), params, offset,
+                            tailAnchor(file, offset), lastTime, pickle.dumps(state)))
+
+
+def tailAnchor(file, offset, size=4096):
+    # sha1 of the {size} bytes leading up to {offset}, they never change while a file is only appended to
+    with open(file, 'rb') as fin:
+        fin.seek(max(offset - size, 0))
+        return hashlib.sha1(fin.read(min(offset, size))).hexdigest()
@@ -0,0 +1,138 @@
+import glob
+import json
+import logging
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from dataPaths import partitionDir, partPaths, resolveFormat
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger("output-store")
+logger.propagate = True
+
+'''
+Typed columnar store for the processed, interpolated and merged data.
+frames are partitioned by stage, date, particle and sensor, and each partition holds one or
+more parts that are concatenated back together when it is loaded. the merged data of a day and
+its rolling stats are stored under the sensor name "merged". a frame written in one go is a
+single part, chunked runs add a part per chunk.
+
+    outputStore/
+    |--{stage}/                  <---- processed, interpolated, merged or rollingStats
+    |----{date}/
+    |------{particle}/
+    |--------{sensor}/
+    |----------part-00000.parquet    <---- parquet and feather parts need pyarrow
+    |----------part-00000/           <---- npy parts are one .npy file per column and a
+    |------------meta.json                 meta.json, same as the parse cache
+    |------------col0.npy
+
+Date_Time is kept as datetime64[ns] and integer columns that fit are stored as int32,
+so nothing has to be parsed when the data is loaded again
+'''
+
+stages = ("processed", "interpolated", "merged", "rollingStats")
+
+
+def storeTypes(df):
+    # datetime columns as datetime64[ns], integer columns as int32 when every value fits
+    df = df.copy()
+    limits = np.iinfo('int32')
+    for column in df.columns:
+        values = df[column]
+        if values.dtype.kind == 'M':
+            df[column] = values.astype('datetime64[ns]')
+        elif values.dtype.kind in 'iu' and (values.empty or limits.min <= values.min() <= values.max() <= limits.max):
+            df[column] = values.astype('int32')
+    return df
+
+
+def writePart(storeDir, stage, date, particle, sensor, df, part=0, outputFormat='auto'):
+    '''
+    writes {df} as part number {part} of a partition. writing part 0 replaces whatever the
+    partition held before, so a rerun never mixes in parts from an earlier run
+    '''
+    outputFormat = resolveFormat(outputFormat)
+    if outputFormat != 'npy' and pa is None:
+        raise ImportError(f"pyarrow could not be imported to write {outputFormat}")
+    directory = partitionDir(storeDir, stage, date, particle, sensor)
+    if part == 0 and os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory, exist_ok=True)
+
+    df = storeTypes(df)
+    path = os.path.join(directory, f"part-{part:05d}")
+    if outputFormat == 'npy':
+        writeNpyPart(path, df)
+        return
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if outputFormat == 'parquet':
+        pq.write_table(table, path + '.parquet')
+    else:
+        feather.write_feather(table, path + '.feather')
+
+
+def writeNpyPart(path, df):
+    os.makedirs(path)
+    for idx, column in enumerate(df.columns):
+        values = df[column].to_numpy()
+        if values.dtype.kind == 'M':
+            values = values.view('i8')
+        np.save(os.path.join(path, f"col{idx}.npy"), values)
+    # meta.json goes last, a part without one was interrupted and is skipped on load
+    with open(os.path.join(path, "meta.json"), "w") as fout:
+        json.dump({"columns": list(df.columns), "dtypes": [str(dtype) for dtype in df.dtypes]}, fout)
+
+
+def readPart(path, columns=None):
+    # {columns} picks out the columns to read, the ones a part doesn't have are left out
+    if path.endswith('.parquet'):
+        if columns is not None:
+            columns = [column for column in columns if column in pq.read_schema(path).names]
+        return pq.read_table(path, columns=columns).to_pandas()
+    if path.endswith('.feather'):
+        table = feather.read_table(path, memory_map=True)
+        if columns is not None:
+            table = table.select([column for column in columns if column in table.column_names])
+        return table.to_pandas()
+    with open(os.path.join(path, "meta.json"), "r") as fin:
+        meta = json.load(fin)
+    data = {}
+    for idx, (column, dtype) in enumerate(zip(meta["columns"], meta["dtypes"])):
+        if columns is not None and column not in columns:
+            continue
+        values = np.load(os.path.join(path, f"col{idx}.npy"), mmap_mode='r')
+        data[column] = values.view(dtype) if dtype.startswith('datetime64') else values
+    return pd.DataFrame(data, columns=list(data))
+
+
+def readPartition(directory, columns=None):
+    # the parts of a partition put back together in the order they were written, a partition
+    # without any complete part, e.g. from an interrupted write, gives an empty frame
+    frames = [readPart(path, columns) for path in partPaths(directory)]
+    if not frames:
+        return pd.DataFrame(columns=columns or [])
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def loadStage(storeDir, stage, date='*', particle='*', sensor='*'):
+    '''
+    loads every partition of {stage} matching the date/particle/sensor globs.
+    returns {(date, particle, sensor): DataFrame}, e.g. the merged Dp>0.3 data of every day is
+    loadStage(storePath, "merged", particle="Dp03") and its rolling stats
+    loadStage(storePath, "rollingStats", particle="Dp03")
+    '''
+    frames = {}
+    for directory in sorted(glob.glob(partitionDir(storeDir, stage, date, particle, sensor))):
+        key = tuple(os.path.relpath(directory, os.path.join(storeDir, stage)).split(os.path.sep))
+        frames[key] = readPartition(directory)
+    return frames
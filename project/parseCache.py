@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import numpy as np
+from dataPaths import atomicWrite, fileFingerprint
+from sensorSeries import SensorSeries
+
+logger = logging.getLogger("parse-cache")
+logger.propagate = True
+
+'''
+Binary cache for cleaned sensor files.
+every raw file gets its own entry directory holding the two arrays of its SensorSeries and a
+meta.json describing the source file and the parameters the series was cleaned with. meta.json
+is written last, so an entry without one was interrupted part way and is treated as missing.
+entries in the old one .npy per column layout are treated as missing too.
+
+    parseCache/
+    |--{sha1 of file path}/
+    |----meta.json
+    |----times.npy           <---- Date_Time as int64 nanoseconds
+    |----values.npy          <---- (row x column) block of the measurements
+'''
+
+
+def paramsKey(columns, badTimes, offset):
+    '''
+    hash of the yaml params that change what the cleaned frame of a file looks like.
+    offset is the sensorConditions entry for this file's sensor only, so adjusting the
+    timezone of one sensor does not throw away the entries of every other sensor
+    '''
+    params = json.dumps({"columns": columns, "badTimes": badTimes, "offset": offset}, sort_keys=True)
+    return hashlib.sha1(params.encode()).hexdigest()
+
+
+def entryDir(cacheDir, file):
+    return os.path.join(cacheDir, hashlib.sha1(os.path.abspath(file).encode()).hexdigest())
+
+
+def loadEntry(cacheDir, file, key, fingerprint=None):
+    '''
+    returns the cached sensor table entry {name, data, mod} for {file}, or None if the file
+    or the params it was cleaned with have changed since it was stored. the {fingerprint} of
+    the file from dataIndex saves hashing it again when its mtime moved
+    '''
+    directory = entryDir(cacheDir, file)
+    try:
+        with open(os.path.join(directory, "meta.json"), "r") as fin:
+            meta = json.load(fin)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get("layout") != "series":
+        return None
+    if meta["params"] != key:
+        logger.info(f"cache params changed for {file}")
+        return None
+
+    if fingerprint is None:
+        stat = os.stat(file)
+        fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+    if fingerprint["size"] != meta["size"]:
+        logger.info(f"cache size changed for {file}")
+        return None
+    if fingerprint["mtime"] != meta["mtime"]:
+        # the file was touched, only rebuild the entry if its contents actually changed
+        if "sha1" not in fingerprint:
+            fingerprint = fileFingerprint(file)
+        if fingerprint["sha1"] != meta["sha1"]:
+            logger.info(f"cache contents changed for {file}")
+            return None
+        meta.update(fingerprint)
+        writeMeta(directory, meta)
+
+    series = SensorSeries(np.load(os.path.join(directory, "times.npy"), mmap_mode='r'),
+                          np.load(os.path.join(directory, "values.npy"), mmap_mode='r'),
+                          meta["columns"], meta["dtypes"], meta["name"], meta["offset"], file)
+    logger.debug(f"loaded {file} from cache")
+    return {"name": meta["name"], "data": series, "mod": meta["mod"]}
+
+
+def storeEntry(cacheDir, file, key, entry, fingerprint=None):
+    # {fingerprint} is the one loadEntry was given, the file is only hashed here without one
+    series = entry["data"]
+    # only plain numeric columns can be stored without pickling
+    if series.values.dtype.kind not in 'biuf':
+        logger.info(f"not caching {file}, it has non numeric columns")
+        return
+
+    directory = entryDir(cacheDir, file)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+
+    np.save(os.path.join(directory, "times.npy"), series.times)
+    np.save(os.path.join(directory, "values.npy"), series.values)
+
+    meta = dict(fingerprint or fileFingerprint(file))
+    meta.update({
+        "file": os.path.abspath(file),
+        "params": key,
+        "layout": "series",
+        "name": entry["name"],
+        "mod": entry["mod"],
+        "offset": series.offset,
+        "columns": series.columns,
+        "dtypes": series.dtypes,
+    })
+    writeMeta(directory, meta)
+
+
+def writeMeta(directory, meta):
+    with atomicWrite(os.path.join(directory, "meta.json")) as fout:
+        json.dump(meta, fout)
@@ -0,0 +1,272 @@
+import bisect
+import glob
+import json
+import logging
+import os
+import re
+import numpy as np
+import pandas as pd
+from dataPaths import atomicWrite, dataInfoPath, outputStorePath, partitionDir
+from outputStore import partPaths, readPartition, writePart
+from yamlParams import loadParams
+
+# time span and columns of every merged partition, reused while the partition isn't rewritten
+indexCachePath = os.path.join(dataInfoPath, "queryIndex.json")
+# length of each rollup bucket in nanoseconds
+rollupFreqs = {"1min": 60 * 10**9, "1h": 3600 * 10**9, "day": 86400 * 10**9}
+logger = logging.getLogger("query-store")
+logger.propagate = True
+
+'''
+Queries over the merged data in the output store, i.e. one or more sensors' readings of a
+particle between two times, across as many days as the range covers:
+
+    query(["A16", "A7"], "Dp03", "2022-04-13 12:00", "2022-04-15 12:00")
+    rollup(["A16"], "Dp03", "1h", "2022-04-13", "2022-04-20")     <---- mean, min, max and count per hour
+
+the particle can be given as in the yaml Particles, e.g. Dp>0.3, or as its folder name in
+the store, Dp03. the columns that can be asked for are the sensor names and the Average,
+Variance and Count of the merged data. ranges include {start} and stop before {end}, None
+leaves that side open.
+the index keeps the time span of every merged partition, so only the days a range overlaps
+are read, and only the columns that were asked for:
+
+    partitions: {path in the store: {"date", "particle", "columns", "start", "end", "rows", "stamp", "rollups"}}
+    byKey     : {(particle, column): {"paths": [...], "starts": [...]}}    <---- sorted by start
+
+start and end are int64 nanoseconds, stamp is the name, size and mtime of each part of the
+partition. a partition the pipeline rewrites is indexed again and its rollups are rebuilt.
+the partition entries are kept in dataInfo/queryIndex.json. rollups are worked out the first
+time a partition's rollup is asked for and written back to the store as the stage
+rollup-{freq}, e.g. outputStore/rollup-1h/4-13-22/Dp03/merged/. columns read by this process
+are kept in memory, so a repeat query doesn't touch the disk at all
+'''
+
+# columns read by this process, {partition directory: (stamp, {column: array})}
+loaded = {}
+
+
+def partitionStamp(directory):
+    # the name, size and mtime of every part, a rewritten partition has a different stamp
+    stamp = []
+    for path in partPaths(directory):
+        stat = os.stat(os.path.join(path, "meta.json") if os.path.isdir(path) else path)
+        stamp.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return stamp
+
+
+def loadQueryIndex(storeDir=outputStorePath, cachePath=indexCachePath):
+    cached = {}
+    if cachePath and os.path.exists(cachePath):
+        with open(cachePath, "r") as fin:
+            saved = json.load(fin)
+        if saved["storeDir"] == os.path.abspath(storeDir):
+            cached = saved["partitions"]
+
+    index = {"storeDir": storeDir, "cachePath": cachePath, "partitions": {}, "byKey": {}}
+    changed = False
+    for directory in sorted(glob.glob(partitionDir(storeDir, "merged", "*", "*", "merged"))):
+        stamp = partitionStamp(directory)
+        if not stamp:
+            continue
+        path = os.path.relpath(directory, storeDir)
+        entry = cached.get(path)
+        if entry is None or entry["stamp"] != stamp:
+            entry = describePartition(directory, stamp)
+            changed = True
+        index["partitions"][path] = entry
+    if changed or index["partitions"].keys() != cached.keys():
+        saveQueryIndex(index)
+
+    for path, entry in sorted(index["partitions"].items(), key=lambda item: item[1]["start"]):
+        for column in entry["columns"]:
+            key = index["byKey"].setdefault((entry["particle"], column), {"paths": [], "starts": []})
+            key["paths"].append(path)
+            key["starts"].append(entry["start"])
+    return index
+
+
+def describePartition(directory, stamp):
+    date, particle = directory.split(os.path.sep)[-3:-1]
+    frame = readPartition(directory)
+    times = frame["Date_Time"].to_numpy(dtype='datetime64[ns]').view('i8')
+    logger.debug(f"indexed {directory}")
+    return {"date": date, "particle": particle, "columns": list(frame.columns[1:]),
+            "start": int(times[0]) if len(times) else 0, "end": int(times[-1]) if len(times) else -1,
+            "rows": len(times), "stamp": stamp, "rollups": []}
+
+
+def saveQueryIndex(index):
+    if not index["cachePath"]:
+        return
+    os.makedirs(os.path.dirname(index["cachePath"]), exist_ok=True)
+    with atomicWrite(index["cachePath"]) as fout:
+        json.dump({"storeDir": os.path.abspath(index["storeDir"]), "partitions": index["partitions"]}, fout)
+
+
+def findPartitions(index, particle, columns, start=None, end=None, span=1):
+    '''
+    the partitions holding any of {columns} of {particle} with data from {start} up to {end},
+    in time order. a row covers {span} nanoseconds from its timestamp, 1 for the readings
+    themselves and the bucket length for rollups
+    '''
+    found = set()
+    for column in columns:
+        key = index["byKey"].get((particle, column))
+        if key is None:
+            continue
+        # the starts are sorted, so everything after the first partition starting at {end} is out
+        last = len(key["starts"]) if end is None else bisect.bisect_left(key["starts"], end)
+        found.update(path for path in key["paths"][:last]
+                     if start is None or index["partitions"][path]["end"] + span > start)
+    return sorted(found, key=lambda path: index["partitions"][path]["start"])
+
+
+def readColumns(directory, stamp, columns):
+    # {column: array} of a partition, only the columns not already loaded are read
+    cachedStamp, arrays = loaded.get(directory, (None, {}))
+    if cachedStamp != stamp:
+        arrays = {}
+    missing = [column for column in columns if column not in arrays]
+    if missing:
+        frame = readPartition(directory, missing)
+        for column in missing:
+            if column in frame:
+                values = frame[column].to_numpy()
+                arrays[column] = values.view('i8') if values.dtype.kind == 'M' else values
+            else:
+                arrays[column] = None
+    loaded[directory] = (stamp, arrays)
+    return arrays
+
+
+def storeName(particle):
+    # the store keeps a particle under its name without the symbols, Dp>0.3 becomes Dp03
+    return re.sub(r'\W', '', particle)
+
+
+def timeBound(value):
+    return None if value is None else pd.Timestamp(value).value
+
+
+def gather(directories, columns, start, end, span=1):
+    '''
+    the rows of every partition in {directories} from {start} up to {end} as (times, values),
+    int64 nanoseconds and a (row x column) float64 block, NaN where a partition lacks a column
+    '''
+    times, blocks = [], []
+    for directory, stamp in directories:
+        arrays = readColumns(directory, stamp, ["Date_Time"] + columns)
+        partTimes = arrays["Date_Time"]
+        first = 0 if start is None else np.searchsorted(partTimes, start - span, side='right')
+        last = len(partTimes) if end is None else np.searchsorted(partTimes, end, side='left')
+        block = np.full((max(last - first, 0), len(columns)), np.nan)
+        for idx, column in enumerate(columns):
+            if arrays[column] is not None:
+                block[:, idx] = arrays[column][first:last]
+        times.append(partTimes[first:last])
+        blocks.append(block)
+    if not times:
+        return np.empty(0, 'i8'), np.empty((0, len(columns)))
+    return np.concatenate(times), np.concatenate(blocks, 0)
+
+
+def asFrame(times, values, columns):
+    df = pd.DataFrame(values, columns=columns)
+    df.insert(0, 'Date_Time', times.view('datetime64[ns]'))
+    return df
+
+
+def query(columns, particle, start=None, end=None, storeDir=outputStorePath, index=None, asArrays=False):
+    '''
+    the merged {particle} readings of {columns} from {start} up to {end}. returns a data frame
+    of Date_Time and one column per entry in {columns}, or (times, values) with {asArrays}, see
+    gather. a day that doesn't have one of the sensors gives NaN for it
+    '''
+    if isinstance(columns, str):
+        columns = [columns]
+    if index is None:
+        index = loadQueryIndex(storeDir)
+    particle = storeName(particle)
+    start, end = timeBound(start), timeBound(end)
+    directories = [(os.path.join(storeDir, path), index["partitions"][path]["stamp"])
+                   for path in findPartitions(index, particle, columns, start, end)]
+    times, values = gather(directories, columns, start, end)
+    if asArrays:
+        return times, values
+    return asFrame(times, values, columns)
+
+
+def rollup(columns, particle, freq, start=None, end=None, storeDir=outputStorePath, index=None, asArrays=False,
+           outputFormat=None):
+    '''
+    the mean, min, max and count of the merged {particle} readings of {columns} in {freq}
+    buckets (1min, 1h or day), for every bucket that overlaps {start} up to {end}. returns a
+    data frame of the bucket start as Date_Time and {column}_{stat} columns, or (times, values)
+    with {asArrays}. NaN readings are left out of a bucket, an empty bucket has a count of 0.
+    new rollups are written in {outputFormat}, by default the outputFormat of the yaml params
+    the run wrote the merged data with
+    '''
+    if freq not in rollupFreqs:
+        raise ValueError(f"unknown rollup frequency {freq}, expected one of {list(rollupFreqs)}")
+    if isinstance(columns, str):
+        columns = [columns]
+    if index is None:
+        index = loadQueryIndex(storeDir)
+    particle = storeName(particle)
+    start, end = timeBound(start), timeBound(end)
+    span = rollupFreqs[freq]
+    if outputFormat is None:
+        outputFormat = loadParams().get("outputFormat", "auto")
+
+    directories = []
+    changed = False
+    for path in findPartitions(index, particle, columns, start, end, span):
+        entry = index["partitions"][path]
+        directory = partitionDir(storeDir, f"rollup-{freq}", entry["date"], particle, "merged")
+        if freq not in entry["rollups"] or not partPaths(directory):
+            arrays = readColumns(os.path.join(storeDir, path), entry["stamp"], ["Date_Time"] + entry["columns"])
+            stats = bucketStats(arrays["Date_Time"], {column: arrays[column] for column in entry["columns"]}, span)
+            writePart(storeDir, f"rollup-{freq}", entry["date"], particle, "merged", stats, 0, outputFormat)
+            entry["rollups"].append(freq)
+            changed = True
+        directories.append((directory, partitionStamp(directory)))
+    if changed:
+        saveQueryIndex(index)
+
+    statColumns = [f"{column}_{stat}" for column in columns for stat in ("mean", "min", "max", "count")]
+    times, values = gather(directories, statColumns, start, end, span)
+    # a day without the sensor has nothing in its buckets
+    counts = values[:, 3::4]
+    counts[np.isnan(counts)] = 0
+    if asArrays:
+        return times, values
+    df = asFrame(times, values, statColumns)
+    return df.astype({column: 'int64' for column in statColumns[3::4]})
+
+
+def bucketStats(times, arrays, span):
+    '''
+    mean, min, max and count of each of the {column: array} {arrays} in buckets of {span}
+    nanoseconds, skipping NaN. {times} is sorted, so the rows of a bucket are next to each other
+    '''
+    buckets = times // span * span
+    # the first row of each bucket
+    firsts = np.flatnonzero(np.diff(buckets, prepend=buckets[:1] - 1)) if len(buckets) else np.empty(0, 'i8')
+    data = {"Date_Time": buckets[firsts].view('datetime64[ns]')}
+    for column, values in arrays.items():
+        values = values.astype('float64')
+        present = ~np.isnan(values)
+        if len(firsts):
+            count = np.add.reduceat(present.astype('int64'), firsts)
+            total = np.add.reduceat(np.where(present, values, 0), firsts)
+            # fmin and fmax skip NaN, a bucket of only NaN stays NaN
+            low, high = np.fmin.reduceat(values, firsts), np.fmax.reduceat(values, firsts)
+        else:
+            count, total, low, high = (np.empty(0) for _ in range(4))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            data[f"{column}_mean"] = total / count
+        data[f"{column}_min"] = low
+        data[f"{column}_max"] = high
+        data[f"{column}_count"] = count.astype('int64')
+    return pd.DataFrame(data)
@@ -0,0 +1,113 @@
+from dataclasses import dataclass, field
+import math
+import numpy as np
+import pandas as pd
+from sensorSeries import asSeries
+
+'''
+Health report for a sensor's recording window. sensorHealth works out the gaps between
+timestamps, the time lost and the fraction of zero readings with array operations,
+updateHealth does the same a chunk at a time for recordings streamed in pieces, and
+renderHealth turns the resulting SensorHealth into the text that goes into
+time_Frequency_Error_Log.txt
+'''
+
+
+@dataclass
+class SensorHealth:
+    sensor: str
+    start: pd.Timestamp
+    end: pd.Timestamp
+    # the recording interval in seconds that a healthy sensor should stay within
+    interval: int
+    # number of samples recorded strictly between start and end
+    samples: int = 0
+    # {gap length in seconds: times observed} for every gap over the interval, shortest first
+    gapHistogram: dict = field(default_factory=dict)
+    timeLostStart: pd.Timedelta = pd.Timedelta(0)
+    timeLostDuring: pd.Timedelta = pd.Timedelta(0)
+    timeLostEnd: pd.Timedelta = pd.Timedelta(0)
+    # {column: fraction of samples that read exactly 0}
+    zeroFraction: dict = field(default_factory=dict)
+
+    @property
+    def gaps(self):
+        return sum(self.gapHistogram.values())
+
+    @property
+    def totalTimeLost(self):
+        if not self.samples:
+            return self.end - self.start
+        return self.timeLostStart + self.timeLostDuring + self.timeLostEnd
+
+
+def sensorHealth(series, sensor, start, end, interval=20):
+    '''
+    builds the SensorHealth of one sensor from its SensorSeries (or data frame) over the window
+    start -> end. every measurement column gets a zero fraction, not just one particle
+    '''
+    report = SensorHealth(sensor, pd.Timestamp(start), pd.Timestamp(end), interval)
+    updateHealth(report, {}, series)
+    return report
+
+
+def updateHealth(report, state, series):
+    '''
+    adds the next chunk of a sensor's SensorSeries (or data frame) to {report}. {state} starts
+    out as an empty dict and carries the last timestamp in the window and the zero counts from
+    one chunk to the next, so feeding a recording in chunks gives the same report as feeding it whole
+    '''
+    series = asSeries(series)
+    times = series.times.view('datetime64[ns]')
+    # filter the series to include only the values we care about
+    inWindow = (times > report.start.to_datetime64()) & (times < report.end.to_datetime64())
+    times = times[inWindow]
+    if not len(times):
+        return report
+
+    if "last" in state:
+        # the gap between the chunks counts as well
+        gaps = np.diff(times.view('i8'), prepend=state["last"])
+    else:
+        gaps = np.diff(times.view('i8'))
+        report.timeLostStart = pd.Timestamp(times[0]) - report.start
+    overInterval = gaps[gaps > pd.Timedelta(seconds=report.interval).value]
+    lengths, counts = np.unique(overInterval // 10**9, return_counts=True)
+    for length, count in zip(lengths.tolist(), counts.tolist()):
+        report.gapHistogram[length] = report.gapHistogram.get(length, 0) + count
+    report.gapHistogram = dict(sorted(report.gapHistogram.items()))
+
+    report.timeLostDuring += pd.Timedelta(int(overInterval.sum()))
+    report.timeLostEnd = report.end - pd.Timestamp(times[-1])
+    state["last"] = int(times[-1].view('i8'))
+
+    zeros = (series.values[inWindow] == 0).sum(axis=0)
+    state["zeros"] = state.get("zeros", 0) + zeros
+    report.samples += len(times)
+    report.zeroFraction = dict(zip(series.columns, (state["zeros"]/report.samples).tolist()))
+    return report
+
+
+def renderHealth(report, particle):
+    # text block for one sensor in time_Frequency_Error_Log.txt
+    if not report.samples:
+        return f"no data was found in time range for {report.sensor}\n"
+
+    lengths = list(report.gapHistogram)
+    counts = list(report.gapHistogram.values())
+    # long gaps get wider columns so the lengths and counts stay lined up
+    frmt = "".join(f"{{:>{round(math.log(length+1,10))+2}}}" if length > 10**3 else "{:>4}"
+                   for length in lengths)
+
+    percentLost = round(report.totalTimeLost/(report.end - report.start)*100, 2)
+    percentGaps = round(report.gaps/report.samples*100, 2)
+    percentZero = round(report.zeroFraction.get(particle, 0)*100, 2)
+
+    logString = f"{report.sensor}\n"
+    logString += f" {percentLost}%  Time lost -- Total Time Lost : {report.totalTimeLost}\n"
+    logString += f" {percentGaps}% of data set is over {report.interval} second recording intervals\n"
+    logString += f' {percentZero}% of data set is 0 for paricle size : {particle}\n'
+    logString += f" during: {report.timeLostDuring}\n start: {report.timeLostStart}\n end: {report.timeLostEnd}\n"
+    logString += f" Time Errors {frmt.format(*lengths)}\n"
+    logString += f" # Observed {frmt.format(*counts)}\n"
+    return logString
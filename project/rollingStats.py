@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+'''
+Trailing window statistics of every sensor in the merged data of a day, set with rollingStats
+in the yaml file:
+
+    rollingStats:
+      windows: [1min, 10min]                   <---- anything pandas reads as a Timedelta
+      stats: [mean, variance, min, max, corr]  <---- corr is the correlation of every pair of sensors
+      quantiles: [0.5, 0.9]
+
+row i of a window covers the readings from i - window up to and including i, the first rows of
+the day use what there is so far. NaN readings are left out, a window without any readings
+gives NaN and variance is the population variance, the same as the merged Variance column.
+a window where either sensor of a pair doesn't change has no correlation, it gives NaN.
+columns are named {sensor}_{stat}_{window}, e.g. A16_mean_1min, A16_q0.9_10min and
+A16_A7_corr_1min.
+
+the rows are taken {blockRows} at a time and the only state carried from one block to the next
+is the last window - 1 rows, so memory is set by the window and block size rather than the
+length of the day. sums are taken from each block's own cumulative sums, shifted by the block
+mean, so they don't drift over a long recording the way a running total over the day would
+'''
+
+
+class RollingWindow:
+    def __init__(self, rows, stats, quantiles=()):
+        self.rows = rows
+        self.stats = stats
+        self.quantiles = quantiles
+        # the last rows - 1 readings, the part of the window that reaches back into earlier blocks
+        self.carry = None
+
+    def update(self, block):
+        '''
+        statistics for every row of the (time x sensor) {block}, which follows on from the
+        blocks before it. returns {(stat, sensor index or pair of indexes): array}
+        '''
+        if self.carry is None:
+            self.carry = block[:0]
+        extended = np.concatenate((self.carry, block), 0)
+        first = len(self.carry)
+        self.carry = extended[max(len(extended) - (self.rows - 1), 0):] if self.rows > 1 else extended[:0]
+
+        # the window of row i of extended starts at max(0, i - rows + 1)
+        ends = np.arange(first, len(extended)) + 1
+        starts = np.maximum(ends - self.rows, 0)
+        present = ~np.isnan(extended)
+        shift = np.nansum(extended, 0) / np.maximum(present.sum(0), 1)
+        shifted = np.where(present, extended - shift, 0)
+
+        def windowSum(values, withError=False):
+            total = np.concatenate((np.zeros((1,) + values.shape[1:]), np.cumsum(values, 0)), 0)
+            if not withError:
+                return total[ends] - total[starts]
+            # round-off in a running total of values >= 0 stays below len * eps * total, a window
+            # sum that small can't be told apart from 0
+            return total[ends] - total[starts], len(total) * np.finfo('float64').eps * total[ends]
+
+        results = {}
+        count = windowSum(present.astype('float64'))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = windowSum(shifted) / count
+            if "mean" in self.stats:
+                results.update({("mean", idx): column + shift[idx] for idx, column in enumerate(mean.T)})
+            if "variance" in self.stats:
+                variance = windowVariance(shifted, mean, count, windowSum)
+                results.update({("variance", idx): column for idx, column in enumerate(variance.T)})
+            if "corr" in self.stats:
+                for a in range(extended.shape[1]):
+                    for b in range(a + 1, extended.shape[1]):
+                        results[("corr", (a, b))] = pairCorrelation(shifted[:, a], shifted[:, b],
+                                                                    present[:, a] & present[:, b], windowSum)
+
+        # the full window of every row, NaN before the start of the day
+        padded = np.concatenate((np.full((self.rows - 1 - first, extended.shape[1]), np.nan), extended), 0)
+        # fmin and fmax skip NaN, a window of only NaN stays NaN
+        if "min" in self.stats:
+            results.update({("min", idx): column for idx, column in enumerate(windowReduce(padded, self.rows, np.fmin).T)})
+        if "max" in self.stats:
+            results.update({("max", idx): column for idx, column in enumerate(windowReduce(padded, self.rows, np.fmax).T)})
+        if self.quantiles:
+            windows = sliding_window_view(padded, self.rows, axis=0)
+            for q, values in zip(self.quantiles, windowQuantiles(windows, self.quantiles)):
+                results.update({(f"q{q}", idx): column for idx, column in enumerate(values.T)})
+        return results
+
+
+def windowReduce(values, rows, ufunc):
+    '''
+    {ufunc} over every run of {rows} consecutive rows of {values}, len(values) - rows + 1 of
+    them. spans of 1, 2, 4... rows are built by doubling and the window is put together from
+    the spans in the binary form of {rows}, so it takes log2(rows) passes instead of rows
+    '''
+    count = len(values) - rows + 1
+    result = None
+    span, offset, remaining = 1, 0, rows
+    # row i of spans is {ufunc} over values[i:i + span]
+    spans = values
+    while remaining:
+        if remaining & 1:
+            part = spans[offset:offset + count]
+            result = part if result is None else ufunc(result, part)
+            offset += span
+        remaining >>= 1
+        if remaining:
+            spans = ufunc(spans[:-span], spans[span:])
+            span *= 2
+    return result
+
+
+def windowVariance(values, mean, count, windowSum):
+    '''
+    population variance of every window from the sums of the shifted {values} and their window
+    {mean}. a window whose variance is within the round-off of its sums, i.e. one that is flat
+    or as good as, gets exactly 0 rather than whatever is left of the cancellation
+    '''
+    squares, error = windowSum(values ** 2, withError=True)
+    variance = squares / count - mean ** 2
+    return np.where(variance * count <= 2 * error, 0, variance)
+
+
+def pairCorrelation(x, y, both, windowSum):
+    '''
+    pearson correlation of two shifted sensors over the rows where both have a reading. a
+    window where either sensor is flat has no correlation and gives NaN, and what round-off
+    leaves over is kept within [-1, 1]
+    '''
+    x, y = np.where(both, x, 0), np.where(both, y, 0)
+    count = windowSum(both.astype('float64'))
+    meanX, meanY = windowSum(x) / count, windowSum(y) / count
+    covariance = windowSum(x * y) / count - meanX * meanY
+    varianceX = windowVariance(x, meanX, count, windowSum)
+    varianceY = windowVariance(y, meanY, count, windowSum)
+    flat = (varianceX == 0) | (varianceY == 0)
+    return np.where(flat, np.nan, np.clip(covariance / np.sqrt(varianceX * varianceY), -1, 1))
+
+
+def windowQuantiles(windows, quantiles):
+    '''
+    the {quantiles} of every (row, sensor) window, linearly interpolated between the closest
+    readings the same way as np.quantile, skipping NaN
+    '''
+    ordered = np.sort(windows, -1)
+    valid = (~np.isnan(ordered)).sum(-1)
+    for q in quantiles:
+        position = q * np.maximum(valid - 1, 0)
+        low = np.floor(position).astype('int64')
+        high = np.minimum(low + 1, np.maximum(valid - 1, 0))
+        lowValue = np.take_along_axis(ordered, low[..., None], -1)[..., 0]
+        highValue = np.take_along_axis(ordered, high[..., None], -1)[..., 0]
+        values = lowValue + (highValue - lowValue) * (position - low)
+        values[valid == 0] = np.nan
+        yield values
+
+
+def rollingStatsFrame(merged, sensors, settings, blockRows=4096):
+    '''
+    the windowed statistics of the {sensors} columns of a merged data frame, {settings} being
+    the rollingStats yaml entry. returns a data frame with the Date_Time of {merged}
+    '''
+    times = merged["Date_Time"].to_numpy(dtype='datetime64[ns]').view('i8')
+    readings = merged[sensors].to_numpy(dtype='float64')
+    step = int(times[1] - times[0]) if len(times) > 1 else 1
+    windows = {label: RollingWindow(max(int(round(pd.Timedelta(label).value / step)), 1),
+                                    settings["stats"], settings["quantiles"])
+               for label in settings["windows"]}
+
+    columns = {}
+    for blockStart in range(0, len(readings), blockRows):
+        block = readings[blockStart:blockStart + blockRows]
+        for label, window in windows.items():
+            for (stat, index), values in window.update(block).items():
+                name = "_".join([sensors[idx] for idx in index] if stat == "corr" else [sensors[index]])
+                columns.setdefault(f"{name}_{stat}_{label}", []).append(values)
+
+    stats = pd.DataFrame({name: np.concatenate(parts) for name, parts in columns.items()})
+    stats.insert(0, 'Date_Time', times.view('datetime64[ns]'))
+    return stats
@@ -0,0 +1,150 @@
+import mmap
+import os
+import numpy as np
+import pandas as pd
+
+'''
+Dedicated reader for the raw sensor text files. the file is memory mapped and split into
+lines and fields with array operations on its bytes, nothing is parsed line by line:
+
+    Breakout-05                                                      <---- sensor name line
+          Date,      Time,   Battery,  Fix,       Latitude,     etc....   <---- header
+     2022/4/13,   11:58:8,  3.988750,    0,       0.000000,     etc....
+       22/4/13,   18:58:18,  3.988750,    0,       0.000000,     etc....
+
+the Date and Time fields are read straight into int64 epoch nanoseconds. rows with a 2 digit
+year (recorded in UTC) and zero stamps (0/0/0 0:0:0) are picked up in the same pass.
+readSensorText returns None for anything that doesn't follow the format exactly, e.g. rows
+with a different number of fields or empty values, so the caller can fall back on read_csv
+'''
+
+
+def readSensorText(file, columns, badTimes=None, headerRows=2):
+    '''
+    reads the {columns} (positions, or 'all') of a raw sensor file.
+    returns (df, utcRows, report) or None when the file has to go through read_csv instead.
+    df has a datetime64[ns] Date_Time column followed by the measurement columns, rows whose
+    stamp can't be read are already dropped. utcRows flags the rows of df with a 2 digit year,
+    the year is widened but the time is not moved. report is
+    {"knownBad": count, "unparseable": count, "zeroStamps": count, "examples": first few unparseable stamps}
+    '''
+    if os.path.getsize(file) == 0:
+        return None
+    with open(file, 'rb') as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        buffer = np.frombuffer(mapped, dtype=np.uint8)
+        try:
+            return parseBuffer(buffer, columns, badTimes or [], headerRows)
+        finally:
+            # the map can only be closed once nothing points into it
+            del buffer
+
+
+def parseBuffer(buffer, columns, badTimes, headerRows):
+    newlines = np.flatnonzero(buffer == ord('\n'))
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(buffer)]))
+    # windows line endings
+    ends = ends - ((ends > starts) & (buffer[np.maximum(ends - 1, 0)] == ord('\r')))
+    if len(starts) <= headerRows:
+        return None
+
+    header = bytes(buffer[starts[headerRows - 1]:ends[headerRows - 1]]).decode()
+    names = [name.replace(" ", "") for name in header.split(',')]
+    if 'all' in columns:
+        wanted = list(range(len(names)))
+    elif all(isinstance(column, int) for column in columns):
+        wanted = sorted(set(columns))
+    else:
+        return None
+    if wanted[:2] != [0, 1] or wanted[-1] >= len(names):
+        return None
+
+    # blank lines, and lines with nothing but separators, are skipped same as fixUTCLines does
+    starts, ends = starts[headerRows:], ends[headerRows:]
+    printable = np.concatenate(([0], np.cumsum((buffer > ord(' ')) & (buffer != ord(',')))))
+    keep = printable[ends] - printable[starts] > 0
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts):
+        return None
+
+    commas = np.flatnonzero(buffer == ord(','))
+    first = np.searchsorted(commas, starts)
+    if (np.searchsorted(commas, ends) - first != len(names) - 1).any():
+        return None
+    # (row x field) start and end of every field
+    fieldStarts = np.column_stack((starts, commas[first[:, None] + np.arange(len(names) - 1)] + 1))
+    fieldEnds = np.column_stack((fieldStarts[:, 1:] - 1, ends))
+
+    date, dateDigits, dateValid = digitGroups(fieldChars(buffer, fieldStarts[:, 0], fieldEnds[:, 0]), '/')
+    time, timeDigits, timeValid = digitGroups(fieldChars(buffer, fieldStarts[:, 1], fieldEnds[:, 1]), ':')
+    zeroStamps = ((date == 0).all(axis=1) & (time == 0).all(axis=1))
+    utcRows = dateDigits[:, 0] == 2
+    year = date[:, 0] + np.where(utcRows, 2000, 0)
+    month, day = date[:, 1], date[:, 2]
+    hour, minute, second = time[:, 0], time[:, 1], time[:, 2]
+
+    valid = (dateValid & timeValid & np.isin(dateDigits[:, 0], (2, 4)) & (month >= 1) & (month <= 12)
+             & (hour < 24) & (minute < 60) & (second < 60))
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0)
+    monthStart = months.astype('datetime64[M]').astype('datetime64[D]')
+    daysInMonth = ((months + 1).astype('datetime64[M]').astype('datetime64[D]') - monthStart).astype('i8')
+    valid &= (day >= 1) & (day <= daysInMonth)
+    stamps = ((monthStart.astype('i8') + day - 1) * 86400 + hour * 3600 + minute * 60 + second) * 10**9
+
+    # the stamps that can't be read are put together the way read_csv joins Date and Time
+    rawStamps = [bytes(buffer[fieldStarts[row, 0]:fieldEnds[row, 0]]).decode() + ' ' +
+                 bytes(buffer[fieldStarts[row, 1]:fieldEnds[row, 1]]).decode()
+                 for row in np.flatnonzero(~valid)]
+    knownBad = [stamp in badTimes for stamp in rawStamps]
+    unparseable = [stamp.strip() for stamp, bad in zip(rawStamps, knownBad) if not bad]
+    report = {"knownBad": sum(knownBad), "unparseable": len(unparseable),
+              "zeroStamps": int(zeroStamps.sum()), "examples": unparseable[:5]}
+
+    data = {"Date_Time": stamps[valid].view('datetime64[ns]')}
+    for column in wanted[2:]:
+        chars = fieldChars(buffer, fieldStarts[valid, column], fieldEnds[valid, column])
+        text = np.ascontiguousarray(chars).view(f'S{chars.shape[1]}').ravel()
+        try:
+            values = text.astype(np.float64)
+        except ValueError:
+            # empty or non numeric values, read_csv decides what to make of them
+            return None
+        # whole numbers come out as int64 like read_csv would make them
+        if not np.isin(chars, np.frombuffer(b'.eEnN', dtype=np.uint8)).any():
+            values = values.astype(np.int64)
+        data[names[column]] = values
+    return pd.DataFrame(data), utcRows[valid], report
+
+
+def fieldChars(buffer, starts, ends):
+    # (row x width) bytes of one field per row, right aligned and padded in front with spaces
+    width = max(int((ends - starts).max()), 1)
+    index = ends[:, None] - width + np.arange(width)
+    return np.where(index >= starts[:, None], buffer[np.maximum(index, 0)], ord(' ')).astype(np.uint8)
+
+
+def digitGroups(chars, separator, groups=3):
+    '''
+    reads {groups} unsigned integers split by {separator} out of right aligned field bytes,
+    one column of the bytes at a time across every row.
+    returns (values, digits in each group, valid), a row is only valid when it is nothing but
+    leading spaces and {groups} non empty runs of digits
+    '''
+    rows = len(chars)
+    values = np.zeros((rows, groups), np.int64)
+    digits = np.zeros((rows, groups), np.int64)
+    group = np.zeros(rows, np.int64)
+    started = np.zeros(rows, bool)
+    valid = np.ones(rows, bool)
+    for column in chars.T:
+        isDigit = (column >= ord('0')) & (column <= ord('9'))
+        isSeparator = column == ord(separator)
+        valid &= isDigit | isSeparator | ((column == ord(' ')) & ~started)
+        started |= column != ord(' ')
+
+        update = np.flatnonzero(isDigit & (group < groups))
+        values[update, group[update]] = values[update, group[update]] * 10 + column[update] - ord('0')
+        digits[update, group[update]] += 1
+        group += isSeparator
+    valid &= (group == groups - 1) & (digits > 0).all(axis=1)
+    return values, digits, valid
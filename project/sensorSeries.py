@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+'''
+Compact in-memory form of one sensor's cleaned recording, what the stages pass around
+between reading a file and writing it out:
+
+    times  : int64 epoch nanoseconds, one per row
+    values : (row x column) block holding every measurement column, int32 when all of them
+             are whole numbers that fit, otherwise float64
+    plus the sensor name, the time offset applied to it and the raw file it was read from
+
+float columns are kept as float64 so the processed data comes out with the same values as
+the raw file. data frames are only built at the edges, when a frame comes in from read_csv
+and when the processed data is written, toFrame gives back the original column dtypes
+'''
+
+
+class SensorSeries:
+    __slots__ = ("times", "values", "columns", "dtypes", "sensor", "offset", "source")
+
+    def __init__(self, times, values, columns, dtypes=None, sensor=None, offset=None, source=None):
+        self.times = times
+        self.values = values
+        self.columns = list(columns)
+        # dtypes the columns had as a data frame, toFrame hands them back
+        self.dtypes = list(dtypes) if dtypes is not None else [str(values.dtype)] * len(self.columns)
+        self.sensor = sensor
+        self.offset = offset
+        self.source = source
+
+    @classmethod
+    def fromFrame(cls, df, sensor=None, offset=None, source=None):
+        # the first column of {df} is the timestamp, every other column a measurement
+        times = np.ascontiguousarray(df.iloc[:, 0].to_numpy(dtype='datetime64[ns]').view('i8'))
+        measurements = df.iloc[:, 1:]
+        values = np.empty((len(df), measurements.shape[1]), blockType(measurements.dtypes, measurements))
+        for idx, column in enumerate(measurements.columns):
+            values[:, idx] = measurements[column].to_numpy()
+        return cls(times, values, measurements.columns, [str(dtype) for dtype in measurements.dtypes],
+                   sensor, offset, source)
+
+    def toFrame(self):
+        data = {"Date_Time": self.times.view('datetime64[ns]')}
+        for idx, (column, dtype) in enumerate(zip(self.columns, self.dtypes)):
+            data[column] = self.values[:, idx].astype(dtype, copy=False)
+        return pd.DataFrame(data)
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes
+
+    def take(self, rows):
+        # the rows picked out by a slice, mask or index array. a slice shares memory with this series
+        return SensorSeries(self.times[rows], self.values[rows], self.columns, self.dtypes,
+                            self.sensor, self.offset, self.source)
+
+    def since(self, cutoff):
+        # every row recorded at or after {cutoff}, a view when those rows are in one run
+        rows = np.flatnonzero(self.times >= pd.Timestamp(cutoff).value)
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            return self.take(slice(rows[0], rows[-1] + 1))
+        return self.take(rows)
+
+
+def blockType(dtypes, frame=None):
+    '''
+    the dtype a block of columns with {dtypes} is stored as, int32 when every column is an
+    integer and the values of {frame} fit, int64 when they don't, float64 otherwise
+    '''
+    if not all(np.dtype(dtype).kind in 'biu' for dtype in dtypes):
+        return np.float64
+    limits = np.iinfo(np.int32)
+    if frame is not None and len(frame) and not ((frame.min() >= limits.min) & (frame.max() <= limits.max)).all():
+        return np.int64
+    return np.int32
+
+
+def asSeries(data, sensor=None):
+    # {data} as a SensorSeries, data frames are converted
+    if isinstance(data, SensorSeries):
+        return data
+    return SensorSeries.fromFrame(data, sensor)
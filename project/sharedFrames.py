@@ -0,0 +1,64 @@
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from sensorSeries import SensorSeries
+
+'''
+Moves cleaned sensor data between the process pool and the main process through shared memory
+instead of pickling it. a SensorSeries is laid out in one shared block, its times followed by
+its values, the handle that travels between processes only describes that layout:
+
+    {"block": shared memory name, "length": rows, "columns": [...], "dtypes": [...], "valueType": dtype of the values}
+
+blocks created in a worker stay open there until the pool shuts down, so they survive on
+platforms that free shared memory as soon as nobody holds it. the main process unlinks
+every block it was handed once the run is over with releaseFrame.
+'''
+
+# blocks created by this process, kept open until the process exits
+openBlocks = {}
+
+
+def startTracking():
+    '''
+    call in the main process before the pool starts. workers then share its resource tracker
+    instead of starting their own, which would unlink every block they created when they exit
+    '''
+    resource_tracker.ensure_running()
+
+
+def shareSeries(series):
+    times = np.ascontiguousarray(series.times)
+    values = np.ascontiguousarray(series.values)
+    block = shared_memory.SharedMemory(create=True, size=max(times.nbytes + values.nbytes, 1))
+    np.ndarray(times.shape, times.dtype, buffer=block.buf)[:] = times
+    np.ndarray(values.shape, values.dtype, buffer=block.buf, offset=times.nbytes)[:] = values
+    openBlocks[block.name] = block
+
+    return {"block": block.name, "length": len(series), "columns": series.columns, "dtypes": series.dtypes,
+            "valueType": str(values.dtype), "sensor": series.sensor, "offset": series.offset,
+            "source": series.source}
+
+
+def attachSeries(handle):
+    '''
+    returns a SensorSeries built on top of the shared block described by {handle}.
+    the block is kept open for as long as this process is alive
+    '''
+    block = openBlocks.get(handle["block"])
+    if block is None:
+        block = shared_memory.SharedMemory(name=handle["block"])
+        openBlocks[handle["block"]] = block
+
+    length = handle["length"]
+    times = np.ndarray(length, 'i8', buffer=block.buf)
+    values = np.ndarray((length, len(handle["columns"])), handle["valueType"], buffer=block.buf, offset=times.nbytes)
+    return SensorSeries(times, values, handle["columns"], handle["dtypes"], handle["sensor"], handle["offset"],
+                        handle["source"])
+
+
+def releaseFrame(handle):
+    block = openBlocks.pop(handle["block"], None)
+    if block is None:
+        block = shared_memory.SharedMemory(name=handle["block"])
+    block.close()
+    block.unlink()
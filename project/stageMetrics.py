@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak RSS is left out of the report there
+    resource = None
+
+'''
+Timings of the pipeline stages, kept per (stage, date, particle, sensor) for the run report.
+
+    read        <---- parsing a raw file, sensorReader or read_csv
+    utcFix      <---- setting the rows recorded in UTC back to PST
+    badStamps   <---- dropping the rows whose timestamp read_csv couldn't parse
+    health      <---- recording health check
+    resample    <---- interpolating onto the 10 second grid
+    merge       <---- merging the sensors of a day
+    stats       <---- rolling stats of the merged data, when rollingStats is set
+    write       <---- writing to the output store and csv export
+
+a stage that runs once per chunk adds up into the same row, so rows in and out and the
+times cover the whole file or day. the read stages belong to a file rather than a day, their
+date is left empty, and the health, resample and merge stages cover every particle of the
+day, their particle is left empty. pool workers keep their own rows, which are handed back
+with popRecords and folded into the main process with mergeRecords. stages can run on the
+prefetch and writer threads as well, their cpu time is that of the thread they ran on
+'''
+
+# {(stage, date, particle, sensor): row} of this process
+records = {}
+recordsLock = threading.Lock()
+
+
+@contextmanager
+def measure(stage, sensor="", date="", particle="", rowsIn=0):
+    '''
+    times the body of the with block as one call of {stage}. the yielded dict can be given a
+    "rowsOut" count once the stage is done, it defaults to {rowsIn}
+    '''
+    counts = {"rowsOut": None}
+    wallStart, cpuStart = time.perf_counter(), time.thread_time()
+    try:
+        yield counts
+    finally:
+        with recordsLock:
+            row = records.setdefault((stage, date, particle, sensor), {
+                "stage": stage, "date": date, "particle": particle, "sensor": sensor,
+                "calls": 0, "wall": 0.0, "cpu": 0.0, "rowsIn": 0, "rowsOut": 0, "peakRSS": None})
+            row["calls"] += 1
+            row["wall"] += time.perf_counter() - wallStart
+            row["cpu"] += time.thread_time() - cpuStart
+            row["rowsIn"] += rowsIn
+            row["rowsOut"] += rowsIn if counts["rowsOut"] is None else counts["rowsOut"]
+            row["peakRSS"] = peakRSS()
+
+
+def peakRSS():
+    # peak resident set size of the process so far in MB, linux reports kB and mac bytes
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if platform.system() == "Darwin" else 2**10), 1)
+
+
+def popRecords():
+    # takes every row recorded so far out of this process, for a pool worker to send back
+    with recordsLock:
+        rows = list(records.values())
+        records.clear()
+    return rows
+
+
+def mergeRecords(rows):
+    # adds the rows handed back by a pool worker to this process's records
+    with recordsLock:
+        for new in rows:
+            key = (new["stage"], new["date"], new["particle"], new["sensor"])
+            row = records.setdefault(key, dict(new, calls=0, wall=0.0, cpu=0.0, rowsIn=0, rowsOut=0))
+            for field in ("calls", "wall", "cpu", "rowsIn", "rowsOut"):
+                row[field] += new[field]
+            peaks = [peak for peak in (row["peakRSS"], new["peakRSS"]) if peak is not None]
+            row["peakRSS"] = max(peaks) if peaks else None
+
+
+def writeReport(directory, run):
+    '''
+    writes runReport.json, the {run} summary with every stage row, and runReport.csv with just
+    the stage rows to {directory}. the recorded rows are cleared
+    '''
+    rows = sorted(popRecords(), key=lambda row: (row["date"], row["particle"], row["sensor"], row["stage"]))
+    for row in rows:
+        row["wall"], row["cpu"] = round(row["wall"], 6), round(row["cpu"], 6)
+    run = dict(run, peakRSS=peakRSS(), stages=rows)
+    with open(os.path.join(directory, "runReport.json"), "w") as fout:
+        json.dump(run, fout, indent=1)
+    with open(os.path.join(directory, "runReport.csv"), "w", newline="") as fout:
+        writer = csv.DictWriter(fout, ["stage", "date", "particle", "sensor", "calls", "wall", "cpu",
+                                       "rowsIn", "rowsOut", "peakRSS"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return run
@@ -0,0 +1,124 @@
+import argparse
+import json
+import logging
+import os
+import time
+import genNewYamlParams
+import dataCleaning
+from dataIndex import indexCachePath, loadIndex
+from dataPaths import atomicWrite, dataPath
+
+# queue depth and job latencies of the running watcher, rewritten as they change
+statusPath = os.path.join(dataCleaning.dataInfoPath, "watchStatus.json")
+logger = logging.getLogger("data-watch")
+logger.propagate = True
+
+'''
+Long running watcher for the Data folder. each poll loads the Data index, which only stats
+the files and hashes the ones whose size or mtime moved, so it is cheap enough to do every
+few seconds and works the same on every platform. a file that is added, deleted, or replaced
+with different contents counts as a change, one that is only touched doesn't. once a burst of
+writes has been quiet for the debounce time, new dates are added to the yaml params by
+genNewYamlParams and dataCleaning.main runs with the manifest deciding which (sensor, day)
+jobs are stale, so only the jobs touched by the changed files are run
+'''
+
+
+def snapshot():
+    # {file: sha1} of every raw file in the Data index, dataCleaning reuses the hashes
+    return {file: entry["sha1"] for file, entry in loadIndex(dataPath, indexCachePath)["files"].items()}
+
+
+def watch(interval=2, debounce=10, workers=1, tail=False, retry=60):
+    '''
+    polls Data/ every {interval} seconds and processes the changes once no file has changed
+    for {debounce} seconds. jobs run on {workers} processes, with {tail} only the rows
+    appended to a file are parsed. a cycle that fails is logged and written to the status,
+    its files are tried again {retry} seconds later, or sooner when they change. stops on ctrl-c
+    '''
+    known = snapshot()
+    # {file: when its first unprocessed change was seen}
+    pending = {}
+    lastChange = 0
+    status = {"queueDepth": 0, "pendingFiles": 0, "cycles": 0, "failedCycles": 0, "lastError": None, "jobs": []}
+    logger.info(f"watching {os.path.abspath(dataPath)} for changes")
+    try:
+        while True:
+            current = snapshot()
+            now = time.time()
+            for file in current.keys() | known.keys():
+                if known.get(file) != current.get(file):
+                    pending.setdefault(file, now)
+                    lastChange = now
+            known = current
+
+            if pending and now - lastChange >= debounce:
+                logger.info(f"processing changes to {sorted(pending)}")
+                try:
+                    runCycle(pending, workers, tail, status)
+                    pending = {}
+                except Exception as e:
+                    # e.g. a broken yaml or a file that can't be read, the watcher keeps going
+                    logger.exception(f"processing the changes failed, trying again in {retry}s")
+                    status["failedCycles"] += 1
+                    status["queueDepth"] = 0
+                    status["lastError"] = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "files": sorted(pending),
+                                           "error": f"{type(e).__name__}: {e}"}
+                    writeStatus(status)
+                    lastChange = now + retry - debounce
+            if status["pendingFiles"] != len(pending):
+                status["pendingFiles"] = len(pending)
+                writeStatus(status)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        logger.info("stopped watching")
+
+
+def runCycle(pending, workers, tail, status):
+    '''
+    adds any new dates to the yaml params and reprocesses the stale jobs. the latency of a job
+    is measured from the first change of the burst being seen to the job being written
+    '''
+    detected = min(pending.values())
+    started = time.time()
+    genNewYamlParams.main()
+
+    def progress(done, total, particle=None, date=None):
+        status["queueDepth"] = total - done
+        if particle is not None:
+            latency = time.time() - detected
+            status["jobs"] = status["jobs"][-99:] + [{
+                "particle": particle, "date": date, "latency": round(latency, 3),
+                "runTime": round(time.time() - started, 3)}]
+            logger.info(f"{date} {particle} done {latency:.1f}s after the change, "
+                        f"{total - done} jobs queued")
+        writeStatus(status)
+
+    dataCleaning.main(workers=workers, tail=tail, progress=progress)
+    status["cycles"] += 1
+    status["lastError"] = None
+    status["queueDepth"] = 0
+    writeStatus(status)
+
+
+def writeStatus(status):
+    with atomicWrite(statusPath) as fout:
+        json.dump(status, fout, indent=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="reprocess the sensor data whenever the Data folder changes")
+    parser.add_argument("--interval", type=float, default=2,
+                        help="seconds between polls of the Data folder")
+    parser.add_argument("--debounce", type=float, default=10,
+                        help="seconds without any change before a burst of writes is processed")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to run the jobs on")
+    parser.add_argument("--tail", action="store_true",
+                        help="only parse the rows appended to the raw files")
+    parser.add_argument("--retry", type=float, default=60,
+                        help="seconds before the changes of a failed cycle are processed again")
+    args = parser.parse_args()
+    # the watcher and both steps of a cycle log to dataCleaning.log
+    dataCleaning.setupLogging()
+    watch(args.interval, args.debounce, args.workers, args.tail, args.retry)
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import os
+import yaml
+from dataPaths import atomicWrite, dataInfoPath, dayKey, paramsPath
+
+# hashes of the day settings the last finished run was made with, see changedDays
+dayHashesPath = os.path.join(dataInfoPath, "paramsHashes.json")
+# every setting the yaml can hold, {name: (allowed types, required)}
+paramsSchema = {
+    "Columns": ((list,), True),
+    "Days": ((dict,), True),
+    "Particles": ((list,), True),
+    "sensorConditions": ((dict,), True),
+    "dayStart": ((str,), True),
+    "dayEnd": ((str,), True),
+    "processAll": ((bool,), True),
+    "badTimes": ((list,), False),
+    "csvExport": ((bool,), False),
+    "outputFormat": ((str,), False),
+    "upsampleFactor": ((int,), False),
+    "rollingStats": ((dict, type(None)), False)}
+# the settings every output of a day depends on. sensorConditions, upsampleFactor and
+# rollingStats only touch some of the outputs, the manifest keeps track of those by itself
+daySections = ("Columns", "badTimes", "dayStart", "dayEnd", "outputFormat", "csvExport")
+logger = logging.getLogger("yaml-params")
+logger.propagate = True
+
+'''
+dataCleaningParams.yaml, parsed and checked against paramsSchema once per process. loadParams
+hands back the same Params for as long as the file on disk keeps its size and mtime, so
+genNewYamlParams and dataCleaning running one after the other in watchData share one parse.
+a file that isn't valid yaml or doesn't follow the schema raises a ValueError naming every
+problem, rather than leaving the run to trip over a missing key later. Days keys that aren't
+dates, like the MM-dd-YY template older param files start with, are left out with a warning
+and written back as they were by save.
+changes are made on the Params and only written out by save, once at the end of a run or at
+a checkpoint the caller picks, written to a temporary file first and renamed over the yaml so
+a crash never leaves half a param file behind.
+every section is hashed, and dayHashes puts together the hash of each day's entry and the
+daySections. after a run the hashes are kept in dataInfo/paramsHashes.json, the days whose
+hash changed since then are reprocessed as a whole without asking the manifest about each output
+'''
+
+# {path: Params} parsed by this process
+loaded = {}
+
+
+class Params:
+    def __init__(self, path, values, stamp, skippedDays=None):
+        self.path = path
+        self.values = values
+        # Days entries whose key isn't a date, e.g. the old MM-dd-YY template, kept to be saved back
+        self.skippedDays = skippedDays or {}
+        # size and mtime of the file the values were read from
+        self.stamp = stamp
+        # whether there are changes that haven't been saved yet
+        self.dirty = False
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def sectionHash(self, name):
+        return valueHash(self.values.get(name))
+
+    def dayHashes(self):
+        # {date: hash} of every day's own entry together with the daySections
+        shared = {name: self.sectionHash(name) for name in daySections}
+        return {date: valueHash([entry, shared]) for date, entry in self.values["Days"].items()}
+
+    def addDays(self, days):
+        # {date: {"filePattern": [...]}} added to Days, written out by the next save
+        self.values["Days"].update(days)
+        self.dirty = True
+
+    def save(self):
+        # writes the changes back to the yaml, nothing happens when there aren't any
+        if not self.dirty:
+            return
+        problems = schemaProblems(self.values)
+        if problems:
+            raise ValueError(f"not saving {self.path}: " + "; ".join(problems))
+        with atomicWrite(self.path) as outfile:
+            yaml.dump(dict(self.values, Days=dict(self.skippedDays, **self.values["Days"])), outfile,
+                      default_flow_style=False)
+        self.stamp = fileStamp(self.path)
+        self.dirty = False
+
+
+def fileStamp(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def valueHash(value):
+    # the same settings always give the same hash, whatever order the yaml lists them in
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def loadParams(path=paramsPath):
+    '''
+    the Params of the yaml file at {path}, only parsed again when the file changed on disk.
+    Params with unsaved changes are handed back as they are
+    '''
+    stamp = fileStamp(path)
+    params = loaded.get(path)
+    if params is not None and (params.stamp == stamp or params.dirty):
+        return params
+
+    with open(path, "r") as stream:
+        try:
+            values = yaml.safe_load(stream)
+        except yaml.YAMLError as exc:
+            raise ValueError(f"{path} is not valid yaml: {exc}") from exc
+    problems = schemaProblems(values)
+    if problems:
+        raise ValueError(f"{path} doesn't follow the params schema: " + "; ".join(problems))
+    unknown = [name for name in values if name not in paramsSchema]
+    if unknown:
+        logger.warning(f"{path} has settings the pipeline doesn't use: {unknown}")
+    skippedDays = {date: entry for date, entry in values["Days"].items()
+                   if not isinstance(date, str) or dayKey(date) is None}
+    if skippedDays:
+        logger.warning(f"{path}: skipping Days {list(skippedDays)}, they aren't M-D-YY dates like 4-13-22")
+        values["Days"] = {date: entry for date, entry in values["Days"].items() if date not in skippedDays}
+    logger.debug(f"parsed {path}")
+    loaded[path] = Params(path, values, stamp, skippedDays)
+    return loaded[path]
+
+
+def schemaProblems(values):
+    # everything about {values} that doesn't follow paramsSchema, an empty list when nothing
+    if not isinstance(values, dict):
+        return ["the file should hold a mapping of settings"]
+    problems = []
+    for name, (types, required) in paramsSchema.items():
+        if name not in values:
+            if required:
+                problems.append(f"{name} is missing")
+        elif not isinstance(values[name], types) or (bool not in types and isinstance(values[name], bool)):
+            problems.append(f"{name} should be {' or '.join(t.__name__ for t in types)}, "
+                            f"got {type(values[name]).__name__}")
+    days = values.get("Days")
+    for date, entry in days.items() if isinstance(days, dict) else ():
+        patterns = entry.get("filePattern") if isinstance(entry, dict) else None
+        if not isinstance(patterns, list) or not all(isinstance(part, str) for part in patterns):
+            problems.append(f"Days {date} needs a filePattern list of path elements")
+    return problems
+
+
+def changedDays(params, path=dayHashesPath):
+    '''
+    the dates whose day hash differs from the one saved by recordDayHashes, along with the
+    sections that changed since then. days that weren't in the last run aren't changed, the
+    manifest already has nothing for them
+    '''
+    if not os.path.exists(path):
+        return set(), []
+    with open(path, "r") as fin:
+        saved = json.load(fin)
+    changed = {date for date, dayHash in params.dayHashes().items()
+               if date in saved["days"] and saved["days"][date] != dayHash}
+    sections = [name for name in daySections if saved["sections"].get(name) != params.sectionHash(name)]
+    return changed, sections
+
+
+def recordDayHashes(params, path=dayHashesPath):
+    # keeps the day hashes of a finished run for the next changedDays
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomicWrite(path) as fout:
+        json.dump({"days": params.dayHashes(),
+                   "sections": {name: params.sectionHash(name) for name in daySections}}, fout, indent=1)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules in project import each other by bare name, the same as when they are run as scripts
+projectDir = os.path.join(os.path.dirname(__file__), "..", "project")
+sys.path.insert(0, os.path.abspath(projectDir))
+dataDir = os.path.join(projectDir, "..", "Data")
@@ -0,0 +1,34 @@
+from dataCleaning import loadDayLogs, recordDayLogs, writeLogs
+
+
+def readLogs(tmp_path):
+    return ((tmp_path / "time_Frequency_Error_Log.txt").read_text(),
+            (tmp_path / "interpolation_Effect_Log.txt").read_text())
+
+
+def test_logs_of_skipped_days_and_sensors_are_kept(tmp_path):
+    path = str(tmp_path / "dayLogs.json")
+    days, particles = ["4-13-22", "4-14-22"], ["Dp>0.3", "PM2.5_Std"]
+    dayLogs = loadDayLogs(path)
+    for date in days:
+        frequency = {particle: {"A16": f"A16 {date} {particle}\n", "A7": f"A7 {date} {particle}\n"}
+                     for particle in particles}
+        recordDayLogs(dayLogs, date, ["A16", "A7"], frequency, {"A16": f"A16 {date}\n", "A7": f"A7 {date}\n"})
+        writeLogs(dayLogs, days, particles, str(tmp_path), path)
+    full = readLogs(tmp_path)
+    assert full[0].startswith(f"{'-'*60}\n4-13-22\n{'-'*60}\nA16 4-13-22 Dp>0.3\nA7 4-13-22 Dp>0.3\n{'-'*60}\n")
+    assert full[1] == "\n4-13-22\n\nA16 4-13-22\nA7 4-13-22\n\n4-14-22\n\nA16 4-14-22\nA7 4-14-22\n"
+
+    # a run with nothing to do, then one that only went through A7 of one particle
+    dayLogs = loadDayLogs(path)
+    writeLogs(dayLogs, days, particles, str(tmp_path), path)
+    assert readLogs(tmp_path) == full
+    recordDayLogs(dayLogs, "4-14-22", ["A16", "A7"], {"Dp>0.3": {"A7": "A7 again\n"}}, {"A7": "A7 again\n"})
+    writeLogs(dayLogs, days, particles, str(tmp_path), path)
+    frequencyLog, interpolationLog = readLogs(tmp_path)
+    assert interpolationLog == full[1].replace("A7 4-14-22\n", "A7 again\n")
+    assert frequencyLog == full[0].replace("A7 4-14-22 Dp>0.3\n", "A7 again\n")
+
+    # days taken out of the yaml leave the logs
+    writeLogs(loadDayLogs(path), ["4-14-22"], particles, str(tmp_path), path)
+    assert "4-13-22" not in readLogs(tmp_path)[1] and list(loadDayLogs(path)) == ["4-14-22"]
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import dataIndex
+from dataIndex import dayFiles, fingerprint, loadIndex
+
+
+def makeData(tmp_path):
+    dataDir = tmp_path / "Data"
+    dataDir.mkdir()
+    for name in ("A16_4_13_22.txt", "A16-4-14-22.txt", "B3-5-13_5-14.txt", "notes.md"):
+        (dataDir / name).write_text(f"{name}\n")
+    return dataDir
+
+
+def countHashes(monkeypatch):
+    hashed = []
+    fingerprint = dataIndex.fileFingerprint
+    monkeypatch.setattr(dataIndex, "fileFingerprint", lambda path: hashed.append(path) or fingerprint(path))
+    return hashed
+
+
+def test_index_maps_files_to_days_sensors_and_fingerprints(tmp_path):
+    dataDir = makeData(tmp_path)
+    index = loadIndex(str(dataDir), str(tmp_path / "dataIndex.json"))
+    path = str(dataDir / "A16_4_13_22.txt")
+    assert sorted(index["bySensor"]) == ["A16", "B3"]
+    assert index["byDay"][(2022, 4, 13)] == [path]
+    assert dayFiles(index, "4-13-22") == [path]
+    assert dayFiles(index, "5-14-22") == [str(dataDir / "B3-5-13_5-14.txt")]
+    assert index["files"][path]["sha1"] == hashlib.sha1(b"A16_4_13_22.txt\n").hexdigest()
+
+
+def test_only_changed_files_are_hashed_again(tmp_path, monkeypatch):
+    dataDir = makeData(tmp_path)
+    cachePath = tmp_path / "dataIndex.json"
+    hashed = countHashes(monkeypatch)
+    loadIndex(str(dataDir), str(cachePath))
+    assert len(hashed) == 3
+    assert not (tmp_path / "dataIndex.json.tmp").exists()
+
+    hashed.clear()
+    loadIndex(str(dataDir), str(cachePath))
+    assert hashed == []
+
+    with open(dataDir / "A16-4-14-22.txt", "a") as fout:
+        fout.write("appended\n")
+    index = loadIndex(str(dataDir), str(cachePath))
+    path = str(dataDir / "A16-4-14-22.txt")
+    assert hashed == [path]
+    assert index["files"][path]["sha1"] == hashlib.sha1(b"A16-4-14-22.txt\nappended\n").hexdigest()
+    assert json.loads(cachePath.read_text())["fingerprints"]["A16-4-14-22.txt"] == {
+        key: index["files"][path][key] for key in ("size", "mtime", "sha1")}
+
+
+def test_removed_files_leave_the_index(tmp_path):
+    dataDir = makeData(tmp_path)
+    cachePath = tmp_path / "dataIndex.json"
+    loadIndex(str(dataDir), str(cachePath))
+    (dataDir / "A16-4-14-22.txt").unlink()
+    index = loadIndex(str(dataDir), str(cachePath))
+    assert str(dataDir / "A16-4-14-22.txt") not in index["files"]
+    assert "A16-4-14-22.txt" not in json.loads(cachePath.read_text())["fingerprints"]
+
+
+def test_fingerprints_come_from_the_index(tmp_path, monkeypatch):
+    dataDir = makeData(tmp_path)
+    index = loadIndex(str(dataDir), str(tmp_path / "dataIndex.json"))
+    hashed = countHashes(monkeypatch)
+    path = str(dataDir / "A16_4_13_22.txt")
+    assert fingerprint(index, path)["sha1"] == index["files"][path]["sha1"]
+    assert hashed == []
+
+    other = tmp_path / "A16-4-15-22.txt"
+    other.write_text("elsewhere\n")
+    assert fingerprint(index, str(other))["sha1"] == hashlib.sha1(b"elsewhere\n").hexdigest()
+    fingerprint(index, str(other))
+    assert hashed == [str(other)]
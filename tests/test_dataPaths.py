@@ -0,0 +1,14 @@
+import pytest
+from dataPaths import atomicWrite
+
+
+def test_a_failed_write_leaves_the_old_file(tmp_path):
+    path = tmp_path / "status.json"
+    with atomicWrite(str(path)) as fout:
+        fout.write("old")
+    with pytest.raises(RuntimeError):
+        with atomicWrite(str(path)) as fout:
+            fout.write("half")
+            raise RuntimeError("interrupted")
+    assert path.read_text() == "old"
+    assert [file.name for file in tmp_path.iterdir()] == ["status.json"]
@@ -0,0 +1,21 @@
+import os
+import dayProcessing
+from cleanUpData import readSensorFile
+from conftest import dataDir
+from outputStore import loadStage
+
+
+def test_sensor_frames_are_written_once_for_every_particle(tmp_path, monkeypatch):
+    storeDir = str(tmp_path / "outputStore")
+    monkeypatch.setattr(dayProcessing, "outputStorePath", storeDir)
+    data = {sensor: readSensorFile(os.path.join(dataDir, f"{sensor}_4_13_22.txt"), [0, 1, 6, 13], [], {})["data"]
+            for sensor in ("A16", "A7")}
+    stageParams = {"upsampleFactor": 10, "outputFormat": "npy", "csvExport": False, "writeQueue": 0,
+                   "rollingStats": None}
+    dayProcessing.processDay(["Dp>0.3", "PM2.5_Std"], "4-13-22", data, "4/13/22 10:00", "4/13/22 17:00", stageParams)
+
+    for stage in ("processed", "interpolated"):
+        frames = loadStage(storeDir, stage)
+        assert sorted(frames) == [("4-13-22", "all", "A16"), ("4-13-22", "all", "A7")]
+        assert list(frames[("4-13-22", "all", "A16")].columns) == ["Date_Time", "Dp>0.3", "PM2.5_Std"]
+    assert sorted(loadStage(storeDir, "merged")) == [("4-13-22", "Dp03", "merged"), ("4-13-22", "PM25_Std", "merged")]
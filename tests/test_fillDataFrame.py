@@ -0,0 +1,133 @@
+import glob
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from cleanUpData import readSensorFile
+from conftest import dataDir
+from dataPaths import parseFileName, paramsPath
+from fillDataFrame import fillArrays, fillChunk, fillDf, finishFill, resampleState, timeGrid
+from yamlParams import loadParams
+
+
+def referenceFillDf(df, freq, start, end, cutoff):
+    '''
+    the row by row resampler fillDf was before it was vectorized, kept to check against.
+    returns (frame, accuracy), raises IndexError when no row lands in the grid
+    '''
+    index = pd.date_range(pd.Timestamp(start), pd.Timestamp(end), freq=freq)
+    threshold = pd.Timedelta(seconds=cutoff)
+    volatility = padding = nochange = count = 0
+    overall = []
+    values = df.values
+    for idx, row in enumerate(values):
+        oldCount = count
+        try:
+            while row[0] >= index[count]:
+                count += 1
+        except IndexError:
+            continue
+        val = count - oldCount
+        if not val:
+            continue
+        if threshold < (index[count] - index[oldCount]):
+            for ovrwrt in range(oldCount, count):
+                padding += 1
+                overall.append(np.concatenate(([index[ovrwrt]], np.floor(values[0][1:] * 0))))
+            continue
+        if val > 1:
+            temp = values[0][1:] if not idx else values[idx - 1][1:]
+            inc = (row[1:] - temp) / val
+            for step, ovrwrt in enumerate(range(oldCount, count)):
+                volatility += 1
+                overall.append(np.concatenate(([index[ovrwrt]], np.floor(temp + inc * step))))
+        else:
+            nochange += 1
+            overall.append(np.concatenate(([index[oldCount]], np.floor(row[1:]))))
+    if overall[-1][0] < index[-1]:
+        for ovrwrt in range(count, len(index)):
+            padding += 1
+            overall.append(np.concatenate(([index[ovrwrt]], np.floor(values[0][1:] * 0))))
+    total = len(overall)
+    accuracy = ["% of values from interpolation : " + str(np.round(volatility/total*100, 3)),
+                "% of values from 0-padding : " + str(np.round(padding/total*100, 3)),
+                "% of values not changed : " + str(np.round(nochange/total*100, 3))]
+    return pd.DataFrame(overall, columns=df.columns), accuracy
+
+
+def sensorDays():
+    # (file, date) of every file in Data named with a single day
+    for file in sorted(glob.glob(os.path.join(dataDir, "*.txt"))):
+        parsed = parseFileName(os.path.basename(file))
+        for year, month, day in (parsed["days"] if parsed else []):
+            if year is not None:
+                yield pytest.param(file, f"{month}/{day}/{year % 100:02d}", id=os.path.basename(file))
+
+
+def assertSameFrame(frame, expected):
+    assert list(frame.columns) == list(expected.columns)
+    np.testing.assert_array_equal(frame.iloc[:, 0].to_numpy(dtype='datetime64[ns]'),
+                                  pd.to_datetime(expected.iloc[:, 0]).to_numpy(dtype='datetime64[ns]'))
+    np.testing.assert_array_equal(frame.iloc[:, 1:].to_numpy(dtype='float64'),
+                                  expected.iloc[:, 1:].to_numpy(dtype='float64'))
+
+
+@pytest.mark.parametrize("file, date", list(sensorDays()))
+def test_matches_row_by_row_resampler_on_data(file, date):
+    params = loadParams(paramsPath)
+    start, end = f"{date} {params['dayStart']}", f"{date} {params['dayEnd']}"
+    try:
+        series = readSensorFile(file, params["Columns"], params.get("badTimes", []), params["sensorConditions"])["data"]
+    except IndexError:
+        pytest.skip("the file has no data rows, the pipeline skips it too")
+    df = series.since(start).toFrame()
+    try:
+        expected, expectedAccuracy = referenceFillDf(df, '10s', start, end, 40)
+    except IndexError:
+        with pytest.raises(IndexError):
+            fillDf(df, '10s', start, end, 40)
+        return
+    frame, accuracy = fillDf(df, '10s', start, end, 40)
+    assertSameFrame(frame, expected)
+    assert accuracy == expectedAccuracy
+
+    # the same again streamed a few hundred rows at a time
+    grid = timeGrid(start, end, '10s')
+    state = resampleState()
+    blocks = [fillChunk(series.since(start).take(slice(first, first + 333)), grid, 40, state)
+              for first in range(0, len(df), 333)]
+    block, chunkedAccuracy = finishFill(blocks, grid, state)
+    np.testing.assert_array_equal(block, frame.iloc[:, 1:].to_numpy(dtype='float64'))
+    assert chunkedAccuracy == accuracy
+
+
+def syntheticFrame(seconds, values):
+    times = pd.Timestamp("2022-04-13 10:00") + pd.to_timedelta(seconds, unit="s")
+    return pd.DataFrame({"Date_Time": times, "Dp>0.3": np.asarray(values, dtype='int64'),
+                         "PM2.5_Std": np.asarray(values, dtype='int64') // 3})
+
+
+@pytest.mark.parametrize("seconds", [
+    # samples running past the end of the grid are dropped along with everything after them
+    [0, 20, 40, 60, 95, 130, 150],
+    # a gap over the cutoff is 0 padded, the rest of the day is padded as well
+    [0, 20, 40, 200, 220, 240],
+    # starts after the grid, several samples in one grid step, a sample exactly on a grid point
+    [35, 36, 37, 50, 60, 61, 70, 79],
+    # the first sample is the only one in the grid
+    [5, 500, 600]])
+def test_matches_row_by_row_resampler_on_edge_cases(seconds):
+    df = syntheticFrame(seconds, [27, 9, 18, 39, 39, 27, 48, 12][:len(seconds)])
+    start, end = "2022-04-13 10:00", "2022-04-13 10:02"
+    expected, expectedAccuracy = referenceFillDf(df, '10s', start, end, 40)
+    frame, accuracy = fillDf(df, '10s', start, end, 40)
+    assertSameFrame(frame, expected)
+    assert accuracy == expectedAccuracy
+
+
+def test_no_data_in_the_grid():
+    df = syntheticFrame([3600, 3620], [1, 2])
+    with pytest.raises(IndexError):
+        referenceFillDf(df, '10s', "2022-04-13 10:00", "2022-04-13 10:02", 40)
+    with pytest.raises(IndexError):
+        fillArrays(df, timeGrid("2022-04-13 10:00", "2022-04-13 10:02", '10s'), 40)
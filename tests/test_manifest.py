@@ -0,0 +1,40 @@
+import os
+import sqlite3
+from manifest import lookupOutput, lookupTail, openManifest, paramsKey, recordOutput, recordTail
+
+
+def test_outputs_go_stale_with_their_source_or_params(tmp_path):
+    connection = openManifest(str(tmp_path / "manifest.sqlite"))
+    params = paramsKey({"Columns": ['all']})
+    recordOutput(connection, "4-13-22", "PM2.5_Std", "A16", "abc", params, interpolated=True)
+    assert lookupOutput(connection, "4-13-22", "PM2.5_Std", "A16", "abc", params) == {"interpolated": True}
+    assert lookupOutput(connection, "4-13-22", "PM2.5_Std", "A16", "abd", params) is None
+    assert lookupOutput(connection, "4-13-22", "PM2.5_Std", "A16", "abc", paramsKey({"Columns": [0]})) is None
+    assert lookupOutput(connection, "4-14-22", "PM2.5_Std", "A16", "abc", params) is None
+
+
+def test_old_manifests_drop_their_inputs_table(tmp_path):
+    path = str(tmp_path / "manifest.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE inputs (file TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, sha1 TEXT)")
+    connection.commit()
+    connection.close()
+    tables = openManifest(path).execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+    assert ("inputs",) not in tables
+
+
+def test_tails_carry_on_while_the_file_is_only_appended_to(tmp_path):
+    connection = openManifest(str(tmp_path / "manifest.sqlite"))
+    file = tmp_path / "A16-4-13-22.txt"
+    file.write_text("header\nrow 1\n")
+    offset = os.path.getsize(file)
+    recordTail(connection, "4-13-22", "PM2.5_Std", "A16", str(file), "p", offset, "2022-04-13 10:00:00", {"n": 1})
+
+    with open(file, "a") as fout:
+        fout.write("row 2\n")
+    assert lookupTail(connection, "4-13-22", "PM2.5_Std", "A16", str(file), "p") == {
+        "offset": offset, "lastTime": "2022-04-13 10:00:00", "state": {"n": 1}}
+    assert lookupTail(connection, "4-13-22", "PM2.5_Std", "A16", str(file), "q") is None
+
+    file.write_text("header\nrow X\nrow 2\n")
+    assert lookupTail(connection, "4-13-22", "PM2.5_Std", "A16", str(file), "p") is None
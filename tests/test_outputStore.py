@@ -0,0 +1,47 @@
+import importlib.util
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from dataPaths import partitionDir
+from outputStore import loadStage, readPartition, writePart
+
+# pyarrow is optional, without it only the npy format can be tested
+needsArrow = pytest.mark.skipif(importlib.util.find_spec("pyarrow") is None, reason="parquet and feather need pyarrow")
+parquet = pytest.param("parquet", marks=needsArrow)
+feather = pytest.param("feather", marks=needsArrow)
+
+
+def frame(rows, first=0):
+    times = pd.date_range("2022-04-13 10:00", periods=first + rows, freq="10s")[first:]
+    return pd.DataFrame({"Date_Time": times, "Dp>0.3": np.arange(first, first + rows, dtype='int64'),
+                         "Average": np.linspace(0, 1, rows)})
+
+
+@pytest.mark.parametrize("outputFormat", [parquet, feather, "npy"])
+def test_parts_read_back_in_order(tmp_path, outputFormat):
+    storeDir = str(tmp_path)
+    for part in range(3):
+        writePart(storeDir, "processed", "4-13-22", "Dp03", "A16", frame(5, part * 5), part, outputFormat)
+    df = readPartition(partitionDir(storeDir, "processed", "4-13-22", "Dp03", "A16"))
+    assert df["Dp>0.3"].tolist() == list(range(15))
+    assert str(df["Date_Time"].dtype) == "datetime64[ns]" and str(df["Dp>0.3"].dtype) == "int32"
+
+    # writing part 0 again replaces the partition
+    writePart(storeDir, "processed", "4-13-22", "Dp03", "A16", frame(2), 0, outputFormat)
+    assert len(loadStage(storeDir, "processed")[("4-13-22", "Dp03", "A16")]) == 2
+
+
+@pytest.mark.parametrize("outputFormat", [parquet, "npy"])
+def test_columns_are_picked_out(tmp_path, outputFormat):
+    writePart(str(tmp_path), "merged", "4-13-22", "Dp03", "merged", frame(4), 0, outputFormat)
+    df = readPartition(partitionDir(str(tmp_path), "merged", "4-13-22", "Dp03", "merged"), ["Average", "A7"])
+    assert list(df.columns) == ["Average"]
+
+
+def test_partition_without_parts_is_empty(tmp_path):
+    directory = partitionDir(str(tmp_path), "interpolated", "4-13-22", "Dp03", "A16")
+    # an npy part whose meta.json was never written, like after an interrupted write
+    os.makedirs(os.path.join(directory, "part-00000"))
+    df = readPartition(directory)
+    assert df.empty
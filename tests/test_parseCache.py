@@ -0,0 +1,68 @@
+import os
+import shutil
+import numpy as np
+import pytest
+import parseCache
+from cleanUpData import readSensorFile
+from conftest import dataDir
+from dataPaths import fileFingerprint
+from parseCache import entryDir, loadEntry, paramsKey, storeEntry
+
+
+def cachedFile(tmp_path):
+    # a copy of a raw file along with its cleaned entry and the cache it was stored in
+    file = str(tmp_path / "A16-4-18-22.txt")
+    shutil.copy(os.path.join(dataDir, "A16-4-18-22.txt"), file)
+    entry = readSensorFile(file, ['all'], [], {})
+    cacheDir = str(tmp_path / "parseCache")
+    storeEntry(cacheDir, file, paramsKey(['all'], [], None), entry)
+    return file, entry, cacheDir
+
+
+def test_entries_load_back_the_stored_series(tmp_path):
+    file, entry, cacheDir = cachedFile(tmp_path)
+    cached = loadEntry(cacheDir, file, paramsKey(['all'], [], None))
+    assert (cached["name"], cached["mod"]) == (entry["name"], entry["mod"])
+    np.testing.assert_array_equal(cached["data"].times, entry["data"].times)
+    np.testing.assert_array_equal(cached["data"].values, entry["data"].values)
+    assert cached["data"].columns == entry["data"].columns
+
+
+def test_other_params_miss_the_cache(tmp_path):
+    file, entry, cacheDir = cachedFile(tmp_path)
+    assert loadEntry(cacheDir, file, paramsKey([0, 1, 2], [], None)) is None
+    assert loadEntry(cacheDir, file, paramsKey(['all'], [], 1)) is None
+
+
+def test_touched_files_only_miss_when_their_contents_changed(tmp_path):
+    file, entry, cacheDir = cachedFile(tmp_path)
+    key = paramsKey(['all'], [], None)
+    stat = os.stat(file)
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert loadEntry(cacheDir, file, key) is not None
+
+    with open(file, 'r+b') as fout:
+        # same size, the last digit of the file is changed
+        fout.seek(-2, os.SEEK_END)
+        digit = fout.read(1)
+        fout.seek(-2, os.SEEK_END)
+        fout.write(b"1" if digit != b"1" else b"2")
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+    assert loadEntry(cacheDir, file, key) is None
+
+
+def test_entries_without_meta_are_missing(tmp_path):
+    file, entry, cacheDir = cachedFile(tmp_path)
+    os.remove(os.path.join(entryDir(cacheDir, file), "meta.json"))
+    assert loadEntry(cacheDir, file, paramsKey(['all'], [], None)) is None
+
+
+def test_index_fingerprints_save_hashing_touched_files(tmp_path, monkeypatch):
+    file, entry, cacheDir = cachedFile(tmp_path)
+    key = paramsKey(['all'], [], None)
+    stat = os.stat(file)
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    fingerprint = fileFingerprint(file)
+    monkeypatch.setattr(parseCache, "fileFingerprint", lambda path: pytest.fail(f"{path} was hashed again"))
+    assert loadEntry(cacheDir, file, key, dict(fingerprint, sha1="changed")) is None
+    assert loadEntry(cacheDir, file, key, fingerprint) is not None
@@ -0,0 +1,70 @@
+import importlib.util
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import queryStore
+from dataPaths import partitionDir
+from outputStore import writePart
+
+
+def mergedDay(date, seed):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(pd.Timestamp(date) + pd.Timedelta("10h"), periods=7200, freq="1s")
+    df = pd.DataFrame({"Date_Time": times, "A16": rng.normal(30, 5, len(times)),
+                       "A7": rng.normal(20, 5, len(times))})
+    df.loc[100:200, "A7"] = np.nan
+    return df
+
+
+@pytest.fixture
+def store(tmp_path):
+    storeDir = str(tmp_path / "outputStore")
+    frames = {}
+    for seed, (date, day) in enumerate((("4-13-22", "2022-04-13"), ("4-14-22", "2022-04-14"))):
+        frames[day] = mergedDay(day, seed)
+        writePart(storeDir, "merged", date, "Dp03", "merged", frames[day], 0, "npy")
+    queryStore.loaded.clear()
+    return storeDir, pd.concat(frames.values(), ignore_index=True)
+
+
+def test_query_across_days(store):
+    storeDir, merged = store
+    index = queryStore.loadQueryIndex(storeDir, None)
+    start, end = "2022-04-13 11:30", "2022-04-14 10:30"
+    df = queryStore.query(["A7", "A16"], "Dp03", start, end, storeDir, index)
+    expected = merged[(merged["Date_Time"] >= start) & (merged["Date_Time"] < end)]
+    np.testing.assert_array_equal(df["Date_Time"].to_numpy(), expected["Date_Time"].to_numpy())
+    np.testing.assert_array_equal(df[["A7", "A16"]].to_numpy(), expected[["A7", "A16"]].to_numpy())
+
+
+def test_particle_as_in_the_yaml(store):
+    storeDir, merged = store
+    index = queryStore.loadQueryIndex(storeDir, None)
+    df = queryStore.query("A16", "Dp>0.3", storeDir=storeDir, index=index)
+    assert len(df) == len(merged)
+    rollup = queryStore.rollup("A16", "Dp>0.3", "1h", storeDir=storeDir, index=index)
+    assert len(rollup) == 4
+
+
+def test_rollup_matches_pandas(store):
+    storeDir, merged = store
+    index = queryStore.loadQueryIndex(storeDir, None)
+    df = queryStore.rollup(["A7"], "Dp03", "1min", "2022-04-13 10:00", "2022-04-13 11:00", storeDir, index)
+    expected = merged.set_index("Date_Time")["A7"].loc["2022-04-13 10:00":"2022-04-13 10:59:59"].resample("1min")
+    np.testing.assert_allclose(df["A7_mean"], expected.mean())
+    np.testing.assert_allclose(df["A7_min"], expected.min())
+    np.testing.assert_array_equal(df["A7_count"], expected.count())
+
+
+def test_rollups_are_written_in_the_run_format(store, monkeypatch):
+    storeDir, merged = store
+    index = queryStore.loadQueryIndex(storeDir, None)
+    monkeypatch.setattr(queryStore, "loadParams", lambda: {"outputFormat": "npy"})
+    queryStore.rollup("A16", "Dp03", "1h", storeDir=storeDir, index=index)
+    assert os.path.isdir(os.path.join(partitionDir(storeDir, "rollup-1h", "4-13-22", "Dp03", "merged"), "part-00000"))
+
+    if importlib.util.find_spec("pyarrow") is not None:
+        queryStore.rollup("A16", "Dp03", "day", storeDir=storeDir, index=index, outputFormat="parquet")
+        assert os.path.isfile(os.path.join(partitionDir(storeDir, "rollup-day", "4-13-22", "Dp03", "merged"),
+                                           "part-00000.parquet"))
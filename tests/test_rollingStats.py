@@ -0,0 +1,86 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import dayProcessing
+from cleanUpData import readSensorFile
+from conftest import dataDir
+from outputStore import loadStage
+from rollingStats import rollingStatsFrame
+
+
+def mergedFrame(readings):
+    times = pd.date_range("2022-04-13 10:00", periods=len(readings), freq="1s")
+    df = pd.DataFrame(readings, columns=["A16", "A7"])
+    df.insert(0, "Date_Time", times)
+    return df
+
+
+def flatWindows(series, rows):
+    # pandas leaves the round-off of a window that doesn't change in its variance, this doesn't
+    rolling = series.rolling(rows, min_periods=1)
+    return rolling.max() == rolling.min()
+
+
+@pytest.mark.parametrize("blockRows", [7, 4096])
+def test_corr_matches_pandas_with_flat_stretches(blockRows):
+    rng = np.random.default_rng(0)
+    a = np.floor(rng.normal(500, 40, 900))
+    b = np.floor(a * 0.5 + rng.normal(0, 20, 900))
+    # constant stretches longer and shorter than the window, at levels far from the mean
+    a[100:180] = 3000.0
+    b[150:170] = 7.0
+    a[400:405] = 12.0
+    a[600:700] = np.nan
+    merged = mergedFrame(np.column_stack((a, b)))
+
+    stats = rollingStatsFrame(merged, ["A16", "A7"], {"windows": ["10s", "1min"], "stats": ["corr", "variance"],
+                                                      "quantiles": []}, blockRows)
+    for label, rows in (("10s", 10), ("1min", 60)):
+        x, y = merged["A16"], merged["A7"]
+        expected = x.rolling(rows, min_periods=1).corr(y)
+        both = x.notna() & y.notna()
+        flat = flatWindows(x.where(both), rows) | flatWindows(y.where(both), rows)
+        expected[flat] = np.nan
+        corr = stats[f"A16_A7_corr_{label}"]
+
+        assert np.isfinite(corr[corr.notna()]).all()
+        assert (corr.dropna().abs() <= 1).all()
+        assert corr[flat].isna().all()
+        np.testing.assert_allclose(corr, expected, atol=1e-7, equal_nan=True)
+
+        variance = stats[f"A16_variance_{label}"]
+        np.testing.assert_allclose(variance, x.rolling(rows, min_periods=1).var(ddof=0), atol=1e-6)
+        assert (variance[flatWindows(x, rows) & x.rolling(rows, min_periods=1).count().gt(0)] == 0).all()
+
+
+def test_stats_match_pandas():
+    rng = np.random.default_rng(1)
+    readings = np.floor(rng.normal(100, 10, (500, 2)))
+    readings[50:60, 0] = np.nan
+    merged = mergedFrame(readings)
+    stats = rollingStatsFrame(merged, ["A16", "A7"], {"windows": ["30s"], "stats": ["mean", "min", "max"],
+                                                      "quantiles": [0.5, 0.9]}, 64)
+    rolling = merged["A16"].rolling(30, min_periods=1)
+    np.testing.assert_allclose(stats["A16_mean_30s"], rolling.mean())
+    np.testing.assert_allclose(stats["A16_min_30s"], rolling.min())
+    np.testing.assert_allclose(stats["A16_max_30s"], rolling.max())
+    np.testing.assert_allclose(stats["A16_q0.5_30s"], rolling.quantile(0.5))
+    np.testing.assert_allclose(stats["A16_q0.9_30s"], rolling.quantile(0.9))
+
+
+def test_merged_stage_only_holds_the_merged_data(tmp_path, monkeypatch):
+    storeDir = str(tmp_path / "outputStore")
+    monkeypatch.setattr(dayProcessing, "outputStorePath", storeDir)
+    data = {sensor: readSensorFile(os.path.join(dataDir, f"{sensor}_4_13_22.txt"), [0, 1, 6, 13], [], {})["data"]
+            for sensor in ("A16", "A7")}
+    stageParams = {"upsampleFactor": 10, "outputFormat": "npy", "csvExport": False, "writeQueue": 0,
+                   "rollingStats": {"windows": ["1min"], "stats": ["mean", "corr"], "quantiles": []}}
+    dayProcessing.processDay(["Dp>0.3"], "4-13-22", data, "4/13/22 10:00", "4/13/22 17:00", stageParams)
+
+    merged = loadStage(storeDir, "merged", particle="Dp03")
+    assert list(merged) == [("4-13-22", "Dp03", "merged")]
+    assert list(merged[("4-13-22", "Dp03", "merged")].columns[1:3]) == ["A16", "A7"]
+    stats = loadStage(storeDir, "rollingStats", particle="Dp03")
+    assert list(stats) == [("4-13-22", "Dp03", "merged")]
+    assert "A16_A7_corr_1min" in stats[("4-13-22", "Dp03", "merged")].columns
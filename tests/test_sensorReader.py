@@ -0,0 +1,59 @@
+import glob
+import os
+import numpy as np
+import pytest
+import cleanUpData
+from cleanUpData import readSensorFile
+from conftest import dataDir
+from sensorReader import readSensorText
+
+header = ("Beta-19\n"
+          "      Date,      Time,   Battery,  Fix,       Latitude\n")
+rows = [" 2022/4/18,    9:26:0,  4.045000,    0,       0.000000\n",
+        "   22/4/18,   16:26:10,  4.040000,    1,      37.500000\n",
+        " 2022/4/18,   9:26:20,  4.035000,    0,       0.000000\n"]
+
+
+def readBoth(monkeypatch, file, columns):
+    # the series of {file} from sensorReader and from the read_csv fallback
+    fast = readSensorFile(file, columns, [], {})["data"]
+    with monkeypatch.context() as patch:
+        patch.setattr(cleanUpData, "readSensorText", lambda *args: None)
+        slow = readSensorFile(file, columns, [], {})["data"]
+    return fast, slow
+
+
+def assertSameSeries(fast, slow):
+    np.testing.assert_array_equal(fast.times, slow.times)
+    np.testing.assert_array_equal(fast.values, slow.values)
+    assert [c.replace(" ", "") for c in fast.columns] == [c.replace(" ", "") for c in slow.columns]
+
+
+@pytest.mark.parametrize("file", sorted(glob.glob(os.path.join(dataDir, "*.txt"))), ids=os.path.basename)
+def test_fast_path_matches_read_csv_on_data(monkeypatch, file):
+    try:
+        fast, slow = readBoth(monkeypatch, file, ['all'])
+    except IndexError:
+        pytest.skip("the file has no data rows, the pipeline skips it too")
+    assertSameSeries(fast, slow)
+
+
+@pytest.mark.parametrize("columns", [['all'], [0, 1, 2, 4]])
+def test_blank_rows_are_dropped_by_both_readers(monkeypatch, tmp_path, columns):
+    file = tmp_path / "B19-4-18-22.txt"
+    blank = "   ,      ,         ,     ,      \n"
+    file.write_text(header + rows[0] + "\n" + blank + rows[1] + ",,,,\n" + rows[2] + blank)
+    df, utcRows, report = readSensorText(str(file), columns)
+    assert len(df) == 3
+    assert list(utcRows) == [False, True, False]
+    assert report["unparseable"] == report["zeroStamps"] == 0
+
+    fast, slow = readBoth(monkeypatch, str(file), columns)
+    assert len(fast) == 3
+    assertSameSeries(fast, slow)
+
+
+def test_empty_values_fall_back_on_read_csv(tmp_path):
+    file = tmp_path / "B19-4-18-22.txt"
+    file.write_text(header + rows[0] + " 2022/4/18,   9:26:30,          ,    0,       0.000000\n")
+    assert readSensorText(str(file), ['all']) is None
@@ -0,0 +1,66 @@
+import os
+import shutil
+import numpy as np
+import pytest
+import dayProcessing
+from conftest import dataDir
+from dataPaths import paramsPath
+from outputStore import readPartition
+from yamlParams import loadParams
+
+date, start, end = "4-13-22", "4/13/22 10:00", "4/13/22 17:00"
+
+
+@pytest.fixture
+def tailRun(tmp_path, monkeypatch):
+    monkeypatch.setattr(dayProcessing, "outputStorePath", str(tmp_path / "outputStore"))
+    params = loadParams(paramsPath)
+    parseArgs = ({}, params["Columns"], params.get("badTimes", []), None, {})
+    stageParams = {"upsampleFactor": 10, "outputFormat": "npy", "csvExport": False, "writeQueue": 0,
+                   "rollingStats": None}
+
+    def run(file, resume=None):
+        # one tail job of a single sensor, returns its result and the position read up to
+        job = (["Dp>0.3"], date, [file], start, end, {}, ["A16"])
+        plan = {"resume": {"A16": resume} if resume else {}}
+        result = next(dayProcessing.runJobsTail([job], [plan], parseArgs, stageParams, 500))
+        return result, plan["positions"]["A16"]
+
+    return run
+
+
+def interpolated(tmp_path):
+    return readPartition(os.path.join(str(tmp_path / "outputStore"), "interpolated", date, "all", "A16"))
+
+
+def test_appended_rows_give_the_same_result_as_a_full_run(tmp_path, tailRun):
+    source = os.path.join(dataDir, "A16_4_13_22.txt")
+    with open(source, "rb") as fin:
+        lines = fin.read().splitlines(keepends=True)
+    file = str(tmp_path / "A16_4_13_22.txt")
+    with open(file, "wb") as fout:
+        fout.writelines(lines[:len(lines) // 2])
+
+    (_, _, sensors), position = tailRun(file)
+    resume = dict(position, state=sensors["A16"]["state"])
+    with open(file, "ab") as fout:
+        fout.writelines(lines[len(lines) // 2:])
+    (_, _, sensors), position = tailRun(file, resume)
+    assert position["offset"] == os.path.getsize(file)
+    resumed = interpolated(tmp_path)
+
+    shutil.copy(source, file)
+    tailRun(file)
+    full = interpolated(tmp_path)
+    np.testing.assert_array_equal(resumed.to_numpy(), full.to_numpy())
+
+
+def test_a_file_without_new_rows_keeps_its_last_time(tmp_path, tailRun):
+    file = str(tmp_path / "A16_4_13_22.txt")
+    shutil.copy(os.path.join(dataDir, "A16_4_13_22.txt"), file)
+    (_, _, sensors), position = tailRun(file)
+    assert position["lastTime"] is not None
+
+    resume = dict(position, state=sensors["A16"]["state"])
+    _, again = tailRun(file, resume)
+    assert again == position
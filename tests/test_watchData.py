@@ -0,0 +1,81 @@
+import json
+import os
+import pytest
+import watchData
+
+
+def watchFolder(tmp_path, monkeypatch):
+    dataDir = tmp_path / "Data"
+    dataDir.mkdir()
+    monkeypatch.setattr(watchData, "dataPath", str(dataDir))
+    monkeypatch.setattr(watchData, "indexCachePath", str(tmp_path / "dataIndex.json"))
+    monkeypatch.setattr(watchData, "statusPath", str(tmp_path / "watchStatus.json"))
+    return dataDir
+
+
+def test_a_failed_cycle_keeps_the_watcher_going(tmp_path, monkeypatch):
+    dataDir = watchFolder(tmp_path, monkeypatch)
+    statusPath = tmp_path / "watchStatus.json"
+
+    cycles = []
+
+    def runCycle(pending, workers, tail, status):
+        cycles.append(sorted(pending))
+        if len(cycles) == 1:
+            raise ValueError("dataCleaningParams.yaml is not valid yaml")
+        status["cycles"] += 1
+        status["lastError"] = None
+
+    polls = []
+
+    def sleep(seconds):
+        polls.append(seconds)
+        if len(polls) == 1:
+            (dataDir / "A16_4_13_22.txt").write_text("rows\n")
+        elif len(polls) == 2:
+            assert json.loads(statusPath.read_text())["lastError"]["error"].startswith("ValueError")
+        elif len(polls) == 6:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watchData, "runCycle", runCycle)
+    monkeypatch.setattr(watchData.time, "sleep", sleep)
+    watchData.watch(interval=0, debounce=0, retry=0)
+
+    assert len(cycles) == 2 and cycles[0] == cycles[1]
+    status = json.loads(statusPath.read_text())
+    assert status["failedCycles"] == 1 and status["cycles"] == 1
+    assert status["pendingFiles"] == 0
+
+
+def replace(file):
+    # a new download moved over the old file, same size with other contents
+    other = file.with_suffix(".part")
+    other.write_text("swor\n")
+    os.replace(other, file)
+
+
+def touch(file):
+    stat = os.stat(file)
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+@pytest.mark.parametrize("change, runs", [(os.remove, True), (replace, True), (touch, False)],
+                         ids=["deleted", "replaced", "touched"])
+def test_every_kind_of_change_is_processed(tmp_path, monkeypatch, change, runs):
+    dataDir = watchFolder(tmp_path, monkeypatch)
+    for name in ("A16_4_13_22.txt", "B3_4_13_22.txt"):
+        (dataDir / name).write_text("rows\n")
+    cycles = []
+    polls = []
+
+    def sleep(seconds):
+        polls.append(seconds)
+        if len(polls) == 1:
+            change(dataDir / "A16_4_13_22.txt")
+        elif len(polls) == 3:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watchData, "runCycle", lambda pending, *args: cycles.append(sorted(pending)))
+    monkeypatch.setattr(watchData.time, "sleep", sleep)
+    watchData.watch(interval=0, debounce=0)
+    assert cycles == ([[str(dataDir / "A16_4_13_22.txt")]] if runs else [])
@@ -0,0 +1,85 @@
+import os
+import pytest
+import yaml
+import yamlParams
+from dataPaths import paramsPath
+
+
+@pytest.fixture
+def paramsFile(tmp_path):
+    path = str(tmp_path / "dataCleaningParams.yaml")
+    with open(paramsPath) as fin, open(path, "w") as fout:
+        fout.write(fin.read())
+    return path
+
+
+def rewrite(path, change):
+    with open(path) as fin:
+        values = yaml.safe_load(fin)
+    change(values)
+    with open(path, "w") as fout:
+        yaml.dump(values, fout)
+
+
+def test_shipped_params_follow_the_schema():
+    assert yamlParams.schemaProblems(yamlParams.loadParams().values) == []
+
+
+def test_params_are_parsed_once(paramsFile):
+    assert yamlParams.loadParams(paramsFile) is yamlParams.loadParams(paramsFile)
+    rewrite(paramsFile, lambda values: values.update(dayEnd="16:00"))
+    os.utime(paramsFile, ns=(0, 0))
+    assert yamlParams.loadParams(paramsFile)["dayEnd"] == "16:00"
+
+
+@pytest.mark.parametrize("change, problem", [
+    (lambda values: values["Days"].update({"4-21-22": {}}), "filePattern"),
+    (lambda values: values.pop("Particles"), "Particles is missing"),
+    (lambda values: values.update(processAll=3), "processAll should be bool"),
+    (lambda values: values.update(upsampleFactor=True), "upsampleFactor should be int")])
+def test_schema_problems_are_raised(paramsFile, change, problem):
+    rewrite(paramsFile, change)
+    with pytest.raises(ValueError, match=problem):
+        yamlParams.loadParams(paramsFile)
+
+
+def test_the_old_template_day_is_skipped_and_kept(paramsFile, caplog):
+    template = {"filePattern": ["..", "Data", "*4_13_22.txt"]}
+    rewrite(paramsFile, lambda values: values["Days"].update({"MM-dd-YY": template}))
+    params = yamlParams.loadParams(paramsFile)
+    assert "MM-dd-YY" not in params["Days"] and "4-13-22" in params["Days"]
+    assert "MM-dd-YY" in caplog.text
+
+    params.addDays({"4-21-22": {"filePattern": ["..", "Data", "*4-21-22.txt"]}})
+    params.save()
+    with open(paramsFile) as fin:
+        assert yaml.safe_load(fin)["Days"]["MM-dd-YY"] == template
+
+
+def test_bad_yaml_is_raised(paramsFile):
+    with open(paramsFile, "a") as fout:
+        fout.write("Days: [\n")
+    with pytest.raises(ValueError, match="not valid yaml"):
+        yamlParams.loadParams(paramsFile)
+
+
+def test_save_writes_the_new_days(paramsFile):
+    params = yamlParams.loadParams(paramsFile)
+    params.addDays({"4-21-22": {"filePattern": ["..", "Data", "*4-21-22.txt"]}})
+    params.save()
+    assert not os.path.exists(paramsFile + ".tmp")
+    with open(paramsFile) as fin:
+        assert "4-21-22" in yaml.safe_load(fin)["Days"]
+    assert yamlParams.loadParams(paramsFile) is params
+
+
+def test_changed_days(paramsFile, tmp_path):
+    hashesPath = str(tmp_path / "paramsHashes.json")
+    params = yamlParams.loadParams(paramsFile)
+    assert yamlParams.changedDays(params, hashesPath) == (set(), [])
+    yamlParams.recordDayHashes(params, hashesPath)
+    params.values["Days"]["4-13-22"]["filePattern"] = ["..", "Data", "*4_13_22.txt"]
+    assert yamlParams.changedDays(params, hashesPath) == ({"4-13-22"}, [])
+    params.values["dayEnd"] = "16:00"
+    changed, sections = yamlParams.changedDays(params, hashesPath)
+    assert changed == set(params["Days"]) and sections == ["dayEnd"]